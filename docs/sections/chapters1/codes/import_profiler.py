@@ -0,0 +1,249 @@
+"""测量示例脚本的冷启动导入时间，并检查是否超出预算。
+
+每次测量都在新的解释器进程中用`python -X importtime`完成，结果与实际冷启动一致：
+
+    python import_profiler.py 3-1.py 3-2.py 3-3.py --budget 1.5
+
+指定`--budget`时，超出预算或有模块导入失败的目标都会让命令以非零状态退出。
+    python import_profiler.py --modules langchain_community.vectorstores --top 20
+    python import_profiler.py --lazy-exports
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+MISSING_MARKER = "__import_profiler_missing__"
+START_MARKER = "__import_profiler_start__"
+LAZY_MODULE = "lazy_langchain"
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_seconds: float
+    cumulative_seconds: float
+    depth: int
+
+
+@dataclass
+class ImportProfile:
+    """一次冷启动导入的测量结果。"""
+
+    target: str
+    modules: List[str]
+    records: List[ImportRecord] = field(default_factory=list)
+    missing: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def total_seconds(self) -> float:
+        """顶层导入的累计时间之和，即导入这些模块的总耗时。"""
+        return sum(r.cumulative_seconds for r in self.records if r.depth == 0)
+
+    def top(self, n: int = 10) -> List[ImportRecord]:
+        """按自身耗时排序，找出最慢的模块。"""
+        return sorted(self.records, key=lambda r: r.self_seconds, reverse=True)[:n]
+
+    def report(self, top: int = 10) -> str:
+        lines = [f"{self.target}: {self.total_seconds:.3f}s for {len(self.records)} modules"]
+        for record in self.top(top):
+            lines.append(
+                f"  {record.self_seconds * 1000:8.1f}ms self "
+                f"{record.cumulative_seconds * 1000:8.1f}ms cumulative  {record.module}"
+            )
+        for module, error in self.missing.items():
+            lines.append(f"  missing {module}: {error}")
+        return "\n".join(lines)
+
+
+def script_imports(path: str) -> List[str]:
+    """用ast找出脚本中导入的所有绝对模块（包括函数内部的导入），保持出现顺序。
+    通过lazy_langchain访问的名称（`lc.ChatOpenAI`或`from lazy_langchain import ChatOpenAI`）
+    在第一次使用时才导入，这里也换成它们背后的模块：按需导入只是推迟了这部分成本，
+    脚本用到的名称在处理第一个请求之前仍然要导入。
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    lazy_aliases = set()
+    lazy_names: List[str] = []
+    modules: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+            lazy_aliases.update(
+                alias.asname or alias.name for alias in node.names if alias.name == LAZY_MODULE
+            )
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+            if node.module == LAZY_MODULE:
+                lazy_names.extend(alias.name for alias in node.names)
+        else:
+            continue
+        for name in names:
+            if name not in modules:
+                modules.append(name)
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name)
+            and node.value.id in lazy_aliases
+        ):
+            lazy_names.append(node.attr)
+    if lazy_names:
+        exports = _lazy_exports(os.path.dirname(os.path.abspath(path)))
+        for name in lazy_names:
+            module = exports.get(name)
+            if module is not None and module not in modules:
+                modules.append(module)
+    return modules
+
+
+def _lazy_exports(directory: str) -> Dict[str, str]:
+    """读取脚本旁边的lazy_langchain中名称到模块的映射（只解析源码，不导入它）。"""
+    path = os.path.join(directory, f"{LAZY_MODULE}.py")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign) and getattr(node.target, "id", None) == "_EXPORTS":
+            return ast.literal_eval(node.value)
+    return {}
+
+
+def parse_import_time(stderr: str) -> List[ImportRecord]:
+    """解析`-X importtime`的输出。有START_MARKER时只统计它之后的导入，
+    解释器启动（site、encodings等）的导入不计入。"""
+    lines = stderr.splitlines()
+    if START_MARKER in lines:
+        lines = lines[lines.index(START_MARKER) + 1 :]
+    records = []
+    for line in lines:
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(
+                ImportRecord(
+                    module=module,
+                    self_seconds=int(self_us) / 1e6,
+                    cumulative_seconds=int(cumulative_us) / 1e6,
+                    depth=(len(indent) - 1) // 2,
+                )
+            )
+    return records
+
+
+def profile_modules(
+    modules: Sequence[str], target: Optional[str] = None, cwd: Optional[str] = None
+) -> ImportProfile:
+    """在新的解释器中依次导入modules并测量；导入失败的模块记入missing，不影响其余模块。"""
+    code = "\n".join(
+        [
+            "import importlib, sys",
+            f"sys.stderr.write({START_MARKER + chr(10)!r})",
+            "sys.stderr.flush()",
+            f"for name in {list(modules)!r}:",
+            "    try:",
+            "        importlib.import_module(name)",
+            "    except Exception as e:",
+            f"        print({MISSING_MARKER!r}, repr((name, repr(e))))",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+    )
+    profile = ImportProfile(target=target or ", ".join(modules), modules=list(modules))
+    profile.records = parse_import_time(result.stderr)
+    for line in result.stdout.splitlines():
+        if line.startswith(MISSING_MARKER):
+            name, error = ast.literal_eval(line[len(MISSING_MARKER) :].strip())
+            profile.missing[name] = error
+    return profile
+
+
+def profile_script(path: str) -> ImportProfile:
+    """测量脚本在处理第一个请求之前需要的导入：所有导入语句，加上通过lazy_langchain
+    用到的模块。只导入这些模块，不执行脚本本身。"""
+    # 在脚本所在目录运行，脚本旁边的模块（如lazy_langchain）可以被导入
+    return profile_modules(
+        script_imports(path), target=path, cwd=os.path.dirname(os.path.abspath(path))
+    )
+
+
+def profile_lazy_exports() -> Dict[str, ImportProfile]:
+    """测量lazy_langchain中每个名称第一次使用时的导入成本。"""
+    from lazy_langchain import export_modules
+
+    profiles: Dict[str, ImportProfile] = {}
+    for module in export_modules().values():
+        if module not in profiles:
+            profiles[module] = profile_modules([module])
+    return profiles
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time.")
+    parser.add_argument("scripts", nargs="*", help="scripts whose imports to measure")
+    parser.add_argument("--modules", nargs="+", default=[], help="modules to measure")
+    parser.add_argument(
+        "--lazy-exports", action="store_true", help="measure each module behind lazy_langchain"
+    )
+    parser.add_argument("--budget", type=float, help="fail if any target exceeds this (seconds)")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to show")
+    parser.add_argument("--json", help="write the totals as JSON")
+    args = parser.parse_args(argv)
+
+    profiles = [profile_script(path) for path in args.scripts]
+    if args.modules:
+        profiles.append(profile_modules(args.modules))
+    if args.lazy_exports:
+        profiles.extend(profile_lazy_exports().values())
+    if not profiles:
+        parser.error("nothing to measure")
+
+    over_budget = []
+    incomplete = []
+    for profile in profiles:
+        print(profile.report(args.top))
+        if args.budget is None:
+            continue
+        if profile.total_seconds > args.budget:
+            over_budget.append(profile)
+        # 导入失败的模块没有计入耗时，测量结果偏小，不能算作通过预算
+        if profile.missing:
+            incomplete.append(profile)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    p.target: {"total_seconds": p.total_seconds, "missing": p.missing}
+                    for p in profiles
+                },
+                f,
+                indent=2,
+            )
+    for profile in over_budget:
+        print(
+            f"OVER BUDGET: {profile.target} took {profile.total_seconds:.3f}s "
+            f"(budget {args.budget:.3f}s)"
+        )
+    for profile in incomplete:
+        print(
+            f"INCOMPLETE: {profile.target} could not import "
+            f"{', '.join(profile.missing)}; its import time was not measured"
+        )
+    return 1 if over_budget or incomplete else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
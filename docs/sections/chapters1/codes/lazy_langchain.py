@@ -0,0 +1,60 @@
+"""按需导入的入口模块。
+
+示例脚本在开头导入`langchain_openai`、`langchain_community.vectorstores`、
+`langchain.chains`和文档加载器，短生命周期的命令行进程在处理第一个请求前
+要花几秒钟导入它们。通过本模块访问这些名称时，只有在第一次使用时才导入对应的子模块，
+只在部分代码路径上用到的名称（例如只有重建索引时才需要的FAISS）不再拖慢启动；
+启动时就要用到的名称只是推迟了导入：
+
+    import lazy_langchain as lc
+
+    llm = lc.ChatOpenAI()          # 此时才导入langchain_openai
+    if rebuild_index:
+        vector = lc.FAISS.from_documents(documents, embeddings)
+"""
+
+import importlib
+from typing import Any, Dict, List
+
+_EXPORTS: Dict[str, str] = {
+    # 模型与嵌入
+    "ChatOpenAI": "langchain_openai",
+    "OpenAI": "langchain_openai",
+    "OpenAIEmbeddings": "langchain_openai",
+    # 文档加载、切分与向量存储
+    "WebBaseLoader": "langchain_community.document_loaders",
+    "FAISS": "langchain_community.vectorstores",
+    "RecursiveCharacterTextSplitter": "langchain_text_splitters",
+    # 链
+    "create_stuff_documents_chain": "langchain.chains.combine_documents",
+    "create_retrieval_chain": "langchain.chains",
+    "create_history_aware_retriever": "langchain.chains",
+    # 提示、消息与输出解析
+    "ChatPromptTemplate": "langchain_core.prompts",
+    "MessagesPlaceholder": "langchain_core.prompts",
+    "StrOutputParser": "langchain_core.output_parsers",
+    "HumanMessage": "langchain_core.messages",
+    "AIMessage": "langchain_core.messages",
+    "Document": "langchain_core.documents",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    # 缓存到模块命名空间，之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+def export_modules() -> Dict[str, str]:
+    """返回名称到所在模块的映射，供import_profiler测量每个名称首次使用的导入成本。"""
+    return dict(_EXPORTS)
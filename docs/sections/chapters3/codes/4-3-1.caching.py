@@ -1,29 +1,20 @@
 from langchain_openai import ChatOpenAI
 
 print("####################      step0 计算函数执行时间     ####################")
-import time
-
-
-def timing_decorator(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()  # 记录函数开始执行的时间
-        result = func(*args, **kwargs)  # 执行被装饰的函数
-        end_time = time.time()  # 记录函数结束执行的时间
-        elapsed_time = end_time - start_time  # 计算执行时间
-        print(f"{func.__name__} took {elapsed_time} seconds to execute.")
-        return result
-
-    return wrapper
-
+# 单调时钟计时；需要分位数、吞吐量和内存变化时使用bench.benchmark
+from bench import timing_decorator
 
 print("####################      step1 初始化模型     ####################")
 chat = ChatOpenAI(model="gpt-3.5-turbo")
 
 print("####################      step2  内存缓存​     ####################")
 from langchain.globals import set_llm_cache
-from langchain.cache import InMemoryCache
+from memory_cache import BoundedInMemoryCache
 
-set_llm_cache(InMemoryCache())
+# InMemoryCache没有容量上限，长时间运行的进程中会持续增长。
+# 这里限制最多1万条、约256MB，条目1小时后过期。
+cache = BoundedInMemoryCache(maxsize=10_000, max_bytes=256 * 1024 * 1024, ttl=3600)
+set_llm_cache(cache)
 # 第一次，它尚未缓存，所以应该需要更长时间
 
 
@@ -36,3 +27,6 @@ print(predict_and_time(chat, "Tell me a joke"))
 
 # 第二次调用
 print(predict_and_time(chat, "Tell me a joke"))
+
+# 命中、未命中和淘汰次数，用于在真实流量下调整容量
+print(cache.stats())
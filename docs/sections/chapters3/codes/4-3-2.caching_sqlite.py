@@ -1,29 +1,19 @@
 from langchain_openai import ChatOpenAI
 
 print("####################      step0 计算函数执行时间     ####################")
-import time
-
-
-def timing_decorator(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()  # 记录函数开始执行的时间
-        result = func(*args, **kwargs)  # 执行被装饰的函数
-        end_time = time.time()  # 记录函数结束执行的时间
-        elapsed_time = end_time - start_time  # 计算执行时间
-        print(f"{func.__name__} took {elapsed_time} seconds to execute.")
-        return result
-
-    return wrapper
-
+# 单调时钟计时；需要分位数、吞吐量和内存变化时使用bench.benchmark
+from bench import timing_decorator
 
 print("####################      step1 初始化模型     ####################")
 chat = ChatOpenAI(model="gpt-3.5-turbo")
 
 print("####################      step2  内存缓存​     ####################")
 from langchain.globals import set_llm_cache
-from langchain.cache import SQLiteCache
+from sqlite_cache import WALSQLiteCache
 
-set_llm_cache(SQLiteCache(database_path=".langchain.db"))
+# WAL模式 + 读连接池 + 后台批量写入，多个线程/进程可以共享同一个数据库文件
+cache = WALSQLiteCache(database_path=".langchain.db", pool_size=8, ttl=7 * 24 * 3600)
+set_llm_cache(cache)
 
 
 @timing_decorator
@@ -35,3 +25,5 @@ print(predict_and_time(chat, "Tell me a joke"))
 
 # 第二次调用
 print(predict_and_time(chat, "Tell me a joke"))
+
+print(cache.stats())
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.cache import SQLiteCache
+from langchain_core.outputs import Generation
+
+from sqlite_cache import WALSQLiteCache
+
+N_KEYS = 2000
+N_THREADS = 16
+LOOKUPS_PER_THREAD = 2000
+WRITES_PER_THREAD = 100
+N_PROCESSES = 4
+
+def run_threads(cache) -> float:
+    """每个线程混合执行查找和写入，返回每秒完成的查找次数。"""
+
+    def worker(worker_id: int) -> None:
+        for i in range(LOOKUPS_PER_THREAD):
+            cache.lookup(f"prompt {(i * 31 + worker_id) % N_KEYS}", "llm")
+            if i % (LOOKUPS_PER_THREAD // WRITES_PER_THREAD) == 0:
+                cache.update(
+                    f"new prompt {worker_id}-{i}", "llm", [Generation(text="x" * 500)]
+                )
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(N_THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return N_THREADS * LOOKUPS_PER_THREAD / (time.perf_counter() - start)
+
+
+def fill(cache) -> None:
+    for i in range(N_KEYS):
+        cache.update(f"prompt {i}", "llm", [Generation(text="x" * 500)])
+
+
+def process_worker(database_path: str) -> float:
+    cache = WALSQLiteCache(database_path=database_path)
+    try:
+        return run_threads(cache)
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    print("####################      step1 多线程读写     ####################")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = SQLiteCache(database_path=os.path.join(tmp, "baseline.db"))
+        fill(baseline)
+        print(f"SQLiteCache     {run_threads(baseline):>10.0f} lookups/s")
+
+        wal = WALSQLiteCache(database_path=os.path.join(tmp, "wal.db"))
+        fill(wal)
+        wal.flush()
+        print(f"WALSQLiteCache  {run_threads(wal):>10.0f} lookups/s")
+        wal.close()
+
+    print("####################      step2 多进程共享同一个文件     ####################")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        cache = WALSQLiteCache(database_path=path)
+        fill(cache)
+        cache.close()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(N_PROCESSES) as pool:
+            list(pool.map(process_worker, [path] * N_PROCESSES))
+        elapsed = time.perf_counter() - start
+        total = N_PROCESSES * N_THREADS * LOOKUPS_PER_THREAD
+        print(f"{N_PROCESSES} processes     {total / elapsed:>10.0f} lookups/s")
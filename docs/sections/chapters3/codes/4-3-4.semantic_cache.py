@@ -0,0 +1,21 @@
+from langchain.globals import set_llm_cache
+
+from fake_models import FakeChatModel, LatencyProfile
+from semantic_cache import NgramEmbeddings, SemanticCache
+
+print("####################      step1 初始化模型     ####################")
+# 使用本地替身模型，模拟一次约1秒的调用
+chat = FakeChatModel(
+    responses=["Why did the scarecrow win an award? Because he was outstanding in his field!"],
+    latency=LatencyProfile(ttft=0.8, token_latency=0.02),
+)
+
+print("####################      step2  语义缓存​     ####################")
+# NgramEmbeddings是本地的嵌入替身；生产环境可以换成任意Embeddings实现
+cache = SemanticCache(NgramEmbeddings(), threshold=0.9)
+set_llm_cache(cache)
+
+for text in ["Tell me a joke", "tell me a joke!", "Tell me a joke.", "Tell me a story"]:
+    print(text, "->", chat.invoke(text).content)
+
+print(cache.report())
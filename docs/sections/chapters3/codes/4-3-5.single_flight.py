@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from langchain.globals import set_llm_cache
+
+from fake_models import FakeChatModel, LatencyProfile
+from memory_cache import BoundedInMemoryCache
+from single_flight import SingleFlightChatModel, default_group
+
+
+class SingleFlightFakeChatModel(SingleFlightChatModel, FakeChatModel):
+    pass
+
+
+print("####################      step1 初始化模型     ####################")
+# 使用本地替身模型，模拟一次约0.5秒的调用
+chat = SingleFlightFakeChatModel(
+    responses=["Why did the scarecrow win an award? Because he was outstanding in his field!"],
+    latency=LatencyProfile(ttft=0.5),
+)
+set_llm_cache(BoundedInMemoryCache(maxsize=1000))
+
+print("####################      step2 批量调用中的相同提示     ####################")
+# 缓存在第一次调用返回之前是空的，没有合并时这8个相同的提示会调用8次模型
+start = time.perf_counter()
+results = chat.batch(["Tell me a joke"] * 8)
+print(f"{len(results)} results in {time.perf_counter() - start:.2f}s, model calls: {chat.call_count}")
+print(default_group.stats())
+
+print("####################      step3 并发异步调用     ####################")
+
+
+async def main():
+    start = time.perf_counter()
+    results = await asyncio.gather(*[chat.ainvoke("Tell me a story") for _ in range(100)])
+    print(
+        f"{len(results)} results in {time.perf_counter() - start:.2f}s, "
+        f"model calls: {chat.call_count}"
+    )
+
+
+asyncio.run(main())
+print(default_group.stats())
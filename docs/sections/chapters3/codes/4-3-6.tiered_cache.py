@@ -0,0 +1,33 @@
+import time
+
+from langchain.globals import set_llm_cache
+
+from fake_models import FakeChatModel, LatencyProfile
+from tiered_cache import TieredCache
+
+print("####################      step1 初始化模型     ####################")
+# 使用本地替身模型，模拟一次约0.5秒、返回较长文本的调用
+chat = FakeChatModel(
+    responses=["LangChain " * 2000],
+    latency=LatencyProfile(ttft=0.5),
+)
+
+print("####################      step2  分层缓存     ####################")
+cache = TieredCache(".langchain.db", ".langchain.blob", hot_maxsize=1000)
+set_llm_cache(cache)
+
+for label in ["first", "hot", "hot"]:
+    start = time.perf_counter()
+    chat.invoke("Tell me a joke")
+    print(f"{label:<10} {time.perf_counter() - start:.4f}s")
+cache.close()
+
+print("####################      step3  模拟进程重启     ####################")
+# 重新打开时不加载任何条目，第一次访问从映射文件读取并提升到内存层
+cache = TieredCache(".langchain.db", ".langchain.blob", hot_maxsize=1000)
+set_llm_cache(cache)
+for label in ["restarted", "hot"]:
+    start = time.perf_counter()
+    chat.invoke("Tell me a joke")
+    print(f"{label:<10} {time.perf_counter() - start:.4f}s")
+print(cache.stats())
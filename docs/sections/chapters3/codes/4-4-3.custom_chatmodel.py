@@ -1,3 +1,5 @@
+import asyncio
+import time
 from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from langchain_core.callbacks import (
     AsyncCallbackManagerForLLMRun,
@@ -11,13 +13,15 @@ from langchain_core.messages import (
     SystemMessage,
     ToolMessage,
 )
-from langchain_core.language_models import BaseChatModel, SimpleChatModel
+from langchain_core.language_models import SimpleChatModel
 from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
-from langchain_core.runnables import run_in_executor
 
+from coalescing import acoalesce, coalesce
+from native_batch import NativeBatchChatModel
 
-class CustomChatModelAdvanced(BaseChatModel):
+
+class CustomChatModelAdvanced(NativeBatchChatModel):
     """一个自定义聊天模型，回显输入的前`n`个字符。
     当向LangChain贡献实现时，仔细记录模型，包括初始化参数，
     包括如何初始化模型的示例，并包括任何相关的底层模型文档或API的链接。
@@ -30,6 +34,18 @@ class CustomChatModelAdvanced(BaseChatModel):
     n: int
     """从提示的最后一条消息中回显的字符数。"""
 
+    token_delay: float = 0.0
+    """每生成一个字符前等待的秒数，用于模拟一个慢速的生产者（例如远程API）。"""
+
+    max_queue_size: int = 16
+    """异步流式传输时每个流的有界队列大小。消费者跟不上时，生产者会在此处等待（背压）。"""
+
+    coalesce_bytes: Optional[int] = None
+    """流式传输时累计多少字节合并为一个块。默认不合并，每个字符一个块。"""
+
+    coalesce_interval: Optional[float] = None
+    """流式传输时的合并时间窗口（秒），例如0.02表示每20毫秒最多输出一个块。"""
+
     def _generate(
         self,
         messages: List[BaseMessage],
@@ -48,10 +64,43 @@ class CustomChatModelAdvanced(BaseChatModel):
         """
         last_message = messages[-1]
         tokens = last_message.content[: self.n]
+        if self.token_delay:
+            time.sleep(self.token_delay * len(tokens))
         message = AIMessage(content=tokens)
         generation = ChatGeneration(message=message)
         return ChatResult(generations=[generation])
 
+    def _generate_batch(
+        self,
+        messages_list: List[List[BaseMessage]],
+        stop: Optional[List[str]] = None,
+        run_managers: Optional[List[CallbackManagerForLLMRun]] = None,
+        **kwargs: Any,
+    ) -> List[ChatResult]:
+        """一次调用为多个提示生成结果。
+        `batch`/`abatch`会按`max_batch_size`分块调用此方法，
+        对于支持一次请求处理多个提示的后端，N次往返就变成了N/max_batch_size次。
+        Args:
+            messages_list: 多个提示，每个提示是一个消息列表。
+            stop: 模型应该停止生成的字符串列表。
+            run_managers: 与messages_list一一对应的运行管理器。
+        """
+        batch_tokens = [messages[-1].content[: self.n] for messages in messages_list]
+        if self.token_delay:
+            # 整批只有一次往返，耗时取决于最长的那条输出
+            time.sleep(self.token_delay * max(len(t) for t in batch_tokens))
+        return [
+            ChatResult(generations=[ChatGeneration(message=AIMessage(content=tokens))])
+            for tokens in batch_tokens
+        ]
+
+    def _produce(self, tokens: str) -> Iterator[str]:
+        """逐个产出字符。真实模型中这里通常是读取网络响应流。"""
+        for token in tokens:
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
     def _stream(
         self,
         messages: List[BaseMessage],
@@ -70,12 +119,41 @@ class CustomChatModelAdvanced(BaseChatModel):
         """
         last_message = messages[-1]
         tokens = last_message.content[: self.n]
-        for token in tokens:
+        # 开启合并模式时，多个字符合并成一个块，只创建一次对象、触发一次回调
+        for token in coalesce(
+            self._produce(tokens), self.coalesce_bytes, self.coalesce_interval
+        ):
             chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
             if run_manager:
                 run_manager.on_llm_new_token(token, chunk=chunk)
             yield chunk
 
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """_generate的原生异步版本。
+        如果未提供，默认行为是通过run_in_executor在线程池中调用_generate。
+        等待期间使用asyncio.sleep让出事件循环，而不是占用一个线程。
+        """
+        last_message = messages[-1]
+        tokens = last_message.content[: self.n]
+        if self.token_delay:
+            await asyncio.sleep(self.token_delay * len(tokens))
+        message = AIMessage(content=tokens)
+        generation = ChatGeneration(message=message)
+        return ChatResult(generations=[generation])
+
+    async def _aproduce(self, tokens: str) -> AsyncIterator[str]:
+        """异步地逐个产出字符。真实模型中这里通常是读取网络响应流。"""
+        for token in tokens:
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
     async def _astream(
         self,
         messages: List[BaseMessage],
@@ -83,21 +161,43 @@ class CustomChatModelAdvanced(BaseChatModel):
         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> AsyncIterator[ChatGenerationChunk]:
-        """astream的异步变体。
+        """astream的原生异步实现。
         如果未提供，则默认行为是委托给_generate方法。
-        下面的实现将委托给_stream，并将其实现在单独的线程中启动。
-        如果您能够本地支持异步，则一定要这样做！
+        生产者作为独立任务运行，并通过一个有界队列把字符交给消费者：
+        消费者变慢时生产者会在queue.put处等待（背压），
+        消费者提前退出时生产者任务会被取消。
+        整个过程不占用线程，也不会阻塞事件循环。
         """
-        result = await run_in_executor(
-            None,
-            self._stream,
-            messages,
-            stop=stop,
-            run_manager=run_manager.get_sync() if run_manager else None,
-            **kwargs,
-        )
-        for chunk in result:
-            yield chunk
+        last_message = messages[-1]
+        tokens = last_message.content[: self.n]
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        done = object()
+
+        async def produce() -> None:
+            try:
+                async for token in acoalesce(
+                    self._aproduce(tokens), self.coalesce_bytes, self.coalesce_interval
+                ):
+                    await queue.put(token)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=item))
+                if run_manager:
+                    await run_manager.on_llm_new_token(item, chunk=chunk)
+                yield chunk
+        finally:
+            producer.cancel()
 
     @property
     def _llm_type(self) -> str:
@@ -124,5 +224,15 @@ print(
 
 print(model.batch(["hello", "goodbye"]))
 
+# 每次最多2个提示组成一批，5个输入只需要3次_generate_batch调用
+batch_model = CustomChatModelAdvanced(n=3, max_batch_size=2)
+print(batch_model.batch(["one", "two", "three", "four", "five"]))
+
 for chunk in model.stream("cat"):
     print(chunk.content, end="|")
+print()
+
+# 合并模式：第一个字符立即输出，之后每累计4个字节输出一个块
+coalesced_model = CustomChatModelAdvanced(n=12, coalesce_bytes=4)
+for chunk in coalesced_model.stream("hello world!"):
+    print(chunk.content, end="|")
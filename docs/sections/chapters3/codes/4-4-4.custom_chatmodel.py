@@ -1,3 +1,5 @@
+import asyncio
+import time
 from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 from langchain_core.callbacks import (
     AsyncCallbackManagerForLLMRun,
@@ -14,7 +16,6 @@ from langchain_core.messages import (
 from langchain_core.language_models import BaseChatModel, SimpleChatModel
 from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
-from langchain_core.runnables import run_in_executor
 
 
 class CustomChatModelAdvanced(BaseChatModel):
@@ -30,6 +31,12 @@ class CustomChatModelAdvanced(BaseChatModel):
     n: int
     """从提示的最后一条消息中回显的字符数。"""
 
+    token_delay: float = 0.0
+    """每生成一个字符前等待的秒数，用于模拟一个慢速的生产者（例如远程API）。"""
+
+    max_queue_size: int = 16
+    """异步流式传输时每个流的有界队列大小。消费者跟不上时，生产者会在此处等待（背压）。"""
+
     def _generate(
         self,
         messages: List[BaseMessage],
@@ -48,6 +55,8 @@ class CustomChatModelAdvanced(BaseChatModel):
         """
         last_message = messages[-1]
         tokens = last_message.content[: self.n]
+        if self.token_delay:
+            time.sleep(self.token_delay * len(tokens))
         message = AIMessage(content=tokens)
         generation = ChatGeneration(message=message)
         return ChatResult(generations=[generation])
@@ -71,11 +80,39 @@ class CustomChatModelAdvanced(BaseChatModel):
         last_message = messages[-1]
         tokens = last_message.content[: self.n]
         for token in tokens:
+            if self.token_delay:
+                time.sleep(self.token_delay)
             chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
             if run_manager:
                 run_manager.on_llm_new_token(token, chunk=chunk)
             yield chunk
 
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """_generate的原生异步版本。
+        如果未提供，默认行为是通过run_in_executor在线程池中调用_generate。
+        等待期间使用asyncio.sleep让出事件循环，而不是占用一个线程。
+        """
+        last_message = messages[-1]
+        tokens = last_message.content[: self.n]
+        if self.token_delay:
+            await asyncio.sleep(self.token_delay * len(tokens))
+        message = AIMessage(content=tokens)
+        generation = ChatGeneration(message=message)
+        return ChatResult(generations=[generation])
+
+    async def _aproduce(self, tokens: str) -> AsyncIterator[str]:
+        """异步地逐个产出字符。真实模型中这里通常是读取网络响应流。"""
+        for token in tokens:
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
     async def _astream(
         self,
         messages: List[BaseMessage],
@@ -83,21 +120,41 @@ class CustomChatModelAdvanced(BaseChatModel):
         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> AsyncIterator[ChatGenerationChunk]:
-        """astream的异步变体。
+        """astream的原生异步实现。
         如果未提供，则默认行为是委托给_generate方法。
-        下面的实现将委托给_stream，并将其实现在单独的线程中启动。
-        如果您能够本地支持异步，则一定要这样做！
+        生产者作为独立任务运行，并通过一个有界队列把字符交给消费者：
+        消费者变慢时生产者会在queue.put处等待（背压），
+        消费者提前退出时生产者任务会被取消。
+        整个过程不占用线程，也不会阻塞事件循环。
         """
-        result = await run_in_executor(
-            None,
-            self._stream,
-            messages,
-            stop=stop,
-            run_manager=run_manager.get_sync() if run_manager else None,
-            **kwargs,
-        )
-        for chunk in result:
-            yield chunk
+        last_message = messages[-1]
+        tokens = last_message.content[: self.n]
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        done = object()
+
+        async def produce() -> None:
+            try:
+                async for token in self._aproduce(tokens):
+                    await queue.put(token)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=item))
+                if run_manager:
+                    await run_manager.on_llm_new_token(item, chunk=chunk)
+                yield chunk
+        finally:
+            producer.cancel()
 
     @property
     def _llm_type(self) -> str:
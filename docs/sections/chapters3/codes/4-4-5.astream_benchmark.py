@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import run_in_executor
+
+from bench import abenchmark
+
+print("####################      step1 定义两种异步流式实现     ####################")
+
+
+class NativeAsyncChatModel(BaseChatModel):
+    """回显最后一条消息的前`n`个字符，_astream为原生异步实现（见4-4-3）。"""
+
+    n: int
+    token_delay: float = 0.0
+    max_queue_size: int = 16
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tokens = messages[-1].content[: self.n]
+        if self.token_delay:
+            time.sleep(self.token_delay * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=tokens))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        for token in messages[-1].content[: self.n]:
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens = messages[-1].content[: self.n]
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        done = object()
+
+        async def produce() -> None:
+            try:
+                for token in tokens:
+                    if self.token_delay:
+                        await asyncio.sleep(self.token_delay)
+                    await queue.put(token)
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=item))
+                if run_manager:
+                    await run_manager.on_llm_new_token(item, chunk=chunk)
+                yield chunk
+        finally:
+            producer.cancel()
+
+    @property
+    def _llm_type(self) -> str:
+        return "echoing-chat-model-native-async"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"n": self.n}
+
+
+class ExecutorChatModel(NativeAsyncChatModel):
+    """旧的写法：在线程里创建_stream生成器，然后在事件循环上逐个迭代它。"""
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        result = await run_in_executor(
+            None,
+            self._stream,
+            messages,
+            stop=stop,
+            run_manager=run_manager.get_sync() if run_manager else None,
+            **kwargs,
+        )
+        for chunk in result:
+            yield chunk
+
+    @property
+    def _llm_type(self) -> str:
+        return "echoing-chat-model-executor"
+
+
+print("####################      step2 并发压测     ####################")
+
+
+async def consume(model: BaseChatModel, text: str) -> int:
+    chunks = 0
+    async for _ in model.astream(text):
+        chunks += 1
+    return chunks
+
+
+async def monitor_loop_lag(stop_event: asyncio.Event, interval: float = 0.01) -> float:
+    """每隔interval秒醒来一次，记录事件循环的最大延迟。延迟越大，说明有协程在阻塞循环。"""
+    max_lag = 0.0
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def run_benchmark(model: BaseChatModel, concurrency: int) -> Dict[str, float]:
+    chunks = 0
+    ids = itertools.count()
+
+    async def stream_once() -> None:
+        nonlocal chunks
+        # 先等待再累加：`chunks += await ...`会在等待前读取chunks，并发时丢失计数
+        count = await consume(model, f"stream-{next(ids):05d}")
+        chunks += count
+
+    stop_event = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(stop_event))
+    # concurrency个流同时开始，不预热，也不测量内存
+    result = await abenchmark(
+        stream_once,
+        name=model._llm_type,
+        runs=concurrency,
+        warmup=0,
+        concurrency=concurrency,
+        trace_memory=False,
+    )
+    stop_event.set()
+    max_lag = await monitor
+    return {
+        "elapsed": result.wall_seconds,
+        "chunks_per_second": chunks / result.wall_seconds,
+        "max_loop_lag": max_lag,
+    }
+
+
+async def main() -> None:
+    token_delay = 0.002
+    for concurrency in (10, 100, 1000):
+        for model in (
+            ExecutorChatModel(n=8, token_delay=token_delay),
+            NativeAsyncChatModel(n=8, token_delay=token_delay),
+        ):
+            stats = await run_benchmark(model, concurrency)
+            print(
+                f"{model._llm_type:<34} concurrency={concurrency:<5} "
+                f"elapsed={stats['elapsed']:.3f}s "
+                f"chunks/s={stats['chunks_per_second']:.0f} "
+                f"max_loop_lag={stats['max_loop_lag'] * 1000:.1f}ms"
+            )
+
+
+asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+import itertools
+import time
+
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+
+from bench import abenchmark, percentile
+from fake_models import FakeChatModel, FakeLLM, LatencyProfile
+
+print("####################      step1 构建替身模型     ####################")
+# 模拟一个首token约300ms、每个token约20ms、带正态抖动、1%失败率的远程模型
+latency = LatencyProfile(ttft=0.3, token_latency=0.02, jitter="normal", jitter_scale=0.2)
+chat = FakeChatModel(
+    responses=["Why did the ice cream truck break down? It had too many sundaes!"],
+    latency=latency,
+    error_rate=0.01,
+    seed=42,
+)
+json_chat = FakeChatModel(
+    responses=[{"name": "Tom Hanks", "film_names": ["Forrest Gump", "Cast Away"]}],
+    latency=latency,
+)
+tool_chat = FakeChatModel(
+    responses=[""],
+    tool_calls=[[{"name": "multiply", "args": {"a": 3, "b": 12}}]],
+)
+llm = FakeLLM(responses=["Sparkling water, you make me beam."], latency=latency)
+
+print("####################      step2 与3.LCEL/1.basic.py相同的链     ####################")
+prompt = ChatPromptTemplate.from_template("tell me a short joke about {topic}")
+chain = prompt | chat | StrOutputParser()
+print(chain.invoke({"topic": "ice cream"}))
+
+json_chain = (
+    ChatPromptTemplate.from_template("Return a JSON object about {actor}.")
+    | json_chat
+    | JsonOutputParser()
+)
+for partial in json_chain.stream({"actor": "Tom Hanks"}):
+    print(partial)
+
+print(tool_chat.invoke("What is 3 * 12?").tool_calls)
+
+llm_chain = PromptTemplate.from_template("Write me a song about {thing}.") | llm
+for chunk in llm_chain.stream({"thing": "sparkling water"}):
+    print(chunk, end="|", flush=True)
+print()
+
+print("####################      step3 并发压测     ####################")
+
+
+async def load_test(concurrency: int) -> None:
+    ttft = []
+    ids = itertools.count()
+
+    async def stream_once() -> None:
+        start = time.perf_counter()
+        first = None
+        async for _ in chain.astream({"topic": f"topic {next(ids)}"}):
+            if first is None:
+                first = time.perf_counter() - start
+        # 出错的请求不计入首token时间
+        ttft.append(first)
+
+    # 总耗时、错误数和吞吐量由abenchmark统计，首token时间在stream_once中记录
+    result = await abenchmark(
+        stream_once, runs=concurrency, warmup=0, concurrency=concurrency, trace_memory=False
+    )
+    ttft.sort()
+    summary = result.summary()
+    print(
+        f"concurrency={concurrency:<5} errors={result.errors:<3} "
+        f"ttft_p50={percentile(ttft, 50) * 1000:.0f}ms "
+        f"ttft_p95={percentile(ttft, 95) * 1000:.0f}ms "
+        f"total_p95={summary['p95'] * 1000:.0f}ms "
+        f"throughput={len(result.latencies) / result.wall_seconds:.1f} req/s"
+    )
+
+
+async def main() -> None:
+    for concurrency in (10, 100, 1000):
+        await load_test(concurrency)
+
+
+asyncio.run(main())
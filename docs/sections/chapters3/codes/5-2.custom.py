@@ -1,7 +1,10 @@
-from typing import Any, List, Mapping, Optional
+from typing import Any, Iterator, List, Mapping, Optional
 
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
 from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from stop_sequences import stream_with_stop, truncate_at_stop
 
 
 class CustomLLM(LLM):
@@ -18,9 +21,21 @@ class CustomLLM(LLM):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> str:
-        if stop is not None:
-            raise ValueError("stop kwargs are not permitted.")
-        return prompt[: self.n]
+        return truncate_at_stop(prompt[: self.n], stop)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        chunks = (GenerationChunk(text=char) for char in prompt[: self.n])
+        # 命中停止序列后，上游生成器会被立即关闭
+        for chunk in stream_with_stop(chunks, stop):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -32,3 +47,9 @@ llm = CustomLLM(n=10)
 
 print(llm.invoke("This is a foobar thing"))
 print(llm)
+
+# 停止序列：非流式调用直接截断，流式调用在"foo"跨块出现时也能正确截断
+llm = CustomLLM(n=22)
+print(llm.invoke("This is a foobar thing", stop=["bar", "is a f"]))
+for chunk in llm.stream("This is a foobar thing", stop=["foo"]):
+    print(chunk, end="|")
@@ -1,20 +1,8 @@
 from langchain_openai import OpenAI
 
 print("####################      step0 计算函数执行时间     ####################")
-import time
-
-
-def timing_decorator(func):
-    def wrapper(*args, **kwargs):
-        start_time = time.time()  # 记录函数开始执行的时间
-        result = func(*args, **kwargs)  # 执行被装饰的函数
-        end_time = time.time()  # 记录函数结束执行的时间
-        elapsed_time = end_time - start_time  # 计算执行时间
-        print(f"{func.__name__} took {elapsed_time} seconds to execute.")
-        return result
-
-    return wrapper
-
+# 单调时钟计时；需要分位数、吞吐量和内存变化时使用bench.benchmark
+from bench import timing_decorator
 
 print("####################      step1 初始化模型     ####################")
 # 为了使缓存效果非常明显，我们使用一个较慢的模型。
@@ -23,9 +11,12 @@ llm = OpenAI(model_name="gpt-3.5-turbo-instruct", n=2, best_of=2)
 
 print("####################      step2  内存缓存​     ####################")
 from langchain.globals import set_llm_cache
-from langchain.cache import InMemoryCache
+from memory_cache import BoundedInMemoryCache
 
-set_llm_cache(InMemoryCache())
+# InMemoryCache没有容量上限，长时间运行的进程中会持续增长。
+# 这里限制最多1万条、约256MB，条目1小时后过期。
+cache = BoundedInMemoryCache(maxsize=10_000, max_bytes=256 * 1024 * 1024, ttl=3600)
+set_llm_cache(cache)
 # 第一次，它尚未缓存，所以应该需要更长时间
 
 
@@ -36,3 +27,30 @@ def predict_and_time(chat_instance, text):
 
 print(predict_and_time(llm, "Tell me a joke"))
 print(predict_and_time(llm, "Tell me a joke"))
+
+# 命中、未命中和淘汰次数，用于在真实流量下调整容量
+print(cache.stats())
+
+
+print("####################      step3  按候选缓存​     ####################")
+from candidate_cache import CandidateCacheLLM
+
+
+class CandidateCachedOpenAI(CandidateCacheLLM, OpenAI):
+    pass
+
+
+# 整体缓存的键包含n和best_of，把n从2改为3会完全未命中。
+# 候选缓存把候选逐个累积在不含n/best_of的键下，cache=False关闭整体缓存。
+llm2 = CandidateCachedOpenAI(model_name="gpt-3.5-turbo-instruct", n=2, best_of=2, cache=False)
+llm3 = CandidateCachedOpenAI(model_name="gpt-3.5-turbo-instruct", n=3, best_of=3, cache=False)
+
+
+@timing_decorator
+def generate_and_time(llm_instance, text):
+    return [generation.text for generation in llm_instance.generate([text]).generations[0]]
+
+
+print(generate_and_time(llm2, "Tell me a joke"))
+# 复用已缓存的2个候选，只请求1个新候选
+print(generate_and_time(llm3, "Tell me a joke"))
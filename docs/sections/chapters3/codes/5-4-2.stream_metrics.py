@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import AsyncIterator, Iterable
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableGenerator
+
+from fake_models import FakeChatModel, LatencyProfile
+from stream_metrics import StreamMetricsHandler
+
+print("####################      step1 初始化模型     ####################")
+# 本地替身模型：首token约0.3秒，之后每个token约20毫秒
+model = FakeChatModel(
+    responses=["Sparkling water is water with carbon dioxide dissolved in it under pressure."],
+    latency=LatencyProfile(ttft=0.3, token_latency=0.02),
+)
+
+
+print("####################      step2 一个会卡顿的流式解析器     ####################")
+# 与6-2.custom.py中的streaming_parse相同，但每攒够20个字符才输出一次，并模拟额外的处理耗时
+def buffered_parse(chunks: Iterable[str]) -> Iterable[str]:
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= 20:
+            time.sleep(0.05)
+            yield buffer.swapcase()
+            buffer = ""
+    if buffer:
+        yield buffer.swapcase()
+
+
+async def abuffered_parse(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= 20:
+            await asyncio.sleep(0.05)
+            yield buffer.swapcase()
+            buffer = ""
+    if buffer:
+        yield buffer.swapcase()
+
+
+chain = model | StrOutputParser() | RunnableGenerator(buffered_parse, abuffered_parse)
+
+print("####################      step3 记录每个步骤的流式指标     ####################")
+handler = StreamMetricsHandler(
+    listener=lambda m: print(
+        f"\n[{m.name}] ttft={m.ttft:.3f}s chunks={m.chunks} bytes={m.bytes}"
+        if m.ttft is not None
+        else f"\n[{m.name}] no chunks"
+    )
+)
+for chunk in chain.stream("What is sparkling water?", config={"callbacks": [handler]}):
+    print(chunk, end="|", flush=True)
+
+
+async def main():
+    async for chunk in chain.astream("What is sparkling water?", config={"callbacks": [handler]}):
+        print(chunk, end="|", flush=True)
+
+
+asyncio.run(main())
+
+print("####################      step4 汇总报告     ####################")
+for name, report in handler.report().items():
+    print(
+        f"{name:<20} first_chunk={report['first_chunk_offset_p50'] * 1000:7.1f}ms "
+        f"gap_p50={report['gap_p50'] * 1000:6.1f}ms gap_p95={report['gap_p95'] * 1000:6.1f}ms "
+        f"chunks={report['chunks_mean']:.0f}"
+    )
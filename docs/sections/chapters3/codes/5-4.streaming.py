@@ -3,3 +3,26 @@ from langchain_openai import OpenAI
 llm = OpenAI(model="gpt-3.5-turbo-instruct", temperature=0, max_tokens=512)
 for chunk in llm.stream("Write me a song about sparkling water."):
     print(chunk, end="", flush=True)
+
+print("####################      流式调用使用缓存     ####################")
+from langchain.globals import set_llm_cache
+
+from memory_cache import BoundedInMemoryCache
+from stream_cache import CachedStreamLLM
+
+
+class CachedOpenAI(CachedStreamLLM, OpenAI):
+    pass
+
+
+set_llm_cache(BoundedInMemoryCache(maxsize=10_000))
+# recorded：按第一次直播时记录的时间线回放；instant：一次性返回全部文本
+llm = CachedOpenAI(
+    model="gpt-3.5-turbo-instruct", temperature=0, max_tokens=512, stream_replay="recorded"
+)
+# 第一次未命中，直播的同时把拼接好的结果写入缓存
+for chunk in llm.stream("Write me a song about sparkling water."):
+    print(chunk, end="", flush=True)
+# 第二次直接从缓存回放，不再调用模型
+for chunk in llm.stream("Write me a song about sparkling water."):
+    print(chunk, end="", flush=True)
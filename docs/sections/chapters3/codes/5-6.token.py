@@ -28,3 +28,41 @@ with get_openai_callback() as cb:
     print(f"Prompt Tokens: {cb.prompt_tokens}")
     print(f"Completion Tokens: {cb.completion_tokens}")
     print(f"Total Cost (USD): ${cb.total_cost}")
+
+# 本地统计token与费用：不依赖提供商返回的用量，流式调用、batch、abatch与线程池中都能正确累计
+from concurrent.futures import ThreadPoolExecutor
+
+from token_accounting import TokenAccountingHandler, install_global_handler
+
+accounting = install_global_handler(TokenAccountingHandler())
+llm = OpenAI(model_name="gpt-3.5-turbo-instruct")
+llm.batch(["Tell me a joke", "Tell me a poem"], config={"tags": ["batch"]})
+for chunk in llm.stream("Tell me a story", config={"metadata": {"request_id": "story-1"}}):
+    pass
+with ThreadPoolExecutor(max_workers=4) as pool:
+    list(pool.map(llm.invoke, ["Tell me a fact"] * 4))
+print(accounting)
+print(accounting.snapshot()["by_request"]["story-1"])
+print(accounting.snapshot()["by_tag"])
+
+# 预算控制：每次模型调用发出之前检查，代理循环用完一个请求的预算后不再发出请求
+from token_budget import Budget, BudgetExceededError, TokenBudgetHandler, with_budget_fallback
+
+budget = TokenBudgetHandler(
+    request_budget=Budget(max_tokens=3000),
+    tenant_budgets={"acme": Budget(max_cost=0.05)},
+)
+try:
+    response = agent.invoke(
+        {"input": "Who is Olivia Wilde's boyfriend? What is his current age raised to the 0.23 power?"},
+        config={"callbacks": [budget], "metadata": {"tenant_id": "acme"}},
+    )
+except BudgetExceededError as e:
+    print(f"Stopped before sending the request: {e}")
+print(budget.snapshot()["by_tenant"])
+
+# 按费用超出预算时改用更便宜的模型
+llm = with_budget_fallback(
+    OpenAI(model_name="gpt-3.5-turbo-instruct"), OpenAI(model_name="babbage-002")
+)
+print(llm.invoke("Tell me a joke", config={"callbacks": [budget], "metadata": {"tenant_id": "acme"}}))
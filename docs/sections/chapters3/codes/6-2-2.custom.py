@@ -37,3 +37,22 @@ except Exception as e:
 
 parser = BooleanOutputParser(true_val="OKAY")
 print(parser.invoke("OKAY"))
+
+
+# 流式调用时，收到完整的值和其后的分隔符就立即输出，并停止模型生成
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+from early_decision import EarlyBooleanOutputParser
+
+parser = EarlyBooleanOutputParser()
+print(parser.invoke("YES."))
+print(parser.decide("Yes,"), parser.decide("No"), parser.decide("Maybe"))
+
+prompt = PromptTemplate.from_template(
+    "Is this review positive?\n> Review: {review}\n{instructions}"
+).partial(instructions=parser.get_format_instructions())
+
+# 用with_model代替`prompt | ChatOpenAI() | parser`，做出决定后模型的流被关闭
+chain = prompt | parser.with_model(ChatOpenAI())
+print(chain.invoke({"review": "Great food and friendly staff."}))
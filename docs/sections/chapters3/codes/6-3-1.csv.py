@@ -18,3 +18,18 @@ print(chain.invoke({"subject": "ice cream flavors"}))
 
 for s in chain.stream({"subject": "ice cream flavors"}):
     print(s)
+
+# 每读到一个逗号就输出一项，后续步骤可以在模型还在生成时开始处理已经完成的项
+from streaming_list import StreamingCommaSeparatedListOutputParser, map_items
+
+
+def lookup(flavor: str) -> str:
+    return model.invoke(f"用一句话介绍{flavor}口味的冰淇淋。").content
+
+
+chain = prompt | model | StreamingCommaSeparatedListOutputParser()
+for s in chain.stream({"subject": "ice cream flavors"}):
+    print(s)
+
+for flavor, description in (chain | map_items(lookup)).stream({"subject": "ice cream flavors"}):
+    print(flavor, description)
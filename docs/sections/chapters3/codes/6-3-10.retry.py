@@ -36,3 +36,13 @@ from langchain.output_parsers import RetryOutputParser
 retry_parser = RetryOutputParser.from_llm(parser=parser, llm=OpenAI(temperature=0))
 retry_parser.parse_with_prompt(bad_response, prompt_value)
 Action(action="search", action_input="莱昂纳多·迪卡普里奥的女朋友")
+
+# 先在本地修复，修复失败时再用RetryOutputParser调用模型，每个请求最多调用一次
+from output_repair import RepairingOutputParser, repair_request
+
+repairing_parser = RepairingOutputParser.from_llm(
+    parser=parser, llm=OpenAI(temperature=0), retry=True, max_round_trips=1
+)
+with repair_request("leo-girlfriend"):
+    print(repairing_parser.parse_with_prompt(bad_response, prompt_value))
+print(repairing_parser.metrics.to_dict())
@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+from langchain.output_parsers import DatetimeOutputParser
+from langchain_core.exceptions import OutputParserException
+
+from bench import benchmark
+from bulk_datetime import BulkDatetimeOutputParser
+
+MALFORMED_RATE = 0.01
+"""格式错误的输出所占的比例。"""
+
+
+def make_outputs(count: int, seed: int = 0) -> list:
+    """生成count个模型输出，其中约1%格式错误（多余的文字、不存在的日期、缺少小数部分）。"""
+    rng = random.Random(seed)
+    start = datetime(1900, 1, 1)
+    outputs = []
+    for _ in range(count):
+        value = start + timedelta(
+            seconds=rng.randrange(4_000_000_000), microseconds=rng.randrange(1_000_000)
+        )
+        text = value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        if rng.random() < MALFORMED_RATE:
+            text = rng.choice(
+                [
+                    f"The answer is {text}",
+                    text[:5] + "02-30" + text[10:],
+                    text[:19] + "Z",
+                    "I don't know.",
+                ]
+            )
+        outputs.append(text)
+    return outputs
+
+
+def measure(fn):
+    """用bench.benchmark执行一次fn，返回(耗时秒数, 返回值)。"""
+    returned = []
+    result = benchmark(
+        lambda: returned.append(fn()), name=fn.__name__, runs=1, warmup=0, trace_memory=False
+    )
+    if result.errors:
+        # benchmark会吞掉异常，重新执行一次让异常抛出
+        fn()
+    return result.latencies[0], returned[0]
+
+
+def parse_loop(parser: DatetimeOutputParser, outputs: list) -> tuple:
+    """逐个调用parse，返回(结果列表, 出错的下标)。"""
+    values, errors = [], []
+    for i, text in enumerate(outputs):
+        try:
+            values.append(parser.parse(text))
+        except OutputParserException:
+            values.append(None)
+            errors.append(i)
+    return values, errors
+
+
+print("####################      step1 一次解析一批     ####################")
+parser = BulkDatetimeOutputParser()
+result = parser.parse_bulk(
+    [
+        "2023-07-04T14:30:00.000000Z",
+        " 1999-12-31T23:59:59.999999Z\n",
+        "0668-08-09T12:56:32.732651Z",
+        "2023-02-30T00:00:00.000000Z",
+        "2023-07-04T14:30:00.123Z",
+        "Bitcoin was founded in 2009.",
+    ]
+)
+print(result.values)
+print(result.errors)
+print(result.to_index())
+
+print("####################      step2 与逐个调用parse比较     ####################")
+loop_parser = DatetimeOutputParser()
+for count in (10_000, 100_000, 1_000_000):
+    outputs = make_outputs(count)
+    loop_seconds, (values, errors) = measure(lambda: parse_loop(loop_parser, outputs))
+    bulk_seconds, result = measure(lambda: parser.parse_bulk(outputs))
+    # 结果与逐个解析完全相同
+    assert list(result.invalid) == errors
+    expected = np.array([np.datetime64(v, "us") if v else np.datetime64("NaT") for v in values])
+    assert np.array_equal(result.values, expected, equal_nan=True)
+    print(
+        f"{count:>9} outputs, {len(errors)} malformed: "
+        f"loop {loop_seconds:.3f}s, parse_bulk {bulk_seconds:.3f}s, "
+        f"speedup {loop_seconds / bulk_seconds:.1f}x"
+    )
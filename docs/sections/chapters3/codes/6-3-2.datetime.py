@@ -18,3 +18,14 @@ PromptTemplate(
 chain = prompt | OpenAI() | output_parser
 output = chain.invoke({"question": "when was bitcoin founded?"})
 print(output)
+
+# 一次解析一批输出，无法解析的位置为NaT，并按下标记录原因
+from bulk_datetime import BulkDatetimeOutputParser
+
+bulk_parser = BulkDatetimeOutputParser()
+questions = ["when was bitcoin founded?", "when did apollo 11 land on the moon?"]
+outputs = (prompt | OpenAI()).batch([{"question": question} for question in questions])
+result = bulk_parser.parse_bulk(outputs)
+print(result.values)
+print(result.errors)
+print(result.to_index())
@@ -21,3 +21,21 @@ prompt = PromptTemplate.from_template(
 chain = prompt | ChatOpenAI() | parser
 
 print(chain.invoke({"person": "Frank Sinatra"}))
+
+
+# 流式调用时，收到"green."就能确定是GREEN，立即输出并停止模型生成
+from early_decision import EarlyEnumOutputParser
+
+parser = EarlyEnumOutputParser(enum=Colors)
+print(parser.decide("green"), parser.decide("green."))
+# eager=True时收到"gre"就决定，但流式结果可能与invoke不同
+print(EarlyEnumOutputParser(enum=Colors, eager=True).decide("gre"))
+
+prompt = PromptTemplate.from_template(
+    """What color eyes does this person have?\n> Person: {person}\nInstructions: {instructions}""",
+).partial(instructions=parser.get_format_instructions())
+
+chain = prompt | parser.with_model(ChatOpenAI())
+
+print(chain.invoke({"person": "Frank Sinatra"}))
+print(chain.batch([{"person": "Frank Sinatra"}, {"person": "Elizabeth Taylor"}]))
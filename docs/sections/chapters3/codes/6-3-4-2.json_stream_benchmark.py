@@ -0,0 +1,79 @@
+import json
+import time
+
+from langchain_core.output_parsers import JsonOutputParser
+
+from fake_models import FakeChatModel
+from incremental_json import IncrementalJsonOutputParser, IncrementalJsonParser, apply_patch
+
+CHUNK_SIZE = 16
+"""每块的字符数，接近模型流式输出时一块的大小。"""
+
+
+def make_document(target_bytes: int) -> dict:
+    """生成约target_bytes字节的JSON对象：一组带长文本的记录。"""
+    records = []
+    size = 0
+    while size < target_bytes:
+        record = {
+            "id": len(records),
+            "title": f"记录 {len(records)}",
+            "tags": ["alpha", "beta", "gamma"],
+            "score": len(records) * 0.5,
+            "body": "sparkling water is carbonated water. " * 8,
+        }
+        records.append(record)
+        size += len(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+    return {"records": records, "count": len(records)}
+
+
+def chunked(text: str, size: int = CHUNK_SIZE) -> list:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def time_stream(parser, chunks: list) -> tuple:
+    """返回(总耗时, 输出次数, 最后一次输出)。"""
+    start = time.perf_counter()
+    count, last = 0, None
+    for last in parser.transform(iter(chunks)):
+        count += 1
+    return time.perf_counter() - start, count, last
+
+
+print("####################      step1 逐块解析与JSON Patch     ####################")
+parser = IncrementalJsonParser()
+mirror = None
+for chunk in chunked('```json\n{"answer": "安东尼·列文虎克", "year": 1674, "tags": ["显微镜"]}\n```', 8):
+    ops = parser.feed(chunk)
+    mirror = apply_patch(mirror, ops)
+    print(repr(chunk), ops)
+print(parser.close(), mirror == parser.value)
+
+print("####################      step2 与JsonOutputParser比较     ####################")
+for kilobytes in (10, 30, 100):
+    text = json.dumps(make_document(kilobytes * 1024), ensure_ascii=False)
+    chunks = chunked(text)
+    print(f"{len(text.encode('utf-8')) / 1024:.0f}KB, {len(chunks)} chunks")
+    parsers = {
+        "IncrementalJsonOutputParser(diff=True)": IncrementalJsonOutputParser(diff=True),
+        "IncrementalJsonOutputParser()": IncrementalJsonOutputParser(),
+        "IncrementalJsonOutputParser(copy_partials=False)": IncrementalJsonOutputParser(
+            copy_partials=False
+        ),
+        # 每块都重新解析全部文本，100KB时需要几十秒
+        "JsonOutputParser()": JsonOutputParser(),
+    }
+    results = {}
+    for name, json_parser in parsers.items():
+        seconds, count, last = time_stream(json_parser, chunks)
+        results[name] = seconds
+        print(f"  {name:<50} {seconds:8.3f}s {count} outputs")
+    assert last == json.loads(text)
+    speedup = results["JsonOutputParser()"] / results["IncrementalJsonOutputParser()"]
+    print(f"  speedup {speedup:.0f}x")
+
+print("####################      step3 在链中使用     ####################")
+model = FakeChatModel(responses=[{"answer": "安东尼·列文虎克", "year": 1674}])
+chain = model | IncrementalJsonOutputParser()
+for s in chain.stream("谁发明了显微镜？"):
+    print(s)
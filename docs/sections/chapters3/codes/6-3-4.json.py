@@ -45,3 +45,16 @@ prompt = PromptTemplate(
 chain = prompt | model | parser
 
 print(chain.invoke({"query": joke_query}))
+
+# 流式输出较长的JSON时，IncrementalJsonOutputParser每块只解析新的字符
+from incremental_json import IncrementalJsonOutputParser
+
+parser = IncrementalJsonOutputParser(pydantic_object=Joke)
+chain = prompt | model | parser
+for s in chain.stream({"query": joke_query}):
+    print(s)
+
+# diff=True时输出每块的变化
+chain = prompt | model | IncrementalJsonOutputParser(diff=True)
+for ops in chain.stream({"query": joke_query}):
+    print(ops)
@@ -22,3 +22,12 @@ from langchain.output_parsers import OutputFixingParser
 new_parser = OutputFixingParser.from_llm(parser=parser, llm=ChatOpenAI())
 
 print(new_parser.parse(misformatted))
+
+# 先在本地修复，只有修复失败时才调用模型
+from output_repair import RepairingOutputParser
+
+repairing_parser = RepairingOutputParser.from_llm(parser=parser, llm=ChatOpenAI())
+print(repairing_parser.parse(misformatted))
+print(repairing_parser.parse('```json\n{"name": "Tom Hanks", "film_names": ["Forrest Gump",],}\n```'))
+print(repairing_parser.parse('{"name": "Tom Hanks", "film_names": ["Forrest Gump", "Cast Away"'))
+print(repairing_parser.metrics.to_dict())
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from langchain.output_parsers import PandasDataFrameOutputParser
+
+from fake_models import FakeChatModel
+from large_dataframe import LargeDataFrameOutputParser
+
+ROWS = 5_000_000
+"""DataFrame的行数。"""
+
+REQUESTS = [
+    "mean:num_legs[1..3]",
+    f"sum:num_specimen_seen[0..{ROWS - 1}]",
+    "column:num_wings[1000..200000]",
+    "column:num_wings",
+]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+rng = np.random.default_rng(0)
+df = pd.DataFrame(
+    {
+        "num_legs": rng.integers(0, 9, ROWS),
+        "num_wings": rng.integers(0, 3, ROWS),
+        "num_specimen_seen": rng.integers(0, 20, ROWS),
+    }
+)
+
+print("####################      step1 与PandasDataFrameOutputParser比较     ####################")
+parser = PandasDataFrameOutputParser(dataframe=df)
+large_parser = LargeDataFrameOutputParser(dataframe=df)
+for request in REQUESTS:
+    seconds, expected = timed(parser.parse, request)
+    large_seconds, result = timed(large_parser.parse, request)
+    for key, value in expected.items():
+        if isinstance(value, pd.Series):
+            assert value.equals(result[key])
+        else:
+            assert value == result[key]
+    print(f"{request:<40} {seconds:8.4f}s {large_seconds:8.4f}s")
+
+print("####################      step2 按块输出结果     ####################")
+# 整列转换成字典
+seconds, _ = timed(
+    lambda: {key: value.to_dict() for key, value in parser.parse("column:num_wings").items()}
+)
+print(f"to_dict: {seconds:.3f}s")
+# 逐块转换，第一块很快就能输出
+start = time.perf_counter()
+for i, chunk in enumerate(large_parser.iter_chunks(large_parser.parse("column:num_wings"))):
+    records = chunk["num_wings"].to_dict()
+    if i == 0:
+        print(f"first chunk ({len(records)} rows): {time.perf_counter() - start:.3f}s")
+print(f"all {i + 1} chunks: {time.perf_counter() - start:.3f}s")
+
+# 在链中按块输出
+model = FakeChatModel(responses=["column:num_wings"])
+chain = model | large_parser
+print([len(chunk["num_wings"]) for chunk in chain.stream("检索 num_wings 列。")][:5])
+
+print("####################      step3 内存映射的Arrow文件     ####################")
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "animals.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    del table
+    allocated = pa.total_allocated_bytes()
+    seconds, arrow_parser = timed(LargeDataFrameOutputParser.from_ipc, path)
+    print(f"from_ipc: {seconds:.4f}s, {pa.total_allocated_bytes() - allocated} bytes allocated")
+    print(arrow_parser.dataframe.dtypes.to_dict())
+    for request in REQUESTS[:3]:
+        seconds, result = timed(arrow_parser.parse, request)
+        print(f"{request:<40} {seconds:8.4f}s")
+    del arrow_parser
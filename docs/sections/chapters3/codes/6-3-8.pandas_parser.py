@@ -71,3 +71,18 @@ prompt = PromptTemplate(
 )
 chain = prompt | model | parser
 parser_output = chain.invoke({"query": df_query})
+
+
+# 几百万行的DataFrame：结果是原数据的视图，按块输出，不整列转换成字典
+from large_dataframe import LargeDataFrameOutputParser
+
+large_parser = LargeDataFrameOutputParser(dataframe=df, chunk_size=2)
+prompt = PromptTemplate(
+    template="回答用户查询。\n{format_instructions}\n{query}\n",
+    input_variables=["query"],
+    partial_variables={"format_instructions": large_parser.get_format_instructions()},
+)
+chain = prompt | model | large_parser
+for chunk in chain.stream({"query": "检索 num_wings 列。"}):
+    print({key: value.to_dict() for key, value in chunk.items()})
+print(chain.invoke({"query": "从第 1 行到第 3 行检索 num_legs 列的平均值。"}))
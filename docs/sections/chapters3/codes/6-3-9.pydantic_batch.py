@@ -0,0 +1,68 @@
+import json
+from typing import List
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+from pydantic import BaseModel, Field
+
+from bench import benchmark
+from compiled_pydantic import CompiledPydanticOutputParser
+from fake_models import FakeLLM
+
+N_GENERATIONS = 5000
+
+
+class Actor(BaseModel):
+    name: str = Field(description="name of an actor")
+    film_names: List[str] = Field(description="list of names of films they starred in")
+
+
+generations = [
+    json.dumps({"name": f"Actor {i}", "film_names": ["Forrest Gump", "Cast Away", f"Film {i}"]})
+    for i in range(N_GENERATIONS)
+]
+ndjson = "\n".join(generations)
+
+print("####################      step1 格式说明     ####################")
+for parser in (
+    PydanticOutputParser(pydantic_object=Actor),
+    CompiledPydanticOutputParser(pydantic_object=Actor),
+):
+    result = benchmark(
+        parser.get_format_instructions,
+        name=type(parser).__name__,
+        runs=2000,
+        warmup=10,
+        trace_memory=False,
+    )
+    print(f"get_format_instructions {result}")
+
+print("####################      step2 逐个解析与批量解析     ####################")
+parser = PydanticOutputParser(pydantic_object=Actor)
+compiled = CompiledPydanticOutputParser(pydantic_object=Actor)
+scenarios = {
+    "PydanticOutputParser.parse": lambda: [parser.parse(text) for text in generations],
+    "Compiled.parse": lambda: [compiled.parse(text) for text in generations],
+    "Compiled.parse_batch(list)": lambda: compiled.parse_batch(generations),
+    "Compiled.parse_batch(ndjson)": lambda: compiled.parse_batch(ndjson),
+}
+results = {}
+for name, fn in scenarios.items():
+    results[name] = benchmark(fn, name=name, runs=10, warmup=2, trace_memory=False)
+    rate = N_GENERATIONS / results[name].summary()["p50"]
+    print(f"{results[name]} {rate:10.0f} objects/s")
+baseline = results["PydanticOutputParser.parse"].summary()["p50"]
+for name, result in results.items():
+    print(f"{name:<30} {baseline / result.summary()['p50']:6.1f}x")
+assert compiled.parse_batch(generations) == [parser.parse(text) for text in generations]
+
+print("####################      step3 解析batch()的输出     ####################")
+prompt = PromptTemplate(
+    template="Generate the filmography for {actor}.\n{format_instructions}\n",
+    input_variables=["actor"],
+    partial_variables={"format_instructions": compiled.get_format_instructions()},
+)
+model = FakeLLM(responses=generations[:3] + ['{"name": "Tom Hanks"}'])
+outputs = (prompt | model).batch([{"actor": f"actor {i}"} for i in range(6)])
+for actor in compiled.parse_batch(outputs, return_exceptions=True):
+    print(actor if isinstance(actor, Actor) else f"error: {type(actor).__name__}")
@@ -0,0 +1,281 @@
+import asyncio
+import functools
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+
+def timing_decorator(func: Callable) -> Callable:
+    """打印函数单次执行耗时的装饰器，使用单调时钟time.perf_counter。
+    只需要一个数字时使用；需要分位数、吞吐量和内存变化时使用`benchmark`。
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        print(f"{func.__name__} took {elapsed:.6f} seconds to execute.")
+        return result
+
+    return wrapper
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """对已排序的数据按线性插值计算q分位数（0 <= q <= 100）。"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = math.ceil(position)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+@dataclass
+class BenchmarkResult:
+    """一个场景的测量结果，时间单位为秒，内存单位为字节。"""
+
+    name: str
+    runs: int
+    warmup: int
+    concurrency: int
+    wall_seconds: float
+    latencies: List[float] = field(repr=False)
+    memory_delta: Optional[int] = None
+    memory_peak: Optional[int] = None
+    errors: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        values = sorted(self.latencies)
+        return {
+            "name": self.name,
+            "runs": self.runs,
+            "warmup": self.warmup,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "mean": sum(values) / len(values) if values else 0.0,
+            "min": values[0] if values else 0.0,
+            "max": values[-1] if values else 0.0,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "throughput": self.runs / self.wall_seconds if self.wall_seconds else 0.0,
+            "memory_delta": self.memory_delta,
+            "memory_peak": self.memory_peak,
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        line = (
+            f"{self.name:<28} p50={s['p50'] * 1000:8.2f}ms p95={s['p95'] * 1000:8.2f}ms "
+            f"p99={s['p99'] * 1000:8.2f}ms {s['throughput']:9.1f}/s"
+        )
+        if self.memory_delta is not None:
+            line += f" mem={self.memory_delta / 1024:+.1f}KiB"
+        if self.errors:
+            line += f" errors={self.errors}"
+        return line
+
+
+def _timed(fn: Callable[[], Any]) -> Optional[float]:
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception:
+        return None
+    return time.perf_counter() - start
+
+
+class _MemoryTracker:
+    """用tracemalloc测量一段代码前后的内存变化与峰值（相对开始时）。
+    tracemalloc会明显拖慢Python代码，因此内存在计时之后单独测量一轮。
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.delta: Optional[int] = None
+        self.peak: Optional[int] = None
+
+    def __enter__(self) -> "_MemoryTracker":
+        if self.enabled:
+            self._started = not tracemalloc.is_tracing()
+            if self._started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._before = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.enabled:
+            current, peak = tracemalloc.get_traced_memory()
+            self.delta, self.peak = current - self._before, peak - self._before
+            if self._started:
+                tracemalloc.stop()
+
+
+def _result(
+    name: str, warmup: int, concurrency: int, wall: float,
+    timings: List[Optional[float]], memory: _MemoryTracker,
+) -> BenchmarkResult:
+    latencies = [t for t in timings if t is not None]
+    return BenchmarkResult(
+        name=name,
+        runs=len(timings),
+        warmup=warmup,
+        concurrency=concurrency,
+        wall_seconds=wall,
+        latencies=latencies,
+        memory_delta=memory.delta,
+        memory_peak=memory.peak,
+        errors=len(timings) - len(latencies),
+    )
+
+
+def benchmark(
+    fn: Callable[[], Any],
+    name: Optional[str] = None,
+    runs: int = 20,
+    warmup: int = 3,
+    concurrency: int = 1,
+    trace_memory: bool = True,
+) -> BenchmarkResult:
+    """测量无参可调用对象fn：先执行warmup次预热（不计入结果），再执行runs次。
+    concurrency大于1时在线程池中并发执行，吞吐量按墙钟时间计算。
+    抛出异常的调用计入errors，不计入延迟。trace_memory为True时再执行runs次测量内存。
+    """
+    for _ in range(warmup):
+        _timed(fn)
+    start = time.perf_counter()
+    if concurrency <= 1:
+        timings = [_timed(fn) for _ in range(runs)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(lambda _: _timed(fn), range(runs)))
+    wall = time.perf_counter() - start
+    with _MemoryTracker(trace_memory) as memory:
+        if trace_memory:
+            for _ in range(runs):
+                _timed(fn)
+    return _result(name or fn.__name__, warmup, concurrency, wall, timings, memory)
+
+
+async def abenchmark(
+    fn: Callable[[], Awaitable[Any]],
+    name: Optional[str] = None,
+    runs: int = 20,
+    warmup: int = 3,
+    concurrency: int = 1,
+    trace_memory: bool = True,
+) -> BenchmarkResult:
+    """benchmark的异步版本，fn返回协程；concurrency限制同时执行的协程数。"""
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def timed() -> Optional[float]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await fn()
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+    for _ in range(warmup):
+        await timed()
+    start = time.perf_counter()
+    timings = list(await asyncio.gather(*(timed() for _ in range(runs))))
+    wall = time.perf_counter() - start
+    with _MemoryTracker(trace_memory) as memory:
+        if trace_memory:
+            await asyncio.gather(*(timed() for _ in range(runs)))
+    return _result(name or fn.__name__, warmup, concurrency, wall, timings, memory)
+
+
+def environment() -> Dict[str, Any]:
+    """记录运行环境，便于比较不同版本的结果。"""
+    info: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+    }
+    for package in ("langchain_core", "langchain", "langchain_openai"):
+        try:
+            module = __import__(package)
+        except ImportError:
+            continue
+        info[package] = getattr(module, "__version__", None)
+    return info
+
+
+class BenchmarkSuite:
+    """一组命名的场景。运行后可以写成JSON，并与之前的JSON比较。
+    Example:
+        suite = BenchmarkSuite()
+        suite.add("chain", lambda: chain.invoke({"topic": "bears"}))
+        suite.run()
+        suite.write_json("bench.json")
+    """
+
+    def __init__(self, runs: int = 20, warmup: int = 3, trace_memory: bool = True):
+        self.runs = runs
+        self.warmup = warmup
+        self.trace_memory = trace_memory
+        self.scenarios: Dict[str, Dict[str, Any]] = {}
+        self.results: List[BenchmarkResult] = []
+
+    def add(self, name: str, fn: Callable[[], Any], **options: Any) -> None:
+        """注册一个场景，options覆盖runs/warmup/concurrency/trace_memory。"""
+        self.scenarios[name] = {"fn": fn, **options}
+
+    def run(self, verbose: bool = True) -> List[BenchmarkResult]:
+        self.results = []
+        for name, scenario in self.scenarios.items():
+            options = {
+                "runs": self.runs,
+                "warmup": self.warmup,
+                "trace_memory": self.trace_memory,
+                **scenario,
+            }
+            result = benchmark(name=name, **options)
+            self.results.append(result)
+            if verbose:
+                print(result)
+        return self.results
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "environment": environment(),
+            "results": [result.summary() for result in self.results],
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+
+def compare(
+    baseline_path: str, current: Dict[str, Any], metric: str = "p50"
+) -> List[Dict[str, Any]]:
+    """比较两次运行中同名场景的指标，返回每个场景的(基线, 当前, 变化比例)。"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    rows = []
+    for result in current["results"]:
+        old = baseline.get(result["name"])
+        if old is None:
+            continue
+        before, after = old[metric], result[metric]
+        rows.append(
+            {
+                "name": result["name"],
+                "baseline": before,
+                "current": after,
+                "change": (after - before) / before if before else None,
+            }
+        )
+    return rows
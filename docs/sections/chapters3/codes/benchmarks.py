@@ -0,0 +1,113 @@
+import argparse
+
+from langchain_core.output_parsers import (
+    CommaSeparatedListOutputParser,
+    JsonOutputParser,
+    StrOutputParser,
+)
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from bench import BenchmarkSuite, compare
+from fake_models import FakeChatModel, FakeLLM, LatencyProfile
+from memory_cache import BoundedInMemoryCache
+from semantic_cache import NgramEmbeddings
+
+
+def build_suite(runs: int, warmup: int, latency: float) -> BenchmarkSuite:
+    """示例中各条链在本地替身模型上的基准场景。"""
+    profile = LatencyProfile(ttft=latency)
+    suite = BenchmarkSuite(runs=runs, warmup=warmup)
+
+    # prompt -> 聊天模型 -> 列表解析（1.quickstart.py的组合链）
+    list_parser = CommaSeparatedListOutputParser()
+    list_chain = (
+        ChatPromptTemplate.from_template(
+            "Generate a list of 5 {text}.\n\n{format_instructions}"
+        ).partial(format_instructions=list_parser.get_format_instructions())
+        | FakeChatModel(responses=["red, blue, green, yellow, purple"], latency=profile)
+        | list_parser
+    )
+    suite.add("chat_list_chain", lambda: list_chain.invoke({"text": "colors"}))
+
+    # prompt -> LLM -> 字符串解析
+    llm_chain = (
+        PromptTemplate.from_template("Tell me a joke about {topic}")
+        | FakeLLM(responses=["Why did the bear cross the road?"], latency=profile)
+        | StrOutputParser()
+    )
+    suite.add("llm_str_chain", lambda: llm_chain.invoke({"topic": "bears"}))
+
+    # prompt -> 聊天模型 -> JSON解析
+    json_chain = (
+        ChatPromptTemplate.from_template("Describe {name} as JSON")
+        | FakeChatModel(responses=[{"name": "Tom Hanks", "films": ["Big"]}], latency=profile)
+        | JsonOutputParser()
+    )
+    suite.add("chat_json_chain", lambda: json_chain.invoke({"name": "Tom Hanks"}))
+
+    # RAG（codes/3.LCEL/2.rag.py），嵌入与向量库都在本地
+    vectorstore = InMemoryVectorStore.from_texts(
+        ["harrison worked at kensho", "bears like to eat honey"],
+        embedding=NgramEmbeddings(),
+    )
+    rag_chain = (
+        RunnableParallel({"context": vectorstore.as_retriever(), "question": RunnablePassthrough()})
+        | ChatPromptTemplate.from_template(
+            "Answer the question based only on the following context:\n"
+            "{context}\n\nQuestion: {question}\n"
+        )
+        | FakeChatModel(responses=["Harrison worked at Kensho."], latency=profile)
+        | StrOutputParser()
+    )
+    suite.add("rag_chain", lambda: rag_chain.invoke("where did harrison work?"))
+
+    # 缓存与不缓存（4-3-1.caching.py）
+    uncached = FakeChatModel(responses=["Why did the chicken cross the road?"], latency=profile)
+    cached = FakeChatModel(
+        responses=["Why did the chicken cross the road?"],
+        latency=profile,
+        cache=BoundedInMemoryCache(maxsize=1000),
+    )
+    suite.add("chat_uncached", lambda: uncached.invoke("Tell me a joke"))
+    suite.add("chat_cached", lambda: cached.invoke("Tell me a joke"))
+
+    # 并发批量调用
+    suite.add(
+        "chat_list_chain_x8",
+        lambda: list_chain.invoke({"text": "colors"}),
+        concurrency=8,
+        runs=runs * 4,
+    )
+    return suite
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the example chains.")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005, help="stand-in model latency")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare p50 with an earlier JSON file")
+    args = parser.parse_args()
+
+    print("####################      step1 运行基准场景     ####################")
+    suite = build_suite(args.runs, args.warmup, args.latency)
+    suite.run()
+    if args.output:
+        suite.write_json(args.output)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        print("####################      step2 与基线比较     ####################")
+        for row in compare(args.baseline, suite.to_dict()):
+            change = "n/a" if row["change"] is None else f"{row['change']:+.1%}"
+            print(
+                f"{row['name']:<28} {row['baseline'] * 1000:8.2f}ms -> "
+                f"{row['current'] * 1000:8.2f}ms {change}"
+            )
+
+
+if __name__ == "__main__":
+    main()
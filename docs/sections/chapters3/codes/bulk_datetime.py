@@ -0,0 +1,213 @@
+import re
+from dataclasses import dataclass, field
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from langchain.output_parsers import DatetimeOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import Generation
+
+# 定宽的数字字段：(宽度, strptime缺省值)
+_FIELDS = {
+    "Y": (4, 1900),
+    "m": (2, 1),
+    "d": (2, 1),
+    "H": (2, 0),
+    "M": (2, 0),
+    "S": (2, 0),
+    "f": (6, 0),
+}
+_LIMITS = {"Y": (1, 9999), "m": (1, 12), "d": (1, 31), "H": (0, 23), "M": (0, 59), "S": (0, 59)}
+_DIRECTIVE = re.compile(r"%(.)")
+_US = {"H": 3_600_000_000, "M": 60_000_000, "S": 1_000_000, "f": 1}
+
+
+def compile_fixed_width(format: str) -> Optional[Tuple[int, Dict[int, int], Dict[str, int]]]:
+    """把只包含%Y %m %d %H %M %S %f和普通字符的格式编译为定宽布局：
+    (总宽度, {位置: 字符}, {字段: 起始位置})。包含其他指令或重复字段时返回None。
+    """
+    literals: Dict[int, int] = {}
+    fields: Dict[str, int] = {}
+    pos = 0
+    last = 0
+    for match in _DIRECTIVE.finditer(format):
+        for char in format[last : match.start()]:
+            literals[pos] = ord(char)
+            pos += 1
+        directive = match.group(1)
+        if directive == "%":
+            literals[pos] = ord("%")
+            pos += 1
+        elif directive in _FIELDS and directive not in fields:
+            fields[directive] = pos
+            pos += _FIELDS[directive][0]
+        else:
+            return None
+        last = match.end()
+    for char in format[last:]:
+        literals[pos] = ord(char)
+        pos += 1
+    return pos, literals, fields
+
+
+@dataclass
+class BulkDatetimeResult:
+    """parse_bulk的结果。values中无法解析的位置为NaT，errors按下标记录原因。"""
+
+    values: np.ndarray
+    errors: Dict[int, str] = field(default_factory=dict)
+
+    @property
+    def invalid(self) -> np.ndarray:
+        """无法解析的下标，升序。"""
+        return np.array(sorted(self.errors), dtype=np.int64)
+
+    @property
+    def valid(self) -> np.ndarray:
+        mask = np.ones(len(self.values), dtype=bool)
+        mask[self.invalid] = False
+        return mask
+
+    def to_index(self, name: Optional[str] = None) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.values, name=name)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def _text(output: Any) -> Any:
+    if isinstance(output, BaseMessage):
+        return output.content if isinstance(output.content, str) else ""
+    if isinstance(output, Generation):
+        return output.text
+    return output
+
+
+class BulkDatetimeOutputParser(DatetimeOutputParser):
+    """可以一次解析一批字符串的DatetimeOutputParser，parse的行为不变。
+    parse_bulk返回datetime64[us]数组（或pandas的DatetimeIndex），无法解析的位置为NaT，
+    并按下标记录原因，不抛出异常。
+    - 格式只包含%Y %m %d %H %M %S %f和普通字符时（默认格式就是这样），
+      把字符串数组看作定宽的字符矩阵，用NumPy一次检查分隔符、取出各字段的数字并校验范围
+      （包括每月的天数），再直接算出datetime64，不逐个调用strptime；
+    - 其他格式交给pandas.to_datetime；
+    - 没有解析成功的少数字符串（例如%f只有3位、前后有空白）再逐个用parse解析。
+    定宽格式接受的字符串和得到的值与parse完全相同，年份范围与datetime相同（1～9999）；
+    其他格式按pandas的规则解析，带时区（%z）的时间统一转换为UTC。
+    Example:
+        parser = BulkDatetimeOutputParser()
+        result = parser.parse_bulk(texts)
+        result.values, result.errors  # {3: "Could not parse datetime string: ..."}
+    """
+
+    chunk_size: int = 16384
+    """定宽格式每次处理的字符串个数。分块处理时中间数组较小，不会占用与整批数据成正比的内存。"""
+
+    def parse_bulk(
+        self, outputs: Union[Sequence[Union[str, BaseMessage, Generation]], np.ndarray, pd.Series]
+    ) -> BulkDatetimeResult:
+        """一次解析一批结果：字符串、消息或Generation的列表，或者字符串的数组、Series。"""
+        if isinstance(outputs, (np.ndarray, pd.Series)):
+            outputs = outputs.tolist()
+        texts = [output if type(output) is str else str(_text(output)) for output in outputs]
+        values = np.full(len(texts), np.datetime64("NaT", "us"))
+        if not texts:
+            return BulkDatetimeResult(values)
+        layout = compile_fixed_width(self.format)
+        if layout is not None:
+            parsed = np.zeros(len(texts), dtype=bool)
+            for start in range(0, len(texts), self.chunk_size):
+                end = start + self.chunk_size
+                parsed[start:end] = self._parse_fixed_width(
+                    texts[start:end], *layout, values[start:end]
+                )
+        else:
+            parsed = self._parse_pandas(texts, values)
+        errors: Dict[int, str] = {}
+        for i in np.flatnonzero(~parsed):
+            try:
+                parsed_datetime = self.parse(texts[i])
+            except OutputParserException:
+                errors[int(i)] = f"Could not parse datetime string: {texts[i]}"
+                continue
+            if parsed_datetime.tzinfo is not None:
+                parsed_datetime = parsed_datetime.astimezone(timezone.utc).replace(tzinfo=None)
+            values[i] = np.datetime64(parsed_datetime, "us")
+        return BulkDatetimeResult(values, errors)
+
+    @staticmethod
+    def _parse_fixed_width(
+        texts: List[str],
+        width: int,
+        literals: Dict[int, int],
+        fields: Dict[str, int],
+        values: np.ndarray,
+    ) -> np.ndarray:
+        """解析宽度正确的字符串，写入values；返回已经解析成功的掩码。"""
+        parsed = np.zeros(len(texts), dtype=bool)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        rows = np.flatnonzero(lengths == width)
+        if not len(rows):
+            return parsed
+        # 把所有字符串拼成一个UTF-32缓冲区，每个字符是一个码点；
+        # 再按起始位置取出宽度正确的字符串，得到每行一个字符串的矩阵
+        buffer = np.frombuffer(
+            "".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+        )
+        starts = np.cumsum(lengths) - lengths
+        codes = buffer[starts[rows, None] + np.arange(width)]
+        positions = np.fromiter(literals, dtype=np.int64, count=len(literals))
+        expected = np.fromiter(literals.values(), dtype=np.uint32, count=len(literals))
+        ok = (codes[:, positions] == expected).all(axis=1)
+        # 无符号减法：不是数字的字符会变成很大的数
+        digits = codes - np.uint32(ord("0"))
+        digit_columns = np.setdiff1d(np.arange(width), positions)
+        ok &= (digits[:, digit_columns] < 10).all(axis=1)
+        # 用一次矩阵乘法算出所有字段：每个字段的列按10的幂加权
+        weights = np.zeros((width, len(fields)), dtype=np.int64)
+        for column, (name, start) in enumerate(fields.items()):
+            size = _FIELDS[name][0]
+            weights[start : start + size, column] = 10 ** np.arange(size - 1, -1, -1)
+        matrix = np.where(digits < 10, digits, 0).astype(np.int64) @ weights
+        numbers: Dict[str, np.ndarray] = {}
+        for column, name in enumerate(fields):
+            number = matrix[:, column]
+            low, high = _LIMITS.get(name, (0, 10 ** _FIELDS[name][0] - 1))
+            ok &= (number >= low) & (number <= high)
+            numbers[name] = number
+        rows, ok_numbers = rows[ok], {name: number[ok] for name, number in numbers.items()}
+
+        def get(name: str) -> np.ndarray:
+            return ok_numbers.get(name, np.full(len(rows), _FIELDS[name][1], dtype=np.int64))
+
+        month = np.datetime64("1970", "Y") + (get("Y") - 1970)
+        month = month.astype("datetime64[M]") + (get("m") - 1)
+        day = month.astype("datetime64[D]") + (get("d") - 1)
+        # 超过当月天数的日期（例如2月30日）会进入下个月
+        in_month = day.astype("datetime64[M]") == month
+        micros = sum(get(name) * scale for name, scale in _US.items())
+        values[rows[in_month]] = (
+            day[in_month].astype("datetime64[us]") + micros[in_month].astype("timedelta64[us]")
+        )
+        parsed[rows[in_month]] = True
+        return parsed
+
+    def _parse_pandas(self, texts: List[str], values: np.ndarray) -> np.ndarray:
+        # 带时区的格式（%z）统一转换为UTC时间
+        utc = "%z" in self.format
+        result = pd.to_datetime(
+            pd.Series(texts).str.strip(), format=self.format, errors="coerce", utc=utc
+        )
+        if utc:
+            result = result.dt.tz_convert(None)
+        converted = result.to_numpy().astype("datetime64[us]")
+        parsed = ~np.isnat(converted)
+        values[parsed] = converted[parsed]
+        return parsed
+
+    @property
+    def _type(self) -> str:
+        return "bulk_datetime"
@@ -0,0 +1,262 @@
+"""LLM缓存的导出、导入与预热工具。
+
+导出文件是gzip压缩的JSON Lines：第一行是带版本号的文件头，之后每行一个缓存条目。
+
+    python cache_tools.py export wal:.langchain.db cache.jsonl.gz --llm gpt-4o-mini --max-age 86400
+    python cache_tools.py import cache.jsonl.gz tiered:.langchain.db,.langchain.blob
+    python cache_tools.py warmup prompts.txt wal:.langchain.db --target models:chat --stand-in models:fake
+"""
+
+import argparse
+import gzip
+import importlib
+import inspect
+import json
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.language_models import BaseChatModel, BaseLanguageModel
+from langchain_core.load import dumpd, dumps, load
+
+FORMAT = "langchain-llm-cache"
+VERSION = 1
+
+Entry = Tuple[str, str, RETURN_VAL_TYPE, Optional[float]]
+
+
+def open_cache(spec: str) -> BaseCache:
+    """按`类型:参数`打开缓存后端。
+    - `wal:.langchain.db`：WALSQLiteCache
+    - `tiered:.langchain.db,.langchain.blob`：TieredCache
+    - `sqlite:.langchain.db`：langchain的SQLiteCache
+    """
+    kind, _, arg = spec.partition(":")
+    if kind == "wal":
+        from sqlite_cache import WALSQLiteCache
+
+        return WALSQLiteCache(database_path=arg or ".langchain.db")
+    if kind == "tiered":
+        from tiered_cache import TieredCache
+
+        paths = [path for path in arg.split(",") if path]
+        return TieredCache(*paths)
+    if kind == "sqlite":
+        from langchain_community.cache import SQLiteCache
+
+        return SQLiteCache(database_path=arg or ".langchain.db")
+    raise ValueError(f"Unknown cache spec: {spec}")
+
+
+def iter_cache_entries(cache: BaseCache) -> Iterator[Entry]:
+    """遍历缓存条目，返回(prompt, llm_string, generations, 写入时间戳)。
+    本目录中的缓存实现了`iter_entries()`；langchain的SQLAlchemyCache/SQLiteCache
+    直接读取其数据表，写入时间未知，记为None。
+    """
+    if hasattr(cache, "iter_entries"):
+        yield from cache.iter_entries()
+        return
+    from langchain_community.cache import SQLAlchemyCache
+
+    if not isinstance(cache, SQLAlchemyCache):
+        raise TypeError(f"{type(cache).__name__} does not support iterating entries")
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    schema = cache.cache_schema
+    stmt = select(schema.prompt, schema.llm, schema.response).order_by(
+        schema.prompt, schema.llm, schema.idx
+    )
+    with Session(cache.engine) as session:
+        current: Optional[Tuple[str, str]] = None
+        generations: List[Any] = []
+        for prompt, llm_string, response in session.execute(stmt):
+            if (prompt, llm_string) != current:
+                if current is not None:
+                    yield current[0], current[1], generations, None
+                current, generations = (prompt, llm_string), []
+            generations.append(load(json.loads(response), allowed_objects="core"))
+        if current is not None:
+            yield current[0], current[1], generations, None
+
+
+def select_entries(
+    entries: Iterable[Entry], llm: Optional[str] = None, max_age: Optional[float] = None
+) -> Iterator[Entry]:
+    """按模型字符串（正则，搜索llm_string）和写入时间过滤条目。
+    指定max_age时，写入时间未知的条目会被跳过。
+    """
+    pattern = re.compile(llm) if llm else None
+    oldest = time.time() - max_age if max_age is not None else None
+    for entry in entries:
+        _, llm_string, _, created_at = entry
+        if pattern is not None and not pattern.search(llm_string):
+            continue
+        if oldest is not None and (created_at is None or created_at < oldest):
+            continue
+        yield entry
+
+
+def export_cache(
+    cache: BaseCache, path: str, llm: Optional[str] = None, max_age: Optional[float] = None
+) -> int:
+    """把缓存条目导出到gzip压缩的JSON Lines文件，返回导出的条目数。"""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        header = {"format": FORMAT, "version": VERSION, "exported_at": time.time()}
+        f.write(json.dumps(header) + "\n")
+        for prompt, llm_string, generations, created_at in select_entries(
+            iter_cache_entries(cache), llm, max_age
+        ):
+            record = {
+                "prompt": prompt,
+                "llm": llm_string,
+                "created_at": created_at,
+                "generations": [dumpd(generation) for generation in generations],
+            }
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def read_export(path: str) -> Iterator[Entry]:
+    """读取导出文件，检查文件头的格式与版本。"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != FORMAT:
+            raise ValueError(f"{path} is not an LLM cache export")
+        if header.get("version", 0) > VERSION:
+            raise ValueError(
+                f"{path} was written by a newer version ({header['version']} > {VERSION})"
+            )
+        for line in f:
+            record = json.loads(line)
+            yield (
+                record["prompt"],
+                record["llm"],
+                # 条目中只有Generation、ChatGeneration和消息，只允许反序列化core中的类
+                [load(generation, allowed_objects="core") for generation in record["generations"]],
+                record.get("created_at"),
+            )
+
+
+def import_cache(
+    cache: BaseCache, path: str, llm: Optional[str] = None, max_age: Optional[float] = None
+) -> int:
+    """把导出文件中的条目写入任意BaseCache，返回写入的条目数。
+    本目录中的缓存的update接受created_at，导入的条目保留原来的写入时间，ttl从它开始计算；
+    其余缓存把导入时间当作写入时间。
+    """
+    keeps_age = "created_at" in inspect.signature(cache.update).parameters
+    count = 0
+    for prompt, llm_string, generations, created_at in select_entries(
+        read_export(path), llm, max_age
+    ):
+        if keeps_age and created_at is not None:
+            cache.update(prompt, llm_string, generations, created_at=created_at)
+        else:
+            cache.update(prompt, llm_string, generations)
+        count += 1
+    if hasattr(cache, "flush"):
+        cache.flush()
+    return count
+
+
+def model_cache_key(model: BaseLanguageModel, model_input: Any) -> Tuple[str, str]:
+    """计算模型invoke(model_input)时使用的缓存键(prompt, llm_string)。"""
+    prompt_value = model._convert_input(model_input)
+    if isinstance(model, BaseChatModel):
+        return dumps(prompt_value.to_messages()), model._get_llm_string()
+    params = model._dict_for_compat()
+    params["stop"] = None
+    return prompt_value.to_string(), str(sorted(params.items()))
+
+
+def read_prompt_log(path: str) -> Iterator[str]:
+    """读取提示日志：每行一个提示；JSON行取其中的"prompt"字段。"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if line.startswith("{"):
+                yield json.loads(line)["prompt"]
+            else:
+                yield line
+
+
+def warmup(
+    cache: BaseCache,
+    prompts: Iterable[Any],
+    target: BaseLanguageModel,
+    stand_in: BaseLanguageModel,
+    skip_cached: bool = True,
+) -> Dict[str, int]:
+    """用替身模型离线预热缓存。
+    结果由stand_in生成，但按target的缓存键写入，部署后target的调用会直接命中。
+    stand_in与target需要是同一类模型（都是聊天模型或都是LLM）。
+    """
+    counts = {"written": 0, "skipped": 0}
+    for model_input in prompts:
+        prompt, llm_string = model_cache_key(target, model_input)
+        if skip_cached and cache.lookup(prompt, llm_string) is not None:
+            counts["skipped"] += 1
+            continue
+        result = stand_in.generate_prompt([stand_in._convert_input(model_input)])
+        cache.update(prompt, llm_string, result.generations[0])
+        counts["written"] += 1
+    if hasattr(cache, "flush"):
+        cache.flush()
+    return counts
+
+
+def _import_object(path: str) -> Any:
+    module, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export, import and warm up LLM caches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export cache entries to a file")
+    export_parser.add_argument("cache", help="cache spec, e.g. wal:.langchain.db")
+    export_parser.add_argument("path", help="output file (.jsonl.gz)")
+
+    import_parser = commands.add_parser("import", help="import entries into a cache")
+    import_parser.add_argument("path", help="exported file (.jsonl.gz)")
+    import_parser.add_argument("cache", help="cache spec, e.g. tiered:.langchain.db")
+
+    for sub in (export_parser, import_parser):
+        sub.add_argument("--llm", help="regex matched against the llm string")
+        sub.add_argument("--max-age", type=float, help="only entries newer than this (seconds)")
+
+    warmup_parser = commands.add_parser("warmup", help="fill a cache from a prompt log")
+    warmup_parser.add_argument("prompts", help="prompt log, one prompt or JSON object per line")
+    warmup_parser.add_argument("cache", help="cache spec, e.g. wal:.langchain.db")
+    warmup_parser.add_argument("--target", required=True, help="module:attr of the model to serve")
+    warmup_parser.add_argument("--stand-in", required=True, help="module:attr of the stand-in")
+
+    args = parser.parse_args(argv)
+    cache = open_cache(args.cache)
+    if args.command == "export":
+        count = export_cache(cache, args.path, args.llm, args.max_age)
+        print(f"exported {count} entries to {args.path}")
+    elif args.command == "import":
+        count = import_cache(cache, args.path, args.llm, args.max_age)
+        print(f"imported {count} entries into {args.cache}")
+    else:
+        counts = warmup(
+            cache,
+            read_prompt_log(args.prompts),
+            _import_object(args.target),
+            _import_object(args.stand_in),
+        )
+        print(f"warmed up {args.cache}: {counts}")
+    if hasattr(cache, "close"):
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
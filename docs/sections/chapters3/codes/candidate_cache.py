@@ -0,0 +1,184 @@
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.caches import BaseCache
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.outputs import Generation, LLMResult
+
+from native_batch import resolve_cache
+
+CANDIDATE_PARAMS = ("n", "best_of")
+"""只影响候选数量的参数，不参与候选缓存的键。"""
+
+
+def merge_llm_outputs(outputs: List[Optional[dict]]) -> Optional[dict]:
+    """合并多次调用的llm_output：token_usage中的数值相加，其余字段取最后一次的值。"""
+    merged: Dict[str, Any] = {}
+    usage: Dict[str, Any] = {}
+    for output in outputs:
+        if not output:
+            continue
+        for key, value in output.items():
+            if key == "token_usage" and isinstance(value, dict):
+                for name, count in value.items():
+                    if isinstance(count, (int, float)):
+                        usage[name] = usage.get(name, 0) + count
+            else:
+                merged[key] = value
+    if usage:
+        merged["token_usage"] = usage
+    return merged or None
+
+
+class CandidateCacheLLM(BaseLLM):
+    """按候选逐个缓存的LLM混入类，适用于`n>1`或`best_of`的请求。
+    默认的LLM缓存把n个候选作为一个整体缓存，键中包含n和best_of，
+    把n从2改为3就会完全未命中。这里把候选逐个累积在不含n/best_of的键下，
+    请求n个候选时复用已缓存的部分，只向模型请求缺少的数量。
+    模型自身的`cache`应设为False，避免整体结果再被缓存一次；
+    候选缓存使用`candidate_cache`，为None时使用全局缓存。
+    Example:
+        class CandidateCachedOpenAI(CandidateCacheLLM, OpenAI):
+            pass
+
+        llm = CandidateCachedOpenAI(model_name="gpt-3.5-turbo-instruct", n=2, best_of=2, cache=False)
+    """
+
+    candidate_cache: Union[BaseCache, bool, None] = None
+    """存放候选的缓存：实例直接使用，None/True使用全局缓存，False关闭候选缓存。"""
+
+    def _candidate_llm_string(self, stop: Optional[List[str]], **kwargs: Any) -> str:
+        params = {**self._dict_for_compat(), **kwargs, "stop": stop}
+        for name in CANDIDATE_PARAMS:
+            params.pop(name, None)
+        # 与整体缓存的llm_string区分开，两种条目不会互相覆盖
+        params["cache_mode"] = "candidates"
+        return str(sorted(params.items()))
+
+    def _candidate_counts(self, **kwargs: Any) -> Tuple[int, Optional[int]]:
+        n = kwargs.get("n", getattr(self, "n", 1)) or 1
+        best_of = kwargs.get("best_of", getattr(self, "best_of", None))
+        return n, best_of
+
+    def _request_kwargs(
+        self, missing: int, n: int, best_of: Optional[int], kwargs: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], int]:
+        """构造补齐missing个候选的请求参数，返回(参数, 预计返回的候选数)。"""
+        kwargs = {k: v for k, v in kwargs.items() if k not in CANDIDATE_PARAMS}
+        if "n" not in type(self).model_fields:
+            # 模型不支持n，每次调用只返回一个候选
+            return kwargs, 1
+        request = {**kwargs, "n": missing}
+        if best_of is not None and "best_of" in type(self).model_fields:
+            # 按比例缩小best_of，保持每个候选的筛选强度
+            request["best_of"] = max(missing, math.ceil(best_of * missing / n))
+        return request, missing
+
+    def _plan_round(
+        self,
+        candidates: List[List[Generation]],
+        exhausted: Set[int],
+        n: int,
+        best_of: Optional[int],
+        kwargs: Dict[str, Any],
+    ) -> List[Tuple[Dict[str, Any], int, List[int]]]:
+        """把还缺候选的提示按请求参数分组，返回[(参数, 预计返回的候选数, 提示下标), ...]。
+        参数相同的提示放在一次调用中，保留模型原生的多提示批量请求。
+        """
+        groups: Dict[Tuple[Any, Any], Tuple[Dict[str, Any], int, List[int]]] = {}
+        for i, found in enumerate(candidates):
+            if len(found) >= n or i in exhausted:
+                continue
+            request, expected = self._request_kwargs(n - len(found), n, best_of, kwargs)
+            key = (request.get("n"), request.get("best_of"))
+            groups.setdefault(key, (request, expected, []))[2].append(i)
+        return list(groups.values())
+
+    @staticmethod
+    def _collect(
+        result: LLMResult,
+        indexes: List[int],
+        expected: int,
+        candidates: List[List[Generation]],
+        exhausted: Set[int],
+    ) -> None:
+        for i, generated in zip(indexes, result.generations):
+            new = generated[:expected]
+            if not new:
+                # 模型没有返回候选，不再为这个提示重试
+                exhausted.add(i)
+            candidates[i].extend(new)
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        cache = resolve_cache(self.candidate_cache)
+        if cache is None:
+            return super()._generate(prompts, stop=stop, run_manager=run_manager, **kwargs)
+        n, best_of = self._candidate_counts(**kwargs)
+        llm_string = self._candidate_llm_string(stop, **kwargs)
+        candidates = [list(cache.lookup(prompt, llm_string) or []) for prompt in prompts]
+        cached = [len(found) for found in candidates]
+        outputs: List[Optional[dict]] = []
+        exhausted: Set[int] = set()
+        while True:
+            groups = self._plan_round(candidates, exhausted, n, best_of, kwargs)
+            if not groups:
+                break
+            for request, expected, indexes in groups:
+                result = super()._generate(
+                    [prompts[i] for i in indexes], stop=stop, run_manager=run_manager, **request
+                )
+                outputs.append(result.llm_output)
+                self._collect(result, indexes, expected, candidates, exhausted)
+        for prompt, found, count in zip(prompts, candidates, cached):
+            if len(found) > count:
+                cache.update(prompt, llm_string, found)
+        return LLMResult(
+            generations=[found[:n] for found in candidates],
+            llm_output=merge_llm_outputs(outputs),
+        )
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        cache = resolve_cache(self.candidate_cache)
+        if cache is None:
+            return await super()._agenerate(
+                prompts, stop=stop, run_manager=run_manager, **kwargs
+            )
+        n, best_of = self._candidate_counts(**kwargs)
+        llm_string = self._candidate_llm_string(stop, **kwargs)
+        candidates = [list(await cache.alookup(prompt, llm_string) or []) for prompt in prompts]
+        cached = [len(found) for found in candidates]
+        outputs: List[Optional[dict]] = []
+        exhausted: Set[int] = set()
+        while True:
+            groups = self._plan_round(candidates, exhausted, n, best_of, kwargs)
+            if not groups:
+                break
+            for request, expected, indexes in groups:
+                result = await super()._agenerate(
+                    [prompts[i] for i in indexes], stop=stop, run_manager=run_manager, **request
+                )
+                outputs.append(result.llm_output)
+                self._collect(result, indexes, expected, candidates, exhausted)
+        for prompt, found, count in zip(prompts, candidates, cached):
+            if len(found) > count:
+                await cache.aupdate(prompt, llm_string, found)
+        return LLMResult(
+            generations=[found[:n] for found in candidates],
+            llm_output=merge_llm_outputs(outputs),
+        )
@@ -0,0 +1,177 @@
+import asyncio
+import operator
+import time
+from functools import reduce
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional, TypeVar
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+T = TypeVar("T")
+
+
+def _byte_size(item: Any) -> int:
+    text = item if isinstance(item, str) else item.text
+    return len(text.encode("utf-8"))
+
+
+def _merge(items: List[T]) -> T:
+    if isinstance(items[0], str):
+        return "".join(items)
+    # ChatGenerationChunk/GenerationChunk支持`+`合并
+    return reduce(operator.add, items)
+
+
+def coalesce(
+    items: Iterable[T],
+    max_bytes: Optional[int] = None,
+    max_interval: Optional[float] = None,
+) -> Iterator[T]:
+    """把细粒度的流（字符串或生成块）合并成较大的块。
+    累计字节数达到`max_bytes`，或者距本组第一个元素到达已超过`max_interval`秒时输出一组。
+    第一个元素总是立即输出，保证首个token的到达时间不受影响。
+    同步版本只能在新元素到达时检查时间窗口。
+    """
+    if max_bytes is None and max_interval is None:
+        yield from items
+        return
+    buffer: List[T] = []
+    size = 0
+    started = 0.0
+    first = True
+    for item in items:
+        if first:
+            first = False
+            yield item
+            continue
+        if not buffer:
+            started = time.monotonic()
+        buffer.append(item)
+        size += _byte_size(item)
+        if (max_bytes is not None and size >= max_bytes) or (
+            max_interval is not None and time.monotonic() - started >= max_interval
+        ):
+            yield _merge(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield _merge(buffer)
+
+
+async def acoalesce(
+    items: AsyncIterator[T],
+    max_bytes: Optional[int] = None,
+    max_interval: Optional[float] = None,
+) -> AsyncIterator[T]:
+    """coalesce的异步版本。
+    时间窗口由计时器驱动：即使上游暂时没有新元素，窗口到期后缓冲内容也会被输出。
+    """
+    if max_bytes is None and max_interval is None:
+        async for item in items:
+            yield item
+        return
+    iterator = items.__aiter__()
+    buffer: List[T] = []
+    size = 0
+    deadline: Optional[float] = None
+    first = True
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # 时间窗口到期，上游还没有新元素
+                yield _merge(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+            try:
+                item = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+            if first:
+                first = False
+                yield item
+                continue
+            if not buffer and max_interval is not None:
+                deadline = time.monotonic() + max_interval
+            buffer.append(item)
+            size += _byte_size(item)
+            if max_bytes is not None and size >= max_bytes:
+                yield _merge(buffer)
+                buffer, size, deadline = [], 0, None
+        if buffer:
+            yield _merge(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+class CoalescingChatModel(BaseChatModel):
+    """为任意流式聊天模型增加块合并模式。
+    把它放在具体模型之前组成一个新类，即可把逐字符/逐token的块合并后再触发回调：
+    Example:
+        class CoalescedChatOpenAI(CoalescingChatModel, ChatOpenAI):
+            pass
+
+        model = CoalescedChatOpenAI(coalesce_interval=0.02)
+    """
+
+    coalesce_bytes: Optional[int] = None
+    """累计多少字节后输出一个合并块。"""
+
+    coalesce_interval: Optional[float] = None
+    """合并窗口的秒数，例如0.02表示每20毫秒最多输出一个块。"""
+
+    def _coalescing(self) -> bool:
+        return self.coalesce_bytes is not None or self.coalesce_interval is not None
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if not self._coalescing():
+            yield from super()._stream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+            return
+        # 内层流不再逐块触发回调，合并后的块才触发一次
+        chunks = super()._stream(messages, stop=stop, run_manager=None, **kwargs)
+        for chunk in coalesce(chunks, self.coalesce_bytes, self.coalesce_interval):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if not self._coalescing():
+            async for chunk in super()._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
+            return
+        chunks = super()._astream(messages, stop=stop, run_manager=None, **kwargs)
+        async for chunk in acoalesce(
+            chunks, self.coalesce_bytes, self.coalesce_interval
+        ):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,134 @@
+import json
+from functools import lru_cache
+from typing import Any, List, Sequence, Union
+
+import pydantic
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import Generation
+
+
+class CompiledSchema:
+    """一个Pydantic模型编译一次的内容：格式说明和校验器。
+    Pydantic v2的模型直接用pydantic-core在Rust中解析JSON并校验（validate_json），
+    一批对象用List[Model]的校验器一次完成；v1的模型（langchain_core.pydantic_v1）
+    退回parse_obj，仍然只生成一次格式说明。
+    """
+
+    def __init__(self, pydantic_object: type, format_instructions: str):
+        self.pydantic_object = pydantic_object
+        self.format_instructions = format_instructions
+        self.is_v2 = issubclass(pydantic_object, pydantic.BaseModel)
+        if self.is_v2:
+            self._validate_json = pydantic_object.__pydantic_validator__.validate_json
+            self._validate_json_list = pydantic.TypeAdapter(List[pydantic_object]).validate_json
+        else:
+            self._validate_json = lambda text: pydantic_object.parse_obj(json.loads(text))
+            self._validate_json_list = lambda text: [
+                pydantic_object.parse_obj(obj) for obj in json.loads(text)
+            ]
+
+    def validate_json(self, text: Union[str, bytes]) -> Any:
+        return self._validate_json(text)
+
+    def validate_json_list(self, text: Union[str, bytes]) -> List[Any]:
+        return self._validate_json_list(text)
+
+
+@lru_cache(maxsize=None)
+def compile_schema(pydantic_object: type) -> CompiledSchema:
+    """按模型类缓存CompiledSchema。"""
+    instructions = PydanticOutputParser(pydantic_object=pydantic_object).get_format_instructions()
+    return CompiledSchema(pydantic_object, instructions)
+
+
+def _text(output: Union[str, BaseMessage, Generation]) -> str:
+    if isinstance(output, BaseMessage):
+        return output.content if isinstance(output.content, str) else ""
+    if isinstance(output, Generation):
+        return output.text
+    return output
+
+
+class CompiledPydanticOutputParser(PydanticOutputParser):
+    """每个模型类只编译一次的PydanticOutputParser。
+    - get_format_instructions()返回缓存的字符串，不再每次生成JSON Schema；
+    - parse先把整段文本交给编译好的校验器（解析JSON与校验一次完成），
+      失败时（例如带```json代码块或校验不通过）再走PydanticOutputParser的逻辑，
+      异常与PydanticOutputParser相同；
+    - parse_batch一次校验多个结果：batch()的输出列表、一个JSON数组，或NDJSON（每行一个对象）。
+    Example:
+        parser = CompiledPydanticOutputParser(pydantic_object=Joke)
+        jokes = parser.parse_batch((prompt | model).batch(inputs))
+    """
+
+    @property
+    def compiled(self) -> CompiledSchema:
+        return compile_schema(self.pydantic_object)
+
+    def get_format_instructions(self) -> str:
+        return self.compiled.format_instructions
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        if not partial:
+            try:
+                return self.compiled.validate_json(result[0].text)
+            except (ValueError, pydantic.ValidationError, pydantic.v1.ValidationError):
+                pass
+        return super().parse_result(result, partial=partial)
+
+    def parse_batch(
+        self,
+        outputs: Union[str, Sequence[Union[str, BaseMessage, Generation]]],
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """校验一批结果。outputs可以是：
+        - 一个字符串：JSON数组，或NDJSON（每行一个JSON对象）；
+        - 字符串、消息或Generation的列表，例如`(prompt | model).batch(inputs)`的结果。
+        先把所有对象拼成一个JSON数组一次校验；失败时逐个解析，定位出错的结果。
+        return_exceptions为True时，出错的位置返回OutputParserException，而不是抛出。
+        """
+        if isinstance(outputs, str):
+            stripped = outputs.strip()
+            if stripped.startswith("["):
+                try:
+                    return self.compiled.validate_json_list(stripped)
+                except (ValueError, pydantic.ValidationError, pydantic.v1.ValidationError):
+                    texts: List[str] = [json.dumps(obj) for obj in self._json_array(stripped)]
+            else:
+                texts = [line for line in stripped.splitlines() if line.strip()]
+        else:
+            texts = [_text(output).strip() for output in outputs]
+        if not texts:
+            return []
+        try:
+            parsed = self.compiled.validate_json_list("[" + ",".join(texts) + "]")
+            # 某个结果本身包含多个对象（例如"{...}, {...}"）时数量对不上，逐个解析
+            if len(parsed) == len(texts):
+                return parsed
+        except (ValueError, pydantic.ValidationError, pydantic.v1.ValidationError):
+            pass
+        return [self._parse_one(text, return_exceptions) for text in texts]
+
+    def _json_array(self, text: str) -> List[Any]:
+        try:
+            array = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text) from e
+        if not isinstance(array, list):
+            raise OutputParserException(f"Expected a JSON array: {text}", llm_output=text)
+        return array
+
+    def _parse_one(self, text: str, return_exceptions: bool) -> Any:
+        try:
+            return self.parse(text)
+        except OutputParserException as e:
+            if return_exceptions:
+                return e
+            raise
+
+    @property
+    def _type(self) -> str:
+        return "compiled_pydantic"
+
@@ -0,0 +1,191 @@
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple, Type, Union
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import BaseTransformOutputParser
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableGenerator
+
+_LEADING = " \t\r\n\"'`*"
+PENDING, DECIDED, INVALID = "pending", "decided", "invalid"
+
+
+class EarlyDecisionParser(BaseTransformOutputParser[Any]):
+    """从有限的几个标签中选一个的解析器，流式调用时能确定结果就立即输出。
+    例如标签为YES/NO时，收到"Yes,"就输出True，不再读取后面的内容。要让模型同时停止生成、
+    节省完成token，使用`prompt | parser.with_model(model)`代替`prompt | model | parser`。
+    匹配时忽略大小写和开头的空白、引号、`*`；完整的标签后面跟着非字母数字（例如"YES."）
+    也算匹配。前缀不可能匹配任何标签时立即抛出OutputParserException。
+    默认收到完整的标签和其后的分隔符才做决定，这时后面的内容不会再改变parse的结果；
+    只收到标签本身（"NO"）时仍可能是另一个词（"NOT"）的开头，要等下一个字符或流结束。
+    eager=True时前缀只能匹配一个标签就立即决定，更早，但流式结果可能与parse不一致：
+    例如"Not sure, it depends"在收到"N"时就输出False，而parse会抛出异常。
+    子类实现`_choices()`，返回标签到值的映射。
+    """
+
+    eager: bool = False
+    """前缀只能匹配一个标签时就做决定，不等完整的标签。"""
+
+    min_chars: int = 1
+    """eager=True时至少收到多少个字符才做决定。标签的开头容易被其他词冒充时（例如"No"与"Not sure"）可以调大。"""
+
+    def _choices(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _labels(self) -> Dict[str, Any]:
+        return {label.strip().upper(): value for label, value in self._choices().items()}
+
+    def decide(self, text: str, final: bool = False) -> Tuple[str, Any]:
+        """根据已经收到的文本做决定，返回(PENDING/DECIDED/INVALID, 值)。
+        final为True表示文本已经完整，此时只接受完整的标签。
+        """
+        prefix = text.lstrip(_LEADING).upper()
+        if not prefix:
+            return (INVALID, None) if final else (PENDING, None)
+        labels = self._labels()
+        alive: Dict[str, Any] = {}
+        complete: Dict[str, Any] = {}
+        for label, value in labels.items():
+            if label.startswith(prefix):
+                alive[label] = value
+                if label == prefix:
+                    complete[label] = value
+            elif prefix.startswith(label) and not prefix[len(label)].isalnum():
+                alive[label] = value
+                complete[label] = value
+        values = {repr(value) for value in alive.values()}
+        if not values:
+            return INVALID, None
+        if final:
+            if complete:
+                # 有多个完整标签时取最长的一个
+                return DECIDED, complete[max(complete, key=len)]
+            return INVALID, None
+        if len(values) == 1:
+            if self.eager and len(prefix) >= self.min_chars:
+                return DECIDED, next(iter(alive.values()))
+            # 完整的标签后面已经出现分隔符，之后的内容不会再改变结果
+            if any(len(prefix) > len(label) for label in complete):
+                return DECIDED, next(iter(alive.values()))
+        return PENDING, None
+
+    def _invalid(self, text: str) -> OutputParserException:
+        options = ", ".join(self._choices())
+        return OutputParserException(
+            f"{type(self).__name__} expected one of {options} (case-insensitive). "
+            f"Received {text.strip()!r}.",
+            llm_output=text,
+        )
+
+    def parse(self, text: str) -> Any:
+        status, value = self.decide(text, final=True)
+        if status != DECIDED:
+            raise self._invalid(text)
+        return value
+
+    @staticmethod
+    def _text(chunk: Union[str, BaseMessage]) -> str:
+        if isinstance(chunk, BaseMessage):
+            return chunk.content if isinstance(chunk.content, str) else ""
+        return chunk
+
+    def _step(self, buffer: str) -> Tuple[bool, Any]:
+        """返回(是否已决定, 值)；前缀不可能匹配时抛出异常。"""
+        status, value = self.decide(buffer)
+        if status == INVALID:
+            raise self._invalid(buffer)
+        return status == DECIDED, value
+
+    def with_model(self, model: Runnable) -> RunnableGenerator:
+        """把模型和解析器合成一个步骤：`prompt | parser.with_model(model)`。
+        在`model | parser`中，解析器停止读取后，LangChain为了记录该步骤的完整输入仍会读完
+        上游的流，模型会一直生成到结束。这里由解析器直接读取model.stream()，做出决定后
+        立即关闭模型的流，模型停止生成。invoke时也按流式执行，同样可以提前结束。
+        """
+
+        def transform(
+            inputs: Iterator[Any], config: Optional[RunnableConfig] = None
+        ) -> Iterator[Any]:
+            # 上游（通常是提示模板）只输出一个值
+            prompt = None
+            for prompt in inputs:
+                pass
+            stream = model.stream(prompt, config)
+            try:
+                yield from self._transform(stream)
+            finally:
+                stream.close()
+
+        async def atransform(
+            inputs: AsyncIterator[Any], config: Optional[RunnableConfig] = None
+        ) -> AsyncIterator[Any]:
+            prompt = None
+            async for prompt in inputs:
+                pass
+            stream = model.astream(prompt, config)
+            try:
+                async for value in self._atransform(stream):
+                    yield value
+            finally:
+                await stream.aclose()
+
+        return RunnableGenerator(
+            transform, atransform, name=f"{model.get_name()}|{self.get_name()}"
+        )
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
+        buffer = ""
+        for chunk in input:
+            buffer += self._text(chunk)
+            decided, value = self._step(buffer)
+            if decided:
+                yield value
+                return
+        yield self.parse(buffer)
+
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[Any]:
+        buffer = ""
+        async for chunk in input:
+            buffer += self._text(chunk)
+            decided, value = self._step(buffer)
+            if decided:
+                yield value
+                return
+        yield self.parse(buffer)
+
+
+class EarlyBooleanOutputParser(EarlyDecisionParser):
+    """流式调用时提前决定的BooleanOutputParser。"""
+
+    true_val: str = "YES"
+    false_val: str = "NO"
+
+    def _choices(self) -> Dict[str, Any]:
+        return {self.true_val: True, self.false_val: False}
+
+    def get_format_instructions(self) -> str:
+        return f"Answer with {self.true_val} or {self.false_val} only."
+
+    @property
+    def _type(self) -> str:
+        return "early_boolean_output_parser"
+
+
+class EarlyEnumOutputParser(EarlyDecisionParser):
+    """流式调用时提前决定的EnumOutputParser，按枚举的值匹配。"""
+
+    enum: Type[Enum]
+
+    def _choices(self) -> Dict[str, Any]:
+        return {str(member.value): member for member in self.enum}
+
+    def get_format_instructions(self) -> str:
+        options = ", ".join(str(member.value) for member in self.enum)
+        return f"Select one of the following options: {options}"
+
+    @property
+    def _type(self) -> str:
+        return "early_enum_output_parser"
+
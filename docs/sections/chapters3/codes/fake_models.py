@@ -0,0 +1,348 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Union
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    ChatResult,
+    GenerationChunk,
+)
+from pydantic import BaseModel, PrivateAttr
+
+from stop_sequences import truncate_at_stop
+
+TOKEN_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+def message_text(message: BaseMessage) -> str:
+    """消息的文本内容。多模态消息（content是列表）只取其中的文本部分。"""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in message.content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
+class FakeModelError(Exception):
+    """替身模型按error_rate注入的错误。"""
+
+
+class LatencyProfile(BaseModel):
+    """替身模型的延迟配置，单位均为秒。"""
+
+    ttft: float = 0.0
+    """首个token的到达时间（time to first token）。"""
+
+    token_latency: float = 0.0
+    """之后每个token之间的间隔。"""
+
+    jitter: str = "none"
+    """抖动分布：none、uniform、normal、exponential。"""
+
+    jitter_scale: float = 0.0
+    """抖动幅度，相对于基础延迟的比例。例如0.2表示uniform下±20%，normal下标准差为20%。"""
+
+    def sample(self, base: float, rng: random.Random) -> float:
+        """在基础延迟上叠加一次抖动采样，结果不会小于0。"""
+        if base <= 0 or self.jitter == "none" or self.jitter_scale <= 0:
+            return max(base, 0.0)
+        if self.jitter == "uniform":
+            value = base * (1 + rng.uniform(-self.jitter_scale, self.jitter_scale))
+        elif self.jitter == "normal":
+            value = rng.gauss(base, base * self.jitter_scale)
+        elif self.jitter == "exponential":
+            # 长尾：基础延迟加上一个均值为base*jitter_scale的指数分布
+            value = base + rng.expovariate(1 / (base * self.jitter_scale))
+        else:
+            raise ValueError(f"Unknown jitter distribution: {self.jitter}")
+        return max(value, 0.0)
+
+
+class _Script:
+    """一次调用的模拟计划：输出文本、工具调用和每个token之前的等待时间。"""
+
+    def __init__(
+        self,
+        text: str,
+        tool_calls: List[Dict[str, Any]],
+        delays: List[float],
+        error: Optional[FakeModelError],
+    ):
+        self.text = text
+        self.tool_calls = tool_calls
+        self.delays = delays
+        self.error = error
+
+    @property
+    def tokens(self) -> List[str]:
+        return TOKEN_PATTERN.findall(self.text) or [""]
+
+
+class _FakeBehaviour(BaseModel):
+    """FakeChatModel与FakeLLM共享的配置与模拟逻辑。"""
+
+    responses: Optional[List[Union[str, Dict[str, Any], List[Any]]]] = None
+    """循环返回的输出。dict/list会被序列化为JSON。为空时回显提示。
+    同一个提示按调用次数依次返回，不同提示的起始位置由提示的哈希决定，与并发调度无关。"""
+
+    tool_calls: Optional[List[List[Dict[str, Any]]]] = None
+    """与responses按同样方式选择的工具调用，例如[{"name": "add", "args": {"a": 1}}]。仅聊天模型使用。"""
+
+    latency: LatencyProfile = LatencyProfile()
+    """延迟配置。"""
+
+    error_rate: float = 0.0
+    """每次调用失败（抛出FakeModelError）的概率。"""
+
+    seed: int = 0
+    """随机种子。相同的种子、提示和该提示的调用次数会得到完全相同的输出、延迟与错误。"""
+
+    max_tracked_prompts: int = 10_000
+    """最多记录多少个提示的调用次数，超出时忘记最久未调用的提示（它的调用次数从0重新开始）。"""
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    # 提示的哈希 -> 调用次数，按最近调用的顺序排列
+    _attempts: "OrderedDict[bytes, int]" = PrivateAttr(default_factory=OrderedDict)
+
+    @property
+    def call_count(self) -> int:
+        """已经处理的调用次数。"""
+        return self._calls
+
+    def _plan(self, prompt: str, stop: Optional[List[str]] = None) -> _Script:
+        digest = hashlib.blake2b(prompt.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+        with self._lock:
+            self._calls += 1
+            attempt = self._attempts.pop(digest, 0)
+            self._attempts[digest] = attempt + 1
+            if len(self._attempts) > self.max_tracked_prompts:
+                self._attempts.popitem(last=False)
+        # 输出、随机数都只由种子、提示和该提示的第几次调用决定，与并发调度无关
+        rng = random.Random(f"{self.seed}:{attempt}:{prompt}")
+        index = int.from_bytes(digest, "big") + attempt
+        call_id = f"{digest.hex()}_{attempt}"
+        error = None
+        if self.error_rate and rng.random() < self.error_rate:
+            error = FakeModelError(f"Injected failure for call {call_id}")
+        if self.responses:
+            response = self.responses[index % len(self.responses)]
+            text = response if isinstance(response, str) else json.dumps(response)
+        else:
+            text = prompt
+        text = truncate_at_stop(text, stop)
+        tool_calls: List[Dict[str, Any]] = []
+        if self.tool_calls:
+            tool_calls = [
+                {"id": f"call_{call_id}_{i}", **call}
+                for i, call in enumerate(self.tool_calls[index % len(self.tool_calls)])
+            ]
+        n_tokens = max(len(TOKEN_PATTERN.findall(text)), 1)
+        delays = [self.latency.sample(self.latency.ttft, rng)] + [
+            self.latency.sample(self.latency.token_latency, rng)
+            for _ in range(n_tokens - 1)
+        ]
+        return _Script(text, tool_calls, delays, error)
+
+
+class FakeChatModel(_FakeBehaviour, BaseChatModel):
+    """用于离线压测的替身聊天模型，不访问网络。
+    支持invoke/batch/stream及其异步版本，可以模拟首token延迟、逐token延迟、抖动、错误率，
+    以及预先编排好的文本、JSON和工具调用输出。
+    写法与4-4-3.custom_chatmodel.py中的CustomChatModelAdvanced相同（实现_generate、_stream
+    及其异步版本），但直接继承BaseChatModel：那个类定义在示例脚本中，导入时会运行整个脚本，
+    并且它的输出固定为回显前n个字符。FakeLLM与5-2.custom.py中的CustomLLM同理。
+    Example:
+        model = FakeChatModel(
+            responses=[{"name": "Tom Hanks"}],
+            latency=LatencyProfile(ttft=0.2, token_latency=0.01, jitter="normal", jitter_scale=0.3),
+            error_rate=0.01,
+        )
+        chain = prompt | model | JsonOutputParser()
+    """
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        script = self._plan(message_text(messages[-1]), stop)
+        time.sleep(script.delays[0])
+        if script.error:
+            raise script.error
+        time.sleep(sum(script.delays[1:]))
+        message = AIMessage(content=script.text, tool_calls=script.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        script = self._plan(message_text(messages[-1]), stop)
+        await asyncio.sleep(script.delays[0])
+        if script.error:
+            raise script.error
+        await asyncio.sleep(sum(script.delays[1:]))
+        message = AIMessage(content=script.text, tool_calls=script.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _tool_call_chunk(self, script: _Script) -> Optional[ChatGenerationChunk]:
+        if not script.tool_calls:
+            return None
+        return ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": call["name"],
+                        "args": json.dumps(call.get("args", {})),
+                        "id": call["id"],
+                        "index": i,
+                    }
+                    for i, call in enumerate(script.tool_calls)
+                ],
+            )
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        script = self._plan(message_text(messages[-1]), stop)
+        for i, (token, delay) in enumerate(zip(script.tokens, script.delays)):
+            time.sleep(delay)
+            if i == 0 and script.error:
+                raise script.error
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        tool_chunk = self._tool_call_chunk(script)
+        if tool_chunk:
+            yield tool_chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        script = self._plan(message_text(messages[-1]), stop)
+        for i, (token, delay) in enumerate(zip(script.tokens, script.delays)):
+            await asyncio.sleep(delay)
+            if i == 0 and script.error:
+                raise script.error
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        tool_chunk = self._tool_call_chunk(script)
+        if tool_chunk:
+            yield tool_chunk
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"responses": self.responses, "seed": self.seed}
+
+
+class FakeLLM(_FakeBehaviour, LLM):
+    """用于离线压测的替身LLM，参数与FakeChatModel相同（不支持工具调用）。"""
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        script = self._plan(prompt, stop)
+        time.sleep(script.delays[0])
+        if script.error:
+            raise script.error
+        time.sleep(sum(script.delays[1:]))
+        return script.text
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        script = self._plan(prompt, stop)
+        await asyncio.sleep(script.delays[0])
+        if script.error:
+            raise script.error
+        await asyncio.sleep(sum(script.delays[1:]))
+        return script.text
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        script = self._plan(prompt, stop)
+        for i, (token, delay) in enumerate(zip(script.tokens, script.delays)):
+            time.sleep(delay)
+            if i == 0 and script.error:
+                raise script.error
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        script = self._plan(prompt, stop)
+        for i, (token, delay) in enumerate(zip(script.tokens, script.delays)):
+            await asyncio.sleep(delay)
+            if i == 0 and script.error:
+                raise script.error
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llm"
+
+    @property
+    def _identifying_params(self) -> Mapping[str, Any]:
+        return {"responses": self.responses, "seed": self.seed}
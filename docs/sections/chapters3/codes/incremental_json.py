@@ -0,0 +1,389 @@
+import copy
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+
+_STRING_RUN = re.compile(r'[^"\\]+')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = frozenset(" \t\n\r")
+_SCALAR_CHARS = frozenset("0123456789+-.eEtrufalsn")
+
+
+def _pointer(parent: str, key: Union[str, int]) -> str:
+    """按RFC 6901拼接JSON Pointer。"""
+    return f"{parent}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+class _Frame:
+    """一个尚未闭合的对象或数组。"""
+
+    __slots__ = ("container", "path", "state", "key")
+
+    def __init__(self, container: Union[Dict[str, Any], List[Any]], path: str):
+        self.container = container
+        self.path = path
+        # 对象：key -> colon -> value -> next；数组：value -> next
+        self.state = "key" if isinstance(container, dict) else "value"
+        self.key: Optional[str] = None
+
+
+class IncrementalJsonParser:
+    """可以逐块输入的JSON解析器，跨块保存词法状态，每个字符只处理一次。
+    feed()返回这一块引起的变化，格式与JSON Patch相同：
+    - `add`：新的键、数组元素或根对象，字符串值以""加入，之后逐块追加；
+    - `append`：字符串值追加的一段文本（JSON Patch之外的扩展，apply_patch可以处理）。
+    数字、true/false/null在完整读到之后才加入。第一个`{`或`[`之前的内容（例如```json）
+    和根对象闭合之后的内容都会被忽略。
+    Example:
+        parser = IncrementalJsonParser()
+        for chunk in chunks:
+            for op in parser.feed(chunk):
+                ...
+        result = parser.value
+    """
+
+    def __init__(self) -> None:
+        self._root: Any = None
+        self._stack: List[_Frame] = []
+        self.started = False
+        self.done = False
+        self._mode: Optional[str] = None  # None、"key"、"string"或"scalar"
+        self._pieces: List[str] = []
+        self._escape: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        # 正在读取的字符串值：(所在容器, 键或下标, JSON Pointer)
+        self._open: Optional[tuple] = None
+        self._dirty = False
+
+    @property
+    def value(self) -> Any:
+        """当前的（部分）结果。正在读取的字符串只在这里拼接一次，feed()本身不复制字符串。"""
+        self._materialize()
+        return self._root
+
+    @property
+    def open_size(self) -> int:
+        """尚未闭合的对象和数组中的元素总数，即snapshot()需要复制的元素个数。"""
+        return sum(len(frame.container) + 1 for frame in self._stack)
+
+    def snapshot(self) -> Any:
+        """返回当前结果的副本。已经闭合的部分之后不会再变化，副本之间直接共享；
+        只浅拷贝尚未闭合的那一串对象和数组，比深拷贝快得多，耗时与open_size成正比。
+        """
+        value = self.value
+        copied = None
+        for depth in range(len(self._stack) - 1, -1, -1):
+            frame = self._stack[depth]
+            container = frame.container
+            if isinstance(container, dict):
+                new = dict(container)
+                if copied is not None:
+                    new[frame.key] = copied
+            else:
+                new = list(container)
+                if copied is not None:
+                    new[-1] = copied
+            copied = new
+        return value if copied is None else copied
+
+    def _materialize(self) -> None:
+        if self._dirty and self._open is not None:
+            container, key, _ = self._open
+            joined = "".join(self._pieces)
+            self._pieces = [joined]
+            container[key] = joined
+            self._dirty = False
+
+    def _place(self, value: Any, ops: List[Dict[str, Any]]) -> str:
+        """把一个值放到当前位置，返回它的路径。"""
+        if not self._stack:
+            self._root = value
+            self.started = True
+            path = ""
+        else:
+            frame = self._stack[-1]
+            if frame.state != "value":
+                raise ValueError(f"Unexpected value at {frame.path or '/'}")
+            if isinstance(frame.container, dict):
+                frame.container[frame.key] = value
+                path = _pointer(frame.path, frame.key)
+            else:
+                path = _pointer(frame.path, len(frame.container))
+                frame.container.append(value)
+            frame.state = "next"
+        ops.append({"op": "add", "path": path, "value": copy.copy(value)})
+        return path
+
+    def _finish_scalar(self, ops: List[Dict[str, Any]]) -> None:
+        token = "".join(self._pieces)
+        self._pieces = []
+        self._mode = None
+        try:
+            value = json.loads(token)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON literal {token!r}") from e
+        self._place(value, ops)
+
+    def _take_surrogate(self) -> str:
+        """取出等待后半部分的代理对前半部分。与json.loads一样，后面不是后半部分时原样保留。"""
+        high, self._high_surrogate = self._high_surrogate, None
+        return "" if high is None else chr(high)
+
+    def _decode_escape(self) -> str:
+        """解码一个完整的转义序列；代理对的前半部分先保存起来，等待后半部分。"""
+        escape = self._escape
+        if escape[1] != "u":
+            if escape[1] not in _ESCAPES:
+                raise ValueError(f"Invalid escape {escape!r}")
+            return self._take_surrogate() + _ESCAPES[escape[1]]
+        code = int(escape[2:], 16)
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        pending = self._take_surrogate()
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return pending
+        return pending + chr(code)
+
+    def _read_string(self, text: str, i: int, ops: List[Dict[str, Any]]) -> int:
+        n = len(text)
+        pieces: List[str] = []
+        closed = False
+        while i < n:
+            if self._escape is not None:
+                self._escape += text[i]
+                i += 1
+                if self._escape[1] == "u" and len(self._escape) < 6:
+                    continue
+                char = self._decode_escape()
+                self._escape = None
+                if char:
+                    pieces.append(char)
+                continue
+            if self._high_surrogate is not None and text[i] != "\\":
+                # 代理对的前半部分之后不是转义序列
+                pieces.append(self._take_surrogate())
+            # 一次取出到下一个引号或反斜杠之间的所有字符
+            match = _STRING_RUN.match(text, i)
+            if match:
+                pieces.append(match.group())
+                i = match.end()
+                continue
+            if text[i] == "\\":
+                self._escape = "\\"
+                i += 1
+                continue
+            i += 1
+            closed = True
+            break
+        delta = "".join(pieces)
+        if self._mode == "key":
+            self._pieces.append(delta)
+            if closed:
+                frame = self._stack[-1]
+                frame.key = "".join(self._pieces)
+                frame.state = "colon"
+                self._pieces = []
+                self._mode = None
+            return i
+        if delta:
+            self._pieces.append(delta)
+            self._dirty = True
+            ops.append({"op": "append", "path": self._open[2], "value": delta})
+        if closed:
+            self._materialize()
+            self._open = None
+            self._pieces = []
+            self._mode = None
+        return i
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """输入一块文本，返回这一块引起的变化。"""
+        ops: List[Dict[str, Any]] = []
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            if self._mode in ("key", "string"):
+                i = self._read_string(text, i, ops)
+                continue
+            char = text[i]
+            if self._mode == "scalar":
+                if char in _SCALAR_CHARS:
+                    self._pieces.append(char)
+                    i += 1
+                    continue
+                self._finish_scalar(ops)
+            if char in _WHITESPACE:
+                i += 1
+                continue
+            if not self.started and char not in "{[":
+                i += 1
+                continue
+            frame = self._stack[-1] if self._stack else None
+            if char in "{[":
+                container: Union[Dict[str, Any], List[Any]] = {} if char == "{" else []
+                path = self._place(container, ops)
+                self._stack.append(_Frame(container, path))
+            elif char in "}]":
+                if frame is None:
+                    raise ValueError(f"Unexpected {char!r}")
+                if (char == "}") != isinstance(frame.container, dict):
+                    raise ValueError(f"Mismatched {char!r} at {frame.path or '/'}")
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            elif char == '"':
+                if frame is not None and frame.state == "key":
+                    self._mode = "key"
+                else:
+                    path = self._place("", ops)
+                    container = frame.container
+                    key = frame.key if isinstance(container, dict) else len(container) - 1
+                    self._open = (container, key, path)
+                    self._mode = "string"
+            elif char == ":":
+                frame.state = "value"
+            elif char == ",":
+                frame.state = "key" if isinstance(frame.container, dict) else "value"
+            elif char in _SCALAR_CHARS:
+                self._mode = "scalar"
+                self._pieces = [char]
+            else:
+                raise ValueError(f"Unexpected character {char!r}")
+            i += 1
+        return ops
+
+    def close(self) -> Any:
+        """输入结束：写入最后一个数字或字面量，返回结果。"""
+        ops: List[Dict[str, Any]] = []
+        if self._mode == "scalar" and self._stack:
+            self._finish_scalar(ops)
+        return self.value
+
+
+def apply_patch(document: Any, ops: List[Dict[str, Any]]) -> Any:
+    """把feed()返回的变化应用到document上（原地修改），返回新的根。"""
+    for op in ops:
+        path = op["path"]
+        if path == "":
+            document = copy.deepcopy(op["value"])
+            continue
+        parts = [p.replace("~1", "/").replace("~0", "~") for p in path.split("/")[1:]]
+        target = document
+        for part in parts[:-1]:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        last = parts[-1]
+        if isinstance(target, list):
+            if op["op"] == "append":
+                target[int(last)] += op["value"]
+            else:
+                target.insert(int(last), copy.deepcopy(op["value"]))
+        elif op["op"] == "append":
+            target[last] += op["value"]
+        else:
+            target[last] = copy.deepcopy(op["value"])
+    return document
+
+
+def _resolve(document: Any, path: str) -> Any:
+    for part in path.split("/")[1:]:
+        part = part.replace("~1", "/").replace("~0", "~")
+        document = document[int(part)] if isinstance(document, list) else document[part]
+    return document
+
+
+class _SnapshotThrottle:
+    """限制输出副本时复制的总量：复制的元素个数不超过已读字符数的ratio倍。
+    很长的数组尚未闭合时，每个副本都要复制整个数组，每块都输出副本总耗时会随长度平方增长；
+    超出时跳过这一块的副本，等读到更多字符再输出，总耗时保持线性。
+    """
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self.read = 0
+        self.copied = 0
+        self.held = False
+
+    def allow(self, parser: IncrementalJsonParser, chars: int) -> bool:
+        self.read += chars
+        cost = parser.open_size
+        if self.copied + cost > self.ratio * self.read:
+            self.held = True
+            return False
+        self.copied += cost
+        self.held = False
+        return True
+
+
+class IncrementalJsonOutputParser(JsonOutputParser):
+    """流式输出时使用IncrementalJsonParser的JsonOutputParser。
+    JsonOutputParser每收到一块都会重新解析累积的全部文本，总耗时随输出长度平方增长；
+    这里每块只处理新的字符。invoke等非流式调用与JsonOutputParser相同。
+    - diff=True时输出每块的变化（字符串增长是`append`操作，append_ops=False时改为
+      标准JSON Patch的`replace`，需要复制整个字符串）；
+    - diff=False时输出部分结果的副本（共享已经闭合的部分）。复制的元素总数不超过已读字符数的
+      copy_ratio倍：很长的数组尚未闭合时，不是每一块都输出副本，但最后的结果一定会输出；
+    - copy_partials=False时每块都输出同一个对象（原地更新），省去复制，适合立即渲染、
+      不保留中间结果的调用方。
+    """
+
+    append_ops: bool = True
+    copy_partials: bool = True
+    copy_ratio: float = 8.0
+    """copy_partials=True时，复制的元素个数最多为已读字符数的多少倍。"""
+
+    def _copies(self) -> bool:
+        return not self.diff and self.copy_partials
+
+    def _emit(self, parser: IncrementalJsonParser, ops: List[Dict[str, Any]]) -> Any:
+        if self.diff:
+            if self.append_ops:
+                return ops
+            value = parser.value
+            return [
+                {"op": "replace", "path": op["path"], "value": _resolve(value, op["path"])}
+                if op["op"] == "append"
+                else op
+                for op in ops
+            ]
+        return parser.snapshot() if self.copy_partials else parser.value
+
+    @staticmethod
+    def _text(chunk: Union[str, BaseMessage]) -> str:
+        if isinstance(chunk, BaseMessage):
+            return chunk.content if isinstance(chunk.content, str) else ""
+        return chunk
+
+    def _feed(self, parser: IncrementalJsonParser, text: str) -> List[Dict[str, Any]]:
+        try:
+            return parser.feed(text)
+        except ValueError as e:
+            raise OutputParserException(f"Invalid json output: {e}") from e
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Any]:
+        parser = IncrementalJsonParser()
+        throttle = _SnapshotThrottle(self.copy_ratio)
+        for chunk in input:
+            text = self._text(chunk)
+            ops = self._feed(parser, text)
+            if ops and (not self._copies() or throttle.allow(parser, len(text))):
+                yield self._emit(parser, ops)
+        if throttle.held:
+            yield parser.snapshot()
+
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[Any]:
+        parser = IncrementalJsonParser()
+        throttle = _SnapshotThrottle(self.copy_ratio)
+        async for chunk in input:
+            text = self._text(chunk)
+            ops = self._feed(parser, text)
+            if ops and (not self._copies() or throttle.allow(parser, len(text))):
+                yield self._emit(parser, ops)
+        if throttle.held:
+            yield parser.snapshot()
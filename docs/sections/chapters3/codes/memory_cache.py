@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.outputs import Generation
+
+ENTRY_OVERHEAD = 256
+"""每个缓存条目的固定开销估计（字节），包括键元组、列表和Generation对象本身。"""
+
+
+def estimate_size(prompt: str, llm_string: str, return_val: Sequence[Generation]) -> int:
+    """粗略估计一个缓存条目占用的字节数：键和生成文本的UTF-8长度加上固定开销。"""
+    size = ENTRY_OVERHEAD + len(prompt.encode("utf-8")) + len(llm_string.encode("utf-8"))
+    for generation in return_val:
+        size += ENTRY_OVERHEAD + len(generation.text.encode("utf-8"))
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "size", "created_at", "expires_at")
+
+    def __init__(
+        self, value: RETURN_VAL_TYPE, size: int, created_at: float, expires_at: Optional[float]
+    ):
+        self.value = value
+        self.size = size
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+
+class BoundedInMemoryCache(BaseCache):
+    """有容量上限的内存LLM缓存，可以替代无限增长的InMemoryCache。
+    按最近最少使用（LRU）淘汰，同时限制条目数`maxsize`和近似字节数`max_bytes`，
+    可选的`ttl`（秒）让条目在过期后失效。所有操作都在一把锁内完成，且不会阻塞，
+    因此可以同时被多个线程和事件循环使用。
+    Example:
+        cache = BoundedInMemoryCache(maxsize=10_000, max_bytes=256 * 1024 * 1024, ttl=3600)
+        set_llm_cache(cache)
+        ...
+        print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[str, str, Sequence[Generation]], int] = estimate_size,
+    ):
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be greater than 0")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: Tuple[str, str]) -> _Entry:
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = (prompt, llm_string)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def update(
+        self,
+        prompt: str,
+        llm_string: str,
+        return_val: RETURN_VAL_TYPE,
+        *,
+        ttl: Optional[float] = None,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """写入条目。ttl指定该条目的剩余有效期（秒），不会超过缓存的`ttl`；
+        created_at为原来的写入时间戳（例如导入时），缓存的`ttl`从它开始计算。
+        """
+        key = (prompt, llm_string)
+        size = self.sizeof(prompt, llm_string, return_val)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个条目就超过上限，不缓存
+            return
+        wall = time.time()
+        created_at = wall if created_at is None else created_at
+        if self.ttl is not None:
+            remaining = self.ttl - max(wall - created_at, 0.0)
+            ttl = remaining if ttl is None else min(ttl, remaining)
+        if ttl is not None and ttl <= 0:
+            return
+        now = time.monotonic()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = _Entry(return_val, size, created_at, expires_at)
+            self._bytes += size
+            while (self.maxsize is not None and len(self._data) > self.maxsize) or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    # 所有操作都只在内存中进行且很快，异步版本直接调用同步版本，
+    # 避免BaseCache默认的run_in_executor线程切换。
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(
+        self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE
+    ) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        self.clear(**kwargs)
+
+    def purge_expired(self) -> int:
+        """主动清除所有已过期的条目，返回清除的数量。"""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key
+                for key, entry in self._data.items()
+                if entry.expires_at is not None and entry.expires_at <= now
+            ]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def iter_entries(self) -> Iterator[Tuple[str, str, RETURN_VAL_TYPE, float]]:
+        """遍历未过期的条目，返回(prompt, llm_string, generations, 写入时间戳)。"""
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._data.items())
+        for (prompt, llm_string), entry in items:
+            if entry.expires_at is None or entry.expires_at > now:
+                yield prompt, llm_string, entry.value, entry.created_at
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中、未命中、淘汰等计数，用于在真实流量下调整缓存容量。"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,307 @@
+from typing import Any, List, Optional, Sequence, Union
+
+from langchain_core.callbacks import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.caches import BaseCache
+from langchain_core.globals import get_llm_cache
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.load import dumpd, dumps
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult, LLMResult
+from langchain_core.runnables import RunnableConfig, run_in_executor
+from langchain_core.runnables.config import get_config_list, get_executor_for_config
+from langchain_core.runnables.utils import gather_with_concurrency
+from langchain_core.utils.utils import LC_ID_PREFIX
+from pydantic import Field
+
+
+def resolve_cache(cache: Any) -> Optional[BaseCache]:
+    """按照BaseChatModel的规则解析模型的cache字段：实例直接使用，None/True使用全局缓存，False不缓存。"""
+    if isinstance(cache, BaseCache):
+        return cache
+    if cache is False:
+        return None
+    return get_llm_cache()
+
+
+def _check_batch_size(generated: List[ChatResult], expected: int) -> None:
+    if len(generated) != expected:
+        raise ValueError(
+            f"_generate_batch returned {len(generated)} results for {expected} prompts; "
+            "it must return exactly one ChatResult per prompt."
+        )
+
+
+class NativeBatchChatModel(BaseChatModel):
+    """支持原生批量调用的聊天模型基类。
+    子类实现`_generate_batch`后，`batch`/`abatch`会把输入按`max_batch_size`分块，
+    每块只调用一次`_generate_batch`，而不是为每个输入单独调用`_generate`。
+    未实现`_generate_batch`的子类保持默认行为（线程池中逐个调用）。
+    各块最多同时执行config中`max_concurrency`个；设置了`rate_limiter`时，
+    每次`_generate_batch`调用（而不是每个提示）获取一次许可，全部命中缓存的块不获取。
+    Example:
+        class MyModel(NativeBatchChatModel):
+            def _generate_batch(self, messages_list, stop=None, run_managers=None, **kwargs):
+                return [self._generate(m, stop=stop) for m in messages_list]
+    """
+
+    max_batch_size: int = Field(default=32, ge=1)
+    """一次`_generate_batch`调用最多包含的提示数。"""
+
+    def _generate_batch(
+        self,
+        messages_list: List[List[BaseMessage]],
+        stop: Optional[List[str]] = None,
+        run_managers: Optional[List[CallbackManagerForLLMRun]] = None,
+        **kwargs: Any,
+    ) -> List[ChatResult]:
+        """一次性为多个提示生成结果，返回与`messages_list`等长、顺序一致的`ChatResult`列表。"""
+        raise NotImplementedError()
+
+    async def _agenerate_batch(
+        self,
+        messages_list: List[List[BaseMessage]],
+        stop: Optional[List[str]] = None,
+        run_managers: Optional[List[AsyncCallbackManagerForLLMRun]] = None,
+        **kwargs: Any,
+    ) -> List[ChatResult]:
+        """_generate_batch的异步版本。默认在线程池中调用_generate_batch。"""
+        return await run_in_executor(
+            None,
+            self._generate_batch,
+            messages_list,
+            stop,
+            [m.get_sync() for m in run_managers] if run_managers else None,
+            **kwargs,
+        )
+
+    def _has_native_batch(self) -> bool:
+        return type(self)._generate_batch is not NativeBatchChatModel._generate_batch
+
+    def batch(
+        self,
+        inputs: List[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[BaseMessage]:
+        if not inputs or not self._has_native_batch():
+            return super().batch(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            )
+        configs = get_config_list(config, len(inputs))
+        starts = range(0, len(inputs), self.max_batch_size)
+
+        def run_chunk(start: int) -> List[Any]:
+            end = start + self.max_batch_size
+            return self._batch_chunk(
+                inputs[start:end], configs[start:end], return_exceptions, **kwargs
+            )
+
+        if len(starts) == 1:
+            return run_chunk(0)
+        # 与默认的batch一样，用max_concurrency限制同时执行的块数
+        with get_executor_for_config(configs[0]) as executor:
+            return [output for chunk in executor.map(run_chunk, starts) for output in chunk]
+
+    async def abatch(
+        self,
+        inputs: List[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[BaseMessage]:
+        if not inputs or not self._has_native_batch():
+            return await super().abatch(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            )
+        configs = get_config_list(config, len(inputs))
+        size = self.max_batch_size
+        chunks = await gather_with_concurrency(
+            configs[0].get("max_concurrency"),
+            *(
+                self._abatch_chunk(
+                    inputs[start : start + size],
+                    configs[start : start + size],
+                    return_exceptions,
+                    **kwargs,
+                )
+                for start in range(0, len(inputs), size)
+            ),
+        )
+        return [output for chunk in chunks for output in chunk]
+
+    def _prepare_chunk(
+        self, inputs: Sequence[LanguageModelInput], kwargs: dict
+    ) -> tuple:
+        messages_list = [self._convert_input(i).to_messages() for i in inputs]
+        stop = kwargs.pop("stop", None)
+        params = self._get_invocation_params(stop=stop, **kwargs)
+        options = {"stop": stop}
+        llm_string = self._get_llm_string(stop=stop, **kwargs)
+        return messages_list, stop, params, options, llm_string
+
+    def _batch_chunk(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        configs: List[RunnableConfig],
+        return_exceptions: bool,
+        **kwargs: Any,
+    ) -> List[Any]:
+        messages_list, stop, params, options, llm_string = self._prepare_chunk(
+            inputs, kwargs
+        )
+        run_managers = []
+        for messages, config in zip(messages_list, configs):
+            callback_manager = CallbackManager.configure(
+                config.get("callbacks"),
+                self.callbacks,
+                self.verbose,
+                config.get("tags"),
+                self.tags,
+                config.get("metadata"),
+                self.metadata,
+            )
+            run_managers.extend(
+                callback_manager.on_chat_model_start(
+                    dumpd(self),
+                    [messages],
+                    invocation_params=params,
+                    options=options,
+                    name=config.get("run_name"),
+                    run_id=config.pop("run_id", None),
+                    batch_size=len(inputs),
+                )
+            )
+
+        # 先查缓存，只把未命中的提示交给_generate_batch
+        cache = resolve_cache(self.cache)
+        results: List[Optional[ChatResult]] = [None] * len(messages_list)
+        if cache is not None:
+            for i, messages in enumerate(messages_list):
+                cached = cache.lookup(dumps(messages), llm_string)
+                if isinstance(cached, list):
+                    results[i] = ChatResult(generations=cached)
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire(blocking=True)
+                generated = self._generate_batch(
+                    [messages_list[i] for i in missing],
+                    stop=stop,
+                    run_managers=[run_managers[i] for i in missing],
+                    **kwargs,
+                )
+                _check_batch_size(generated, len(missing))
+            except BaseException as e:
+                for i in missing:
+                    run_managers[i].on_llm_error(e, response=LLMResult(generations=[]))
+                if not return_exceptions:
+                    raise
+                generated = [e] * len(missing)
+            for i, result in zip(missing, generated):
+                results[i] = result
+                if cache is not None and isinstance(result, ChatResult):
+                    cache.update(dumps(messages_list[i]), llm_string, result.generations)
+
+        outputs: List[Any] = []
+        for run_manager, result in zip(run_managers, results):
+            if isinstance(result, BaseException):
+                outputs.append(result)
+                continue
+            message = result.generations[0].message
+            if message.id is None:
+                message.id = f"{LC_ID_PREFIX}-{run_manager.run_id}"
+            run_manager.on_llm_end(
+                LLMResult(generations=[result.generations], llm_output=result.llm_output)
+            )
+            outputs.append(message)
+        return outputs
+
+    async def _abatch_chunk(
+        self,
+        inputs: Sequence[LanguageModelInput],
+        configs: List[RunnableConfig],
+        return_exceptions: bool,
+        **kwargs: Any,
+    ) -> List[Any]:
+        messages_list, stop, params, options, llm_string = self._prepare_chunk(
+            inputs, kwargs
+        )
+        run_managers = []
+        for messages, config in zip(messages_list, configs):
+            callback_manager = AsyncCallbackManager.configure(
+                config.get("callbacks"),
+                self.callbacks,
+                self.verbose,
+                config.get("tags"),
+                self.tags,
+                config.get("metadata"),
+                self.metadata,
+            )
+            run_managers.extend(
+                await callback_manager.on_chat_model_start(
+                    dumpd(self),
+                    [messages],
+                    invocation_params=params,
+                    options=options,
+                    name=config.get("run_name"),
+                    run_id=config.pop("run_id", None),
+                    batch_size=len(inputs),
+                )
+            )
+
+        cache = resolve_cache(self.cache)
+        results: List[Optional[ChatResult]] = [None] * len(messages_list)
+        if cache is not None:
+            for i, messages in enumerate(messages_list):
+                cached = await cache.alookup(dumps(messages), llm_string)
+                if isinstance(cached, list):
+                    results[i] = ChatResult(generations=cached)
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.aacquire(blocking=True)
+                generated = await self._agenerate_batch(
+                    [messages_list[i] for i in missing],
+                    stop=stop,
+                    run_managers=[run_managers[i] for i in missing],
+                    **kwargs,
+                )
+                _check_batch_size(generated, len(missing))
+            except BaseException as e:
+                for i in missing:
+                    await run_managers[i].on_llm_error(
+                        e, response=LLMResult(generations=[])
+                    )
+                if not return_exceptions:
+                    raise
+                generated = [e] * len(missing)
+            for i, result in zip(missing, generated):
+                results[i] = result
+                if cache is not None and isinstance(result, ChatResult):
+                    await cache.aupdate(
+                        dumps(messages_list[i]), llm_string, result.generations
+                    )
+
+        outputs: List[Any] = []
+        for run_manager, result in zip(run_managers, results):
+            if isinstance(result, BaseException):
+                outputs.append(result)
+                continue
+            message = result.generations[0].message
+            if message.id is None:
+                message.id = f"{LC_ID_PREFIX}-{run_manager.run_id}"
+            await run_manager.on_llm_end(
+                LLMResult(generations=[result.generations], llm_output=result.llm_output)
+            )
+            outputs.append(message)
+        return outputs
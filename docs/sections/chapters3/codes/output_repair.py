@@ -0,0 +1,383 @@
+import ast
+import json
+import re
+import threading
+import types
+import typing
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pydantic
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableConfig
+from pydantic import PrivateAttr
+
+_FENCE = re.compile(r"```[\w-]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+_JSON_TAIL = re.compile(r"[\"':{\[]")
+
+
+def strip_code_fence(text: str) -> str:
+    """去掉```json代码块和前后的说明文字，从第一个`{`或`[`开始截取。"""
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text.strip()
+    text = text[min(starts) :]
+    end = max(text.rfind("}"), text.rfind("]"))
+    # 去掉最后一个括号之后的说明文字；结尾被截断（之后还有JSON内容）时保留到末尾，交给fix_syntax补全
+    if end >= 0 and not _JSON_TAIL.search(text[end + 1 :]):
+        return text[: end + 1]
+    return text.strip()
+
+
+def python_literal_to_json(text: str) -> str:
+    """把Python字面量（单引号、True/False/None、元组、末尾逗号）转换为JSON。"""
+    return json.dumps(ast.literal_eval(text), ensure_ascii=False)
+
+
+def _read_string(text: str, i: int) -> Tuple[str, int]:
+    """从引号处读取一个字符串，返回(JSON字符串, 结束位置)。未闭合的字符串在文本末尾补上引号。"""
+    quote = text[i]
+    i += 1
+    pieces = []
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and i + 1 < len(text):
+            escaped = text[i + 1]
+            pieces.append("'" if escaped == "'" else "\\" + escaped)
+            i += 2
+            continue
+        if char == quote:
+            i += 1
+            break
+        if char == '"':
+            pieces.append('\\"')
+        elif char == "\n":
+            pieces.append("\\n")
+        else:
+            pieces.append(char)
+        i += 1
+    return '"' + "".join(pieces) + '"', i
+
+
+def fix_syntax(text: str) -> str:
+    """逐个字符修复常见的语法问题：
+    单引号字符串、没有引号的键、True/False/None、末尾多余的逗号、被截断的字符串和括号。
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    i, n = 0, len(text)
+
+    def drop_trailing_comma() -> None:
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ",":
+            out.pop()
+
+    while i < n:
+        char = text[i]
+        if char in "\"'":
+            string, i = _read_string(text, i)
+            out.append(string)
+            continue
+        if char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            drop_trailing_comma()
+            if stack:
+                char = _CLOSERS[stack.pop()]
+        elif char.isalpha() or char == "_":
+            word = _WORD.match(text, i).group()
+            i += len(word)
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif word in ("true", "false", "null"):
+                out.append(word)
+            else:
+                # 没有引号的键或值
+                out.append(json.dumps(word))
+            continue
+        out.append(char)
+        i += 1
+    # 输出被截断：去掉末尾的逗号，键后面补null，再补上缺少的括号
+    drop_trailing_comma()
+    if out and out[-1] == ":":
+        out.append("null")
+    for opener in reversed(stack):
+        drop_trailing_comma()
+        out.append(_CLOSERS[opener])
+    return "".join(out)
+
+
+def _empty_value(annotation: Any, scalars: bool) -> Tuple[bool, Any]:
+    """按类型给出缺失字段的空值：Optional为None，列表为[]，字典为{}；
+    scalars为True时字符串为""、数字为0、布尔值为False。"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin in (typing.Union, types.UnionType) and type(None) in args:
+        return True, None
+    if annotation in (list, set, tuple) or origin in (list, set, tuple):
+        return True, []
+    if annotation is dict or origin is dict:
+        return True, {}
+    if scalars:
+        for kind, value in ((str, ""), (bool, False), (int, 0), (float, 0.0)):
+            if annotation is kind:
+                return True, value
+    return False, None
+
+
+def _missing_fields(pydantic_object: type) -> Dict[str, Any]:
+    """返回必填字段及其类型，兼容Pydantic v1与v2的模型。"""
+    if issubclass(pydantic_object, pydantic.BaseModel):
+        return {
+            name: info.annotation
+            for name, info in pydantic_object.model_fields.items()
+            if info.is_required()
+        }
+    return {
+        name: (Optional[f.outer_type_] if f.allow_none else f.outer_type_)
+        for name, f in pydantic_object.__fields__.items()
+        if f.required
+    }
+
+
+def fill_missing(text: str, pydantic_object: type, scalars: bool = False) -> str:
+    """按模型的字段补上缺失的必填字段。"""
+    obj = json.loads(text)
+    if not isinstance(obj, dict):
+        return text
+    for name, annotation in _missing_fields(pydantic_object).items():
+        if name not in obj:
+            known, value = _empty_value(annotation, scalars)
+            if known:
+                obj[name] = value
+    return json.dumps(obj, ensure_ascii=False)
+
+
+@dataclass
+class RepairMetrics:
+    """解析结果的统计。saved_round_trips是本地修复成功、省下的模型调用次数。"""
+
+    parsed: int = 0
+    repaired: Dict[str, int] = field(default_factory=dict)
+    llm_round_trips: int = 0
+    budget_exhausted: int = 0
+    failures: int = 0
+
+    @property
+    def saved_round_trips(self) -> int:
+        return sum(self.repaired.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "parsed": self.parsed,
+            "repaired": dict(self.repaired),
+            "saved_round_trips": self.saved_round_trips,
+            "llm_round_trips": self.llm_round_trips,
+            "budget_exhausted": self.budget_exhausted,
+            "failures": self.failures,
+        }
+
+
+_current_request: ContextVar[Optional[str]] = ContextVar("output_repair_request", default=None)
+
+
+@contextmanager
+def repair_request(request_id: str) -> Iterator[None]:
+    """指定接下来的解析属于哪个请求，用于按请求计算模型调用的次数。
+    不指定时每次parse/invoke单独计算。"""
+    token = _current_request.set(request_id)
+    try:
+        yield
+    finally:
+        _current_request.reset(token)
+
+
+class RepairingOutputParser(BaseOutputParser[Any]):
+    """在OutputFixingParser/RetryOutputParser调用模型之前，先在本地修复输出。
+    依次尝试：原样解析 -> 去掉代码块 -> 按Python字面量转换 -> 修复语法（引号、末尾逗号、
+    截断的括号） -> 按模型补上缺失的字段，任一步解析成功就返回；都失败时才调用fallback。
+    每个请求最多调用fallback max_round_trips次，超出时直接抛出OutputParserException。
+    请求取invoke/ainvoke（batch、stream等也经过它们）时metadata中的`request_id`，
+    或者repair_request()指定的值；都没有时每次parse/invoke调用单独计算。
+    Example:
+        parser = RepairingOutputParser.from_llm(PydanticOutputParser(pydantic_object=Actor), llm)
+        parser.parse("{'name': 'Tom Hanks', 'film_names': ['Forrest Gump']}")  # 不调用模型
+        print(parser.metrics.to_dict())
+    """
+
+    parser: BaseOutputParser
+    fallback: Optional[BaseOutputParser] = None
+    """OutputFixingParser或RetryOutputParser，本地修复失败时使用。"""
+    max_round_trips: int = 1
+    """每个请求最多调用fallback的次数。"""
+    fill_scalars: bool = False
+    """补缺失字段时是否也给字符串、数字和布尔字段填空值（默认只填Optional、列表和字典）。"""
+    max_requests: int = 10000
+    """最多记住多少个请求的调用次数，超出时忘记最早的请求。"""
+
+    _metrics: RepairMetrics = PrivateAttr(default_factory=RepairMetrics)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _round_trips: "OrderedDict[str, int]" = PrivateAttr(default_factory=OrderedDict)
+
+    @property
+    def metrics(self) -> RepairMetrics:
+        return self._metrics
+
+    @classmethod
+    def from_llm(
+        cls, parser: BaseOutputParser, llm: Any, retry: bool = False, **kwargs: Any
+    ) -> "RepairingOutputParser":
+        """retry为False时以OutputFixingParser作为fallback，为True时以RetryOutputParser。"""
+        from langchain.output_parsers import OutputFixingParser, RetryOutputParser
+
+        fallback_class = RetryOutputParser if retry else OutputFixingParser
+        fallback = fallback_class.from_llm(parser=parser, llm=llm)
+        return cls(parser=parser, fallback=fallback, **kwargs)
+
+    def _stages(self) -> List[Tuple[str, Callable[[str], str]]]:
+        stages: List[Tuple[str, Callable[[str], str]]] = [
+            ("code_fence", strip_code_fence),
+            ("python_literal", python_literal_to_json),
+            ("syntax", fix_syntax),
+        ]
+        pydantic_object = getattr(self.parser, "pydantic_object", None)
+        if pydantic_object is not None:
+            stages.append(
+                (
+                    "fill_missing",
+                    lambda text: fill_missing(text, pydantic_object, self.fill_scalars),
+                )
+            )
+        return stages
+
+    def repair(self, text: str) -> Tuple[str, Any]:
+        """只在本地修复，返回(用到的最后一步, 结果)；修复失败时抛出OutputParserException。"""
+        try:
+            return "none", self.parser.parse(text)
+        except OutputParserException as e:
+            error = e
+        # 每一步在上一步成功转换的文本上继续；某一步转换失败时跳过它
+        candidate = text
+        for name, stage in self._stages():
+            try:
+                repaired = stage(candidate)
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                continue
+            try:
+                return name, self.parser.parse(repaired)
+            except OutputParserException as e:
+                error = e
+                candidate = repaired
+        raise error
+
+    def _record(self, stage: str) -> None:
+        with self._lock:
+            self.metrics.parsed += 1
+            if stage != "none":
+                self.metrics.repaired[stage] = self.metrics.repaired.get(stage, 0) + 1
+
+    def _take_round_trip(self, error: OutputParserException) -> None:
+        request = _current_request.get()
+        with self._lock:
+            used = self._round_trips.get(request, 0)
+            if self.fallback is None or used >= self.max_round_trips:
+                if self.fallback is not None:
+                    self.metrics.budget_exhausted += 1
+                self.metrics.failures += 1
+                raise error
+            self._round_trips[request] = used + 1
+            self._round_trips.move_to_end(request)
+            while len(self._round_trips) > self.max_requests:
+                self._round_trips.popitem(last=False)
+            self.metrics.llm_round_trips += 1
+
+    def _fallback(self, call: Callable[[], Any]) -> Any:
+        try:
+            result = call()
+        except OutputParserException:
+            with self._lock:
+                self.metrics.failures += 1
+            raise
+        with self._lock:
+            self.metrics.parsed += 1
+        return result
+
+    @contextmanager
+    def _call_scope(self) -> Iterator[None]:
+        """没有指定请求时，把这一次调用当作一个请求，结束后删除它的计数。"""
+        if _current_request.get() is not None:
+            yield
+            return
+        request = f"call-{uuid.uuid4().hex}"
+        token = _current_request.set(request)
+        try:
+            yield
+        finally:
+            _current_request.reset(token)
+            with self._lock:
+                self._round_trips.pop(request, None)
+
+    def parse(self, text: str) -> Any:
+        try:
+            stage, result = self.repair(text)
+        except OutputParserException as e:
+            with self._call_scope():
+                self._take_round_trip(e)
+                return self._fallback(lambda: self.fallback.parse(text))
+        self._record(stage)
+        return result
+
+    def parse_with_prompt(self, completion: str, prompt: PromptValue) -> Any:
+        try:
+            stage, result = self.repair(completion)
+        except OutputParserException as e:
+            with self._call_scope():
+                self._take_round_trip(e)
+                return self._fallback(
+                    lambda: self.fallback.parse_with_prompt(completion, prompt)
+                )
+        self._record(stage)
+        return result
+
+    def _request_scope(self, config: Optional[RunnableConfig]) -> Any:
+        """metadata中有request_id时按它计算，否则把这一次调用当作一个请求。"""
+        request = ((config or {}).get("metadata") or {}).get("request_id")
+        if request is None:
+            return self._call_scope()
+        return repair_request(str(request))
+
+    # batch/stream默认逐个调用invoke，abatch/astream逐个调用ainvoke，都按请求计算
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with self._request_scope(config):
+            return super().invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        with self._request_scope(config):
+            return await super().ainvoke(input, config, **kwargs)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics = RepairMetrics()
+            self._round_trips.clear()
+
+    def get_format_instructions(self) -> str:
+        return self.parser.get_format_instructions()
+
+    @property
+    def _type(self) -> str:
+        return "repairing"
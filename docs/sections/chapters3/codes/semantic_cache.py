@@ -0,0 +1,275 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import ChatGeneration
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """小写、去掉标点并合并空白，"Tell me a joke"与"tell me a joke!"会得到相同的结果。"""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+class NgramEmbeddings(Embeddings):
+    """本地的嵌入替身：字符n-gram哈希到固定维度后做L2归一化。
+    不需要下载模型，也不访问网络；措辞相近的文本会得到相近的向量，适合测试语义缓存。
+    """
+
+    def __init__(self, size: int = 512, ngram: int = 3):
+        self.size = size
+        self.ngram = ngram
+
+    def _embed(self, text: str) -> List[float]:
+        text = f" {normalize_text(text)} "
+        vector = np.zeros(self.size, dtype=np.float32)
+        for i in range(max(len(text) - self.ngram + 1, 1)):
+            gram = text[i : i + self.ngram].encode("utf-8")
+            digest = hashlib.blake2b(gram, digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def prompt_text(prompt: str) -> str:
+    """从缓存的prompt中取出用于嵌入的文本。
+    聊天模型的prompt是序列化后的消息列表，这里只保留各条消息的content。
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    parts = []
+    for message in messages:
+        content = message.get("kwargs", {}).get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            parts.append(content)
+    return "\n".join(parts) if parts else prompt
+
+
+def estimate_tokens(text: str) -> int:
+    return max(len(text) // 4, 1)
+
+
+class _Entry:
+    __slots__ = ("prompt", "value", "latency", "tokens")
+
+    def __init__(self, prompt: str, value: RETURN_VAL_TYPE, latency: float, tokens: int):
+        self.prompt = prompt
+        self.value = value
+        self.latency = latency
+        self.tokens = tokens
+
+
+class _Namespace:
+    """一个模型（llm_string）下的向量索引，向量按行存放在一个预分配的矩阵中。
+    last_used与vectors按行对应，记录每个条目最近一次写入或命中的时刻，用于淘汰。
+    """
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.last_used = np.zeros(16, dtype=np.int64)
+        self.entries: List[_Entry] = []
+        self.exact: Dict[str, int] = {}
+
+    def add(self, vector: np.ndarray, entry: _Entry, tick: int) -> None:
+        index = self.exact.get(entry.prompt)
+        if index is not None:
+            self.vectors[index] = vector
+            self.entries[index] = entry
+            self.last_used[index] = tick
+            return
+        if len(self.entries) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.last_used = np.concatenate([self.last_used, np.zeros_like(self.last_used)])
+        self.vectors[len(self.entries)] = vector
+        self.last_used[len(self.entries)] = tick
+        self.exact[entry.prompt] = len(self.entries)
+        self.entries.append(entry)
+
+    def evict(self) -> None:
+        """删除最久未使用的条目：把最后一行移到它的位置，矩阵保持紧凑。"""
+        count = len(self.entries)
+        index = int(np.argmin(self.last_used[:count]))
+        del self.exact[self.entries[index].prompt]
+        last = count - 1
+        if index != last:
+            moved = self.entries[last]
+            self.entries[index] = moved
+            self.vectors[index] = self.vectors[last]
+            self.last_used[index] = self.last_used[last]
+            self.exact[moved.prompt] = index
+        self.entries.pop()
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if not self.entries:
+            return None, 0.0
+        scores = self.vectors[: len(self.entries)] @ vector
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+
+class SemanticCache(BaseCache):
+    """按嵌入相似度命中的LLM缓存。
+    精确匹配的缓存对"Tell me a joke"和"tell me a joke!"会未命中。这里先对prompt做嵌入，
+    再在同一模型（llm_string）的命名空间内找最相似的已缓存prompt，
+    余弦相似度不低于`threshold`时直接返回缓存的生成结果，不再调用模型。
+    每个命名空间最多保存max_entries个条目，最多保留max_namespaces个命名空间，
+    超出时淘汰最久未使用的。未命中后超过miss_ttl秒仍没有update的记录会被丢弃
+    （例如模型调用出错，或调用方跳过了缓存写入），最多记录max_entries个。
+    Example:
+        cache = SemanticCache(NgramEmbeddings(), threshold=0.9)
+        set_llm_cache(cache)
+        ...
+        print(cache.report())
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = 0.9,
+        max_entries: int = 10_000,
+        max_namespaces: int = 100,
+        miss_ttl: float = 600.0,
+    ):
+        self.embeddings = embeddings or NgramEmbeddings()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self.miss_ttl = miss_ttl
+        # 按最近使用的顺序排列
+        self._namespaces: "OrderedDict[str, _Namespace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tick = 0
+        # 未命中时记录开始时间，update时据此得到模型调用的耗时；按开始时间排列
+        self._miss_started: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        """嵌入并做L2归一化，点积即为余弦相似度；嵌入模型不一定返回单位向量。
+        零向量原样返回，与任何条目的相似度都是0。
+        """
+        vector = np.asarray(self.embeddings.embed_query(prompt_text(prompt)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _next_tick(self) -> int:
+        self._tick += 1
+        return self._tick
+
+    def _hit(self, namespace: _Namespace, index: int) -> RETURN_VAL_TYPE:
+        """记录一次命中（持有锁）。"""
+        entry = namespace.entries[index]
+        namespace.last_used[index] = self._next_tick()
+        self.saved_seconds += entry.latency
+        self.saved_tokens += entry.tokens
+        return entry.value
+
+    def _record_miss(self, key: Tuple[str, str]) -> None:
+        """记录未命中的开始时间，并丢弃过期或超出数量的记录（持有锁）。"""
+        now = time.perf_counter()
+        self._miss_started.pop(key, None)
+        self._miss_started[key] = now
+        while self._miss_started:
+            oldest = next(iter(self._miss_started.values()))
+            if now - oldest <= self.miss_ttl and len(self._miss_started) <= self.max_entries:
+                break
+            self._miss_started.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        with self._lock:
+            namespace = self._namespaces.get(llm_string)
+            if namespace is not None:
+                self._namespaces.move_to_end(llm_string)
+            index = namespace.exact.get(prompt) if namespace else None
+            if index is not None:
+                self.exact_hits += 1
+                return self._hit(namespace, index)
+        if namespace is not None:
+            vector = self._embed(prompt)
+            with self._lock:
+                # 命名空间可能在嵌入期间被淘汰或清空，下标只在持有锁时使用
+                if self._namespaces.get(llm_string) is namespace:
+                    index, score = namespace.search(vector)
+                    if index is not None and score >= self.threshold:
+                        self.semantic_hits += 1
+                        return self._hit(namespace, index)
+        with self._lock:
+            self.misses += 1
+            self._record_miss((prompt, llm_string))
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        vector = self._embed(prompt)
+        tokens = 0
+        for generation in return_val:
+            usage = None
+            if isinstance(generation, ChatGeneration):
+                usage = getattr(generation.message, "usage_metadata", None)
+            if usage:
+                tokens += usage.get("total_tokens", 0)
+            else:
+                tokens += estimate_tokens(prompt_text(prompt)) + estimate_tokens(
+                    generation.text
+                )
+        with self._lock:
+            started = self._miss_started.pop((prompt, llm_string), None)
+            latency = time.perf_counter() - started if started is not None else 0.0
+            namespace = self._namespaces.get(llm_string)
+            if namespace is None:
+                namespace = self._namespaces[llm_string] = _Namespace(len(vector))
+                while len(self._namespaces) > self.max_namespaces:
+                    self._namespaces.popitem(last=False)
+            else:
+                self._namespaces.move_to_end(llm_string)
+            namespace.add(vector, _Entry(prompt, return_val, latency, tokens), self._next_tick())
+            while len(namespace.entries) > self.max_entries:
+                namespace.evict()
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空缓存。传入llm_string时只清空该模型的命名空间。"""
+        with self._lock:
+            llm_string = kwargs.get("llm_string")
+            if llm_string is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(llm_string, None)
+            self._miss_started.clear()
+
+    def report(self) -> Dict[str, Any]:
+        """返回命中情况，以及因命中而节省的模型调用耗时（秒）和token数。"""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": sum(len(ns.entries) for ns in self._namespaces.values()),
+                "namespaces": len(self._namespaces),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups
+                if lookups
+                else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "saved_tokens": self.saved_tokens,
+            }
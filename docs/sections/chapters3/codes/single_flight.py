@@ -0,0 +1,179 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Flight:
+    """异步调用：fn在单独的任务中执行，waiters是正在等待结果的调用数。"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 1
+
+
+class SingleFlight:
+    """合并相同键的并发请求：同一时刻只有一个调用（leader）真正执行，
+    其余调用（follower）等待并共享它的结果或异常。
+    同步调用按线程合并，异步调用按事件循环合并。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._flights: Dict[Tuple[int, Hashable], _Flight] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """执行fn或等待正在执行的相同调用，返回(结果, 是否为共享结果)。"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """do的异步版本。fn在单独的任务中执行，所有调用（包括leader）通过shield等待它：
+        某个调用被取消（例如客户端超时）时，其余调用照常得到结果；
+        所有调用都被取消后才取消fn。
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            flight = self._flights.get(loop_key)
+            if flight is not None:
+                flight.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                flight = self._flights[loop_key] = _Flight(loop.create_task(fn()))
+                flight.task.add_done_callback(lambda task: self._finish(loop_key, task))
+                self.executed += 1
+                leader = True
+        try:
+            return await asyncio.shield(flight.task), not leader
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.waiters -= 1
+                abandoned = flight.waiters == 0
+            if abandoned:
+                flight.task.cancel()
+            raise
+
+    def _finish(self, loop_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        with self._lock:
+            if self._flights.get(loop_key) is not None and self._flights[loop_key].task is task:
+                del self._flights[loop_key]
+        # 所有调用都已取消时没有人读取异常，避免"exception was never retrieved"警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._flights),
+            }
+
+
+default_group = SingleFlight()
+"""默认的全局合并组。键包含llm_string，因此不同配置的模型不会互相合并。"""
+
+
+class SingleFlightChatModel(BaseChatModel):
+    """合并完全相同的并发请求的聊天模型混入类。
+    开启LLM缓存时，在第一次调用返回之前缓存里什么也没有，相同的提示会被重复发送。
+    这里使用与缓存相同的键（消息序列化 + llm_string）合并正在进行中的请求，
+    相同的并发请求只调用一次模型，其余调用等待并共享结果。
+    Example:
+        class SingleFlightChatOpenAI(SingleFlightChatModel, ChatOpenAI):
+            pass
+    """
+
+    @property
+    def _single_flight(self) -> SingleFlight:
+        return default_group
+
+    def _single_flight_key(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any
+    ) -> Tuple[str, str]:
+        normalized = [
+            m.model_copy(update={"id": None}) if getattr(m, "id", None) else m
+            for m in messages
+        ]
+        return dumps(normalized), self._get_llm_string(stop=stop, **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self._single_flight_key(messages, stop, **kwargs)
+        result, shared = self._single_flight.do(
+            key,
+            lambda: super(SingleFlightChatModel, self)._generate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ),
+        )
+        # 共享的结果复制一份，避免多个调用方修改同一个消息对象
+        return result.model_copy(deep=True) if shared else result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self._single_flight_key(messages, stop, **kwargs)
+        result, shared = await self._single_flight.ado(
+            key,
+            lambda: super(SingleFlightChatModel, self)._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ),
+        )
+        return result.model_copy(deep=True) if shared else result
@@ -0,0 +1,372 @@
+import functools
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    llm TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at);
+"""
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """把(llm_string, prompt)压缩成定长的哈希键，索引更小，查找更快。"""
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def serialize_generations(return_val: RETURN_VAL_TYPE) -> str:
+    return json.dumps([dumps(generation) for generation in return_val])
+
+
+def deserialize_generations(data: str) -> RETURN_VAL_TYPE:
+    # 缓存中只有Generation、ChatGeneration和消息，只允许反序列化core中的类
+    return [loads(item, allowed_objects="core") for item in json.loads(data)]
+
+
+def connect(database_path: str, busy_timeout: float) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        database_path,
+        timeout=busy_timeout,
+        check_same_thread=False,
+        isolation_level=None,
+    )
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+    return conn
+
+
+def maintain(conn: sqlite3.Connection) -> None:
+    """删除过期条目，回收空闲页，并截断WAL文件。"""
+    conn.execute(
+        "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+        (time.time(),),
+    )
+    conn.execute("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class _BatchWriter:
+    """后台写线程：把队列中的写请求按批提交。
+    只持有连接参数和队列，不引用缓存对象，缓存对象不再使用时可以被正常回收。
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        batch_size: int,
+        flush_interval: float,
+        maintenance_interval: float,
+    ):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maintenance_interval = maintenance_interval
+        # 已入队但尚未提交的写，保证同一进程内写后立即可读
+        self.pending: Dict[str, Tuple[str, Optional[float]]] = {}
+        self.pending_lock = threading.Lock()
+        self.writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.batches = 0
+        self.thread = threading.Thread(
+            target=self.run, name="WALSQLiteCache-writer", daemon=True
+        )
+        self.thread.start()
+
+    def run(self) -> None:
+        conn = self.connect()
+        last_maintenance = time.monotonic()
+        running = True
+        while running:
+            batch: List[tuple] = []
+            try:
+                item = self.writes.get(timeout=self.flush_interval)
+                if item is None:
+                    running = False
+                else:
+                    batch.append(item)
+                # 把队列中已有的写请求凑成一批
+                while running and len(batch) < self.batch_size:
+                    item = self.writes.get_nowait()
+                    if item is None:
+                        running = False
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self.commit(conn, batch)
+                except Exception:
+                    logger.exception("Failed to commit %d cache entries", len(batch))
+            for _ in range(len(batch) + (0 if running else 1)):
+                self.writes.task_done()
+            if time.monotonic() - last_maintenance >= self.maintenance_interval:
+                try:
+                    maintain(conn)
+                except sqlite3.Error:
+                    logger.exception("Cache maintenance failed")
+                last_maintenance = time.monotonic()
+        conn.close()
+
+    def commit(self, conn: sqlite3.Connection, batch: List[tuple]) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, prompt, llm, response, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            with self.pending_lock:
+                for key, _, _, response, _, _ in batch:
+                    if self.pending.get(key, (None,))[0] == response:
+                        del self.pending[key]
+        self.batches += 1
+
+    def stop(self) -> None:
+        """提交剩余的写后结束线程。"""
+        self.writes.put(None)
+        # 缓存对象也可能在写线程中被垃圾回收，这时不能等待自己
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+
+def _shutdown(
+    writer: _BatchWriter, readers: "queue.Queue[Optional[sqlite3.Connection]]"
+) -> None:
+    """关闭缓存：由weakref.finalize调用，在close()、对象被回收或进程退出时执行一次。"""
+    writer.stop()
+    while True:
+        try:
+            conn = readers.get_nowait()
+        except queue.Empty:
+            break
+        if conn is not None:
+            conn.close()
+    # 连接池中只留下None，正在等待连接的线程取到它后会抛出异常
+    readers.put(None)
+
+
+class WALSQLiteCache(BaseCache):
+    """面向高并发的SQLite LLM缓存。
+    与`SQLiteCache`相比：
+    - 使用WAL日志模式，读不阻塞写，多个进程可以共享同一个数据库文件；
+    - 读请求从一个连接池中取连接，多个线程可以同时查询；
+    - 写请求进入队列，由后台线程按批提交，一次事务写入多条；
+    - 键是(llm_string, prompt)的哈希并带主键索引；
+    - 后台线程定期清理过期条目、回收空间并截断WAL文件。
+    回收空间依赖`auto_vacuum=INCREMENTAL`，它只对新建的数据库生效；
+    已有的数据库（例如`SQLiteCache`留下的文件）需要先执行一次`VACUUM`才会切换，
+    否则删除过期条目后文件不会变小。
+    close()之后再调用lookup、update等方法会抛出RuntimeError。
+    Example:
+        cache = WALSQLiteCache(database_path=".langchain.db", ttl=7 * 24 * 3600)
+        set_llm_cache(cache)
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".langchain.db",
+        pool_size: int = 8,
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        ttl: Optional[float] = None,
+        maintenance_interval: float = 600.0,
+        busy_timeout: float = 30.0,
+    ):
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.maintenance_interval = maintenance_interval
+        self.busy_timeout = busy_timeout
+
+        conn = self._connect()
+        # auto_vacuum只能在建表之前设置，已有的数据库需要VACUUM才会切换
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logger.warning(
+                "auto_vacuum is not enabled for %s; run VACUUM once to reclaim space "
+                "of expired entries",
+                database_path,
+            )
+        conn.close()
+
+        self._readers: "queue.Queue[Optional[sqlite3.Connection]]" = queue.Queue()
+        for _ in range(pool_size):
+            self._readers.put(self._connect())
+
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writer = _BatchWriter(
+            functools.partial(connect, database_path, busy_timeout),
+            batch_size,
+            flush_interval,
+            maintenance_interval,
+        )
+        # 不用atexit.register(self.close)：它会让缓存对象一直存活到进程退出；
+        # finalize只引用写线程和连接池，对象被回收或进程退出时都会关闭
+        self._finalizer = weakref.finalize(self, _shutdown, self._writer, self._readers)
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect(self.database_path, self.busy_timeout)
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    @property
+    def batches(self) -> int:
+        return self._writer.batches
+
+    def _check_open(self) -> None:
+        if self.closed:
+            raise RuntimeError("Cache is closed.")
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        self._check_open()
+        conn = self._readers.get()
+        if conn is None:
+            # 缓存已经关闭，把None放回去，让其他等待的线程也能退出
+            self._readers.put(None)
+            raise RuntimeError("Cache is closed.")
+        try:
+            yield conn
+        finally:
+            if self.closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        self._check_open()
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._writer.pending_lock:
+            pending = self._writer.pending.get(key)
+        if pending is not None:
+            response, expires_at = pending
+        else:
+            with self._reader() as conn:
+                row = conn.execute(
+                    "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                self._count(hit=False)
+                return None
+            response, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return deserialize_generations(response)
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def update(
+        self,
+        prompt: str,
+        llm_string: str,
+        return_val: RETURN_VAL_TYPE,
+        *,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """写入条目。created_at为原来的写入时间戳（例如导入时），ttl从它开始计算。"""
+        self._check_open()
+        key = cache_key(prompt, llm_string)
+        created_at = time.time() if created_at is None else created_at
+        expires_at = created_at + self.ttl if self.ttl is not None else None
+        response = serialize_generations(return_val)
+        with self._writer.pending_lock:
+            self._writer.pending[key] = (response, expires_at)
+        self._writer.writes.put(
+            (key, prompt, llm_string, response, created_at, expires_at)
+        )
+
+    async def aupdate(
+        self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE
+    ) -> None:
+        # 写只是入队，不需要放到线程池中执行
+        self.update(prompt, llm_string, return_val)
+
+    def maintain(self) -> None:
+        """立即执行一次维护（清理过期条目、回收空间）。"""
+        self.flush()
+        conn = self._connect()
+        try:
+            maintain(conn)
+        finally:
+            conn.close()
+
+    def flush(self) -> None:
+        """阻塞直到所有已入队的写都已提交。"""
+        self._check_open()
+        self._writer.writes.join()
+
+    def clear(self, **kwargs: Any) -> None:
+        self.flush()
+        with self._reader() as conn:
+            conn.execute("DELETE FROM llm_cache")
+        with self._writer.pending_lock:
+            self._writer.pending.clear()
+
+    def close(self) -> None:
+        """提交剩余的写并关闭所有连接。可以重复调用。"""
+        self._finalizer()
+
+    def iter_entries(self) -> Iterator[Tuple[str, str, RETURN_VAL_TYPE, float]]:
+        """遍历未过期的条目，返回(prompt, llm_string, generations, 写入时间戳)。"""
+        self.flush()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT prompt, llm, response, created_at FROM llm_cache "
+                "WHERE expires_at IS NULL OR expires_at > ?",
+                (time.time(),),
+            )
+            for prompt, llm_string, response, created_at in rows:
+                yield prompt, llm_string, deserialize_generations(response), created_at
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "pending_writes": self._writer.writes.qsize(),
+            "batches": self.batches,
+        }
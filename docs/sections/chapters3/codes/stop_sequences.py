@@ -0,0 +1,220 @@
+from collections import deque
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk
+
+T = TypeVar("T")
+
+
+class StopSequenceMatcher:
+    """基于Aho-Corasick自动机的停止序列匹配器。
+    自动机只构建一次，可以被任意多个流共享；每个流通过`scanner()`获得独立的匹配状态。
+    Example:
+        matcher = StopSequenceMatcher(["\\nHuman:", "Observation:"])
+        scanner = matcher.scanner()
+        text, stopped = scanner.feed("Thought: ...\\nObserv")
+    """
+
+    def __init__(self, stop: Sequence[str], include_stop: bool = False):
+        stop = [s for s in stop if s]
+        if not stop:
+            raise ValueError("At least one non-empty stop sequence is required.")
+        self.stop = list(stop)
+        self.include_stop = include_stop
+        # goto[state][char] -> state；depth[state]为该状态对应前缀的长度
+        self._goto: List[Dict[str, int]] = [{}]
+        self._depth: List[int] = [0]
+        # 到达该状态时完成的最长停止序列长度，0表示没有完成
+        self._output: List[int] = [0]
+        for s in self.stop:
+            state = 0
+            for ch in s:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._depth.append(self._depth[state] + 1)
+                    self._output.append(0)
+                state = nxt
+            self._output[state] = max(self._output[state], len(s))
+        self._fail: List[int] = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fail = self._fail[state]
+                    while fail and ch not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._output[nxt] = max(self._output[nxt], self._output[self._fail[nxt]])
+
+    def step(self, state: int, ch: str) -> int:
+        """自动机转移一步。"""
+        while state and ch not in self._goto[state]:
+            state = self._fail[state]
+        return self._goto[state].get(ch, 0)
+
+    def scanner(self) -> "StopSequenceScanner":
+        return StopSequenceScanner(self)
+
+    def truncate(self, text: str) -> Tuple[str, bool]:
+        """对完整文本做截断，返回(截断后的文本, 是否命中停止序列)。"""
+        scanner = self.scanner()
+        emitted, stopped = scanner.feed(text)
+        if stopped:
+            return emitted, True
+        return emitted + scanner.flush(), False
+
+
+class StopSequenceScanner:
+    """单个流的匹配状态，可以跨块保存部分匹配。
+    `feed`只返回确定不属于任何停止序列的文本；可能是停止序列开头的尾部会被暂存，
+    直到后续字符确认匹配失败（再输出）或匹配成功（丢弃并停止）。
+    """
+
+    def __init__(self, matcher: StopSequenceMatcher):
+        self.matcher = matcher
+        self.state = 0
+        self.pending = ""
+        self.stopped = False
+
+    def feed(self, text: str) -> Tuple[str, bool]:
+        """输入一个新块，返回(可以输出的文本, 是否已经命中停止序列)。"""
+        if self.stopped:
+            return "", True
+        matcher = self.matcher
+        pieces: List[str] = []
+        start = 0
+        state = self.state
+        for i, ch in enumerate(text):
+            state = matcher.step(state, ch)
+            length = matcher._output[state]
+            if length:
+                held = self.pending + text[start : i + 1]
+                cut = len(held) - length
+                pieces.append(held if matcher.include_stop else held[:cut])
+                self.pending, self.state, self.stopped = "", 0, True
+                return "".join(pieces), True
+            if state == 0:
+                # 没有任何部分匹配，当前位置之前的内容都可以安全输出
+                pieces.append(self.pending + text[start : i + 1])
+                self.pending = ""
+                start = i + 1
+        held = self.pending + text[start:]
+        depth = matcher._depth[state]
+        safe = len(held) - depth
+        if safe > 0:
+            pieces.append(held[:safe])
+        self.pending = held[safe:] if safe > 0 else held
+        self.state = state
+        return "".join(pieces), False
+
+    def flush(self) -> str:
+        """流结束且未命中停止序列时，取回暂存的文本。"""
+        pending, self.pending, self.state = self.pending, "", 0
+        return pending
+
+
+@lru_cache(maxsize=256)
+def get_matcher(stop: Tuple[str, ...], include_stop: bool = False) -> StopSequenceMatcher:
+    """按停止序列缓存已构建的自动机，相同的stop参数只构建一次。"""
+    return StopSequenceMatcher(stop, include_stop)
+
+
+def _chunk_text(chunk: Any) -> str:
+    return chunk if isinstance(chunk, str) else chunk.text
+
+
+def _with_text(chunk: T, text: str) -> T:
+    if isinstance(chunk, str):
+        return text
+    if isinstance(chunk, ChatGenerationChunk):
+        return ChatGenerationChunk(
+            message=chunk.message.model_copy(update={"content": text}),
+            generation_info=chunk.generation_info,
+        )
+    if isinstance(chunk, GenerationChunk):
+        return GenerationChunk(text=text, generation_info=chunk.generation_info)
+    raise TypeError(f"Unsupported chunk type: {type(chunk)}")
+
+
+def stream_with_stop(
+    chunks: Iterable[T], stop: Optional[Sequence[str]], include_stop: bool = False
+) -> Iterator[T]:
+    """按停止序列截断一个块流（str、GenerationChunk或ChatGenerationChunk）。
+    命中停止序列后立即关闭上游生成器，不再为之后的token付出代价。
+    """
+    if not stop:
+        yield from chunks
+        return
+    scanner = get_matcher(tuple(stop), include_stop).scanner()
+    last = None
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            last = chunk
+            text, stopped = scanner.feed(_chunk_text(chunk))
+            if text:
+                yield _with_text(chunk, text)
+            if stopped:
+                return
+        rest = scanner.flush()
+        if rest and last is not None:
+            yield _with_text(last, rest)
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+
+async def astream_with_stop(
+    chunks: AsyncIterator[T],
+    stop: Optional[Sequence[str]],
+    include_stop: bool = False,
+) -> AsyncIterator[T]:
+    """stream_with_stop的异步版本。"""
+    if not stop:
+        async for chunk in chunks:
+            yield chunk
+        return
+    scanner = get_matcher(tuple(stop), include_stop).scanner()
+    last = None
+    try:
+        async for chunk in chunks:
+            last = chunk
+            text, stopped = scanner.feed(_chunk_text(chunk))
+            if text:
+                yield _with_text(chunk, text)
+            if stopped:
+                return
+        rest = scanner.flush()
+        if rest and last is not None:
+            yield _with_text(last, rest)
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose:
+            await aclose()
+
+
+def truncate_at_stop(
+    text: str, stop: Optional[Sequence[str]], include_stop: bool = False
+) -> str:
+    """非流式调用的截断：返回第一个完成的停止序列之前的文本。"""
+    if not stop:
+        return text
+    return get_matcher(tuple(stop), include_stop).truncate(text)[0]
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.llms import BaseLLM
+from langchain_core.load import dumps
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+)
+from langchain_core.outputs import (
+    ChatGeneration,
+    ChatGenerationChunk,
+    Generation,
+    GenerationChunk,
+)
+from pydantic import BaseModel, field_validator
+
+from memory_cache import BoundedInMemoryCache
+from native_batch import resolve_cache
+
+# 流式时间线[[距开始的秒数, 累计字符数], ...]保存在单独的缓存中，键与LLM缓存相同。
+# 不放进generation_info，invoke命中缓存时得到的结果与直接调用模型相同；
+# 也不写入LLM缓存，不会出现在缓存的统计和导出中。
+_stream_timing_cache: BaseCache = BoundedInMemoryCache(maxsize=10_000)
+
+
+def set_stream_timing_cache(cache: BaseCache) -> None:
+    """设置保存流式时间线的缓存。默认是进程内的有界缓存，进程重启后时间线丢失，
+    `"recorded"`模式退化为一次性返回；需要持久保存时可以换成WALSQLiteCache等。"""
+    global _stream_timing_cache
+    _stream_timing_cache = cache
+
+
+def get_stream_timing_cache() -> BaseCache:
+    return _stream_timing_cache
+
+
+class _Recorder:
+    """在直播流中记录每个块到达的时间与累计字符数。"""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.timing: List[List[float]] = []
+        self.length = 0
+        self.accumulated: Any = None
+
+    def add(self, chunk: Any) -> None:
+        self.length += len(chunk.text)
+        self.timing.append([time.perf_counter() - self.started, self.length])
+        self.accumulated = chunk if self.accumulated is None else self.accumulated + chunk
+
+
+def _pieces(text: str, timing: Optional[List[List[float]]]) -> List[Tuple[float, str]]:
+    """把缓存的文本切回(距开始的秒数, 文本片段)列表。"""
+    if not timing:
+        return [(0.0, text)]
+    pieces = []
+    start = 0
+    for offset, end in timing:
+        end = int(end)
+        if end > start:
+            pieces.append((offset, text[start:end]))
+            start = end
+    if start < len(text):
+        pieces.append((timing[-1][0], text[start:]))
+    return pieces
+
+
+def _timing_value(timing: List[List[float]]) -> List[Generation]:
+    return [Generation(text=json.dumps(timing))]
+
+
+class _ReplayOptions(BaseModel):
+    """两个混入类共享的回放选项。"""
+
+    stream_replay: str = "instant"
+    """命中缓存时的回放方式：instant或recorded。"""
+
+    stream_replay_speed: float = 1.0
+    """recorded模式的回放速度倍数。"""
+
+    @field_validator("stream_replay")
+    @classmethod
+    def _check_replay(cls, value: str) -> str:
+        if value not in ("instant", "recorded"):
+            raise ValueError(f"Unknown stream_replay mode: {value}")
+        return value
+
+    @field_validator("stream_replay_speed")
+    @classmethod
+    def _check_speed(cls, value: float) -> float:
+        if value <= 0:
+            raise ValueError("stream_replay_speed must be positive.")
+        return value
+
+    @staticmethod
+    def _timing(cached: Optional[Sequence[Generation]]) -> Optional[List[List[float]]]:
+        """从时间线条目中取出时间线。"""
+        if not cached:
+            return None
+        try:
+            return json.loads(cached[0].text)
+        except ValueError:
+            return None
+
+
+class CachedStreamChatModel(_ReplayOptions, BaseChatModel):
+    """让聊天模型的stream/astream也使用LLM缓存。
+    命中时把缓存的文本作为块流返回：`stream_replay="instant"`一次性返回，
+    `"recorded"`按首次直播时记录的时间线（乘以`1/stream_replay_speed`）逐块返回。
+    未命中时正常调用模型，并在流结束后把拼接好的结果写入缓存，之后invoke和stream都能命中。
+    Example:
+        class CachedChatOpenAI(CachedStreamChatModel, ChatOpenAI):
+            pass
+    """
+
+    def _stream_cache_key(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any
+    ) -> Tuple[str, str]:
+        # 与BaseChatModel._generate_with_cache使用相同的键，invoke与stream共享缓存
+        normalized = [
+            m.model_copy(update={"id": None}) if getattr(m, "id", None) else m
+            for m in messages
+        ]
+        return dumps(normalized), self._get_llm_string(stop=stop, **kwargs)
+
+    def _replay_chunks(
+        self, generation: Generation, timing: Optional[List[List[float]]]
+    ) -> List[Tuple[float, ChatGenerationChunk]]:
+        message = generation.message if isinstance(generation, ChatGeneration) else None
+        text = generation.text if message is None else message.content
+        if not isinstance(text, str):
+            text = generation.text
+        pieces = _pieces(text, timing)
+        chunks = [
+            (offset, ChatGenerationChunk(message=AIMessageChunk(content=piece)))
+            for offset, piece in pieces
+        ]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            chunks.append(
+                (
+                    chunks[-1][0],
+                    ChatGenerationChunk(
+                        message=AIMessageChunk(
+                            content="",
+                            tool_call_chunks=[
+                                {
+                                    "name": call["name"],
+                                    "args": json.dumps(call["args"]),
+                                    "id": call.get("id"),
+                                    "index": i,
+                                }
+                                for i, call in enumerate(message.tool_calls)
+                            ],
+                        )
+                    ),
+                )
+            )
+        return chunks
+
+    @staticmethod
+    def _to_generation(recorder: _Recorder) -> ChatGeneration:
+        chunk = recorder.accumulated
+        return ChatGeneration(
+            message=message_chunk_to_message(chunk.message),
+            generation_info=chunk.generation_info,
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        cache: Optional[BaseCache] = resolve_cache(self.cache)
+        if cache is None:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        prompt, llm_string = self._stream_cache_key(messages, stop, **kwargs)
+        cached = cache.lookup(prompt, llm_string)
+        if isinstance(cached, list) and cached:
+            timing = None
+            if self.stream_replay == "recorded":
+                timing = self._timing(get_stream_timing_cache().lookup(prompt, llm_string))
+            started = time.perf_counter()
+            for offset, chunk in self._replay_chunks(cached[0], timing):
+                delay = offset / self.stream_replay_speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        recorder = _Recorder()
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            recorder.add(chunk)
+            yield chunk
+        if recorder.accumulated is not None:
+            cache.update(prompt, llm_string, [self._to_generation(recorder)])
+            get_stream_timing_cache().update(
+                prompt, llm_string, _timing_value(recorder.timing)
+            )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        cache: Optional[BaseCache] = resolve_cache(self.cache)
+        if cache is None:
+            async for chunk in super()._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
+            return
+        prompt, llm_string = self._stream_cache_key(messages, stop, **kwargs)
+        cached = await cache.alookup(prompt, llm_string)
+        if isinstance(cached, list) and cached:
+            timing = None
+            if self.stream_replay == "recorded":
+                timing = self._timing(
+                    await get_stream_timing_cache().alookup(prompt, llm_string)
+                )
+            started = time.perf_counter()
+            for offset, chunk in self._replay_chunks(cached[0], timing):
+                delay = offset / self.stream_replay_speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        recorder = _Recorder()
+        async for chunk in super()._astream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            recorder.add(chunk)
+            yield chunk
+        if recorder.accumulated is not None:
+            await cache.aupdate(prompt, llm_string, [self._to_generation(recorder)])
+            await get_stream_timing_cache().aupdate(
+                prompt, llm_string, _timing_value(recorder.timing)
+            )
+
+
+class CachedStreamLLM(_ReplayOptions, BaseLLM):
+    """CachedStreamChatModel的LLM版本，与BaseLLM.generate使用相同的缓存键。
+    Example:
+        class CachedOpenAI(CachedStreamLLM, OpenAI):
+            pass
+    """
+
+    def _stream_llm_string(self, stop: Optional[List[str]]) -> str:
+        # 与BaseLLM.generate相同，保留子类对已弃用的dict()的重写
+        params = self._dict_for_compat()
+        params["stop"] = stop
+        return str(sorted(params.items()))
+
+    def _replay_chunks(
+        self, generation: Generation, timing: Optional[List[List[float]]]
+    ) -> List[Tuple[float, GenerationChunk]]:
+        return [
+            (offset, GenerationChunk(text=piece))
+            for offset, piece in _pieces(generation.text, timing)
+        ]
+
+    @staticmethod
+    def _to_generation(recorder: _Recorder) -> Generation:
+        chunk = recorder.accumulated
+        return Generation(text=chunk.text, generation_info=chunk.generation_info)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        cache: Optional[BaseCache] = resolve_cache(self.cache)
+        if cache is None:
+            yield from super()._stream(prompt, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        llm_string = self._stream_llm_string(stop)
+        cached = cache.lookup(prompt, llm_string)
+        if isinstance(cached, list) and cached:
+            timing = None
+            if self.stream_replay == "recorded":
+                timing = self._timing(get_stream_timing_cache().lookup(prompt, llm_string))
+            started = time.perf_counter()
+            for offset, chunk in self._replay_chunks(cached[0], timing):
+                delay = offset / self.stream_replay_speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        recorder = _Recorder()
+        for chunk in super()._stream(prompt, stop=stop, run_manager=run_manager, **kwargs):
+            recorder.add(chunk)
+            yield chunk
+        if recorder.accumulated is not None:
+            cache.update(prompt, llm_string, [self._to_generation(recorder)])
+            get_stream_timing_cache().update(
+                prompt, llm_string, _timing_value(recorder.timing)
+            )
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        cache: Optional[BaseCache] = resolve_cache(self.cache)
+        if cache is None:
+            async for chunk in super()._astream(
+                prompt, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
+            return
+        llm_string = self._stream_llm_string(stop)
+        cached = await cache.alookup(prompt, llm_string)
+        if isinstance(cached, list) and cached:
+            timing = None
+            if self.stream_replay == "recorded":
+                timing = self._timing(
+                    await get_stream_timing_cache().alookup(prompt, llm_string)
+                )
+            started = time.perf_counter()
+            for offset, chunk in self._replay_chunks(cached[0], timing):
+                delay = offset / self.stream_replay_speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        recorder = _Recorder()
+        async for chunk in super()._astream(
+            prompt, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            recorder.add(chunk)
+            yield chunk
+        if recorder.accumulated is not None:
+            await cache.aupdate(prompt, llm_string, [self._to_generation(recorder)])
+            await get_stream_timing_cache().aupdate(
+                prompt, llm_string, _timing_value(recorder.timing)
+            )
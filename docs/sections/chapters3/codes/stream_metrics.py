@@ -0,0 +1,281 @@
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGenerationChunk, GenerationChunk, LLMResult
+
+from bench import percentile
+
+T = TypeVar("T")
+
+
+def chunk_text(chunk: Any) -> str:
+    """取出块的文本，用于统计字节数：字符串、消息块与生成块取文本，其余序列化为JSON。"""
+    if isinstance(chunk, str):
+        return chunk
+    content = getattr(chunk, "content", None)
+    if isinstance(content, str):
+        return content
+    text = getattr(chunk, "text", None)
+    if isinstance(text, str):
+        return text
+    return json.dumps(chunk, ensure_ascii=False, default=str)
+
+
+@dataclass
+class StreamMetrics:
+    """一次运行（LCEL中的一个步骤）的流式时间线，时间单位为秒。"""
+
+    run_id: UUID
+    parent_run_id: Optional[UUID]
+    name: str
+    kind: str
+    """llm表示模型步骤（按token回调计时），chain表示其他步骤（按输出块计时）。"""
+    started: float
+    root_started: float
+    chunk_times: List[float] = field(default_factory=list, repr=False)
+    bytes: int = 0
+    tokens: Optional[int] = None
+    ended: Optional[float] = None
+
+    @property
+    def chunks(self) -> int:
+        return len(self.chunk_times)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """从该步骤开始到第一个块的时间。"""
+        return self.chunk_times[0] - self.started if self.chunk_times else None
+
+    @property
+    def first_chunk_offset(self) -> Optional[float]:
+        """从最外层运行开始到该步骤第一个块的时间，用于比较各步骤。"""
+        return self.chunk_times[0] - self.root_started if self.chunk_times else None
+
+    @property
+    def gaps(self) -> List[float]:
+        """相邻两个块之间的间隔。"""
+        return [b - a for a, b in zip(self.chunk_times, self.chunk_times[1:])]
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.ended - self.started if self.ended is not None else None
+
+    def summary(self) -> Dict[str, Any]:
+        gaps = sorted(self.gaps)
+        streaming = (
+            self.chunk_times[-1] - self.chunk_times[0] if len(self.chunk_times) > 1 else 0.0
+        )
+        return {
+            "run_id": str(self.run_id),
+            "name": self.name,
+            "kind": self.kind,
+            "ttft": self.ttft,
+            "first_chunk_offset": self.first_chunk_offset,
+            "duration": self.duration,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "tokens": self.tokens,
+            "gap_p50": percentile(gaps, 50),
+            "gap_p95": percentile(gaps, 95),
+            "gap_max": gaps[-1] if gaps else 0.0,
+            "bytes_per_second": self.bytes / streaming if streaming else None,
+            "tokens_per_second": self.tokens / streaming
+            if streaming and self.tokens is not None
+            else None,
+        }
+
+
+class StreamMetricsHandler(BaseCallbackHandler):
+    """记录每次流式运行中每个LCEL步骤的首块时间、块间隔、块数、字节数和token速率。
+    模型步骤按`on_llm_new_token`计时；解析器、RunnableGenerator等步骤通过
+    astream_events使用的同一个钩子（tap_output_iter）在输出块经过时计时。
+    每个步骤结束时调用`on_stream_metrics`（可以在子类中重写，或传入listener），
+    `report()`按步骤名汇总最近的max_completed次步骤运行，更早的结果会被丢弃。
+    Example:
+        handler = StreamMetricsHandler()
+        for chunk in chain.stream(inputs, config={"callbacks": [handler]}):
+            ...
+        print(handler.report())
+    """
+
+    # 同步处理器在异步调用中也立即执行，避免线程池调度影响计时
+    run_inline = True
+
+    def __init__(
+        self,
+        listener: Optional[Callable[[StreamMetrics], None]] = None,
+        max_completed: int = 10_000,
+    ):
+        if max_completed < 1:
+            raise ValueError("max_completed must be at least 1.")
+        self.listener = listener
+        self._lock = threading.Lock()
+        self._runs: Dict[UUID, StreamMetrics] = {}
+        # 只保留最近的结果，长时间运行的服务中内存不会持续增长
+        self.completed: Deque[StreamMetrics] = deque(maxlen=max_completed)
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        serialized: Any,
+        kind: str,
+        **kwargs: Any,
+    ) -> None:
+        now = time.perf_counter()
+        name = kwargs.get("name") or (serialized or {}).get("name") or kind
+        with self._lock:
+            parent = self._runs.get(parent_run_id) if parent_run_id else None
+            self._runs[run_id] = StreamMetrics(
+                run_id=run_id,
+                parent_run_id=parent_run_id,
+                name=name,
+                kind=kind,
+                started=now,
+                root_started=parent.root_started if parent else now,
+            )
+
+    def _chunk(self, run_id: UUID, text: str) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            metrics = self._runs.get(run_id)
+            if metrics is not None:
+                metrics.chunk_times.append(now)
+                metrics.bytes += len(text.encode("utf-8"))
+
+    def _end(self, run_id: UUID, tokens: Optional[int] = None) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            metrics = self._runs.pop(run_id, None)
+            if metrics is None:
+                return
+            metrics.ended = now
+            if metrics.kind == "llm":
+                metrics.tokens = tokens if tokens is not None else metrics.chunks
+            self.completed.append(metrics)
+        self.on_stream_metrics(metrics)
+
+    def on_stream_metrics(self, metrics: StreamMetrics) -> None:
+        """一个步骤结束时调用。"""
+        if self.listener is not None:
+            self.listener(metrics)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, parent_run_id, serialized, "llm", **kwargs)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, parent_run_id, serialized, "llm", **kwargs)
+
+    def on_llm_new_token(
+        self,
+        token: str,
+        *,
+        chunk: Optional[Any] = None,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        if isinstance(chunk, (ChatGenerationChunk, GenerationChunk)):
+            token = chunk.text or token
+        self._chunk(run_id, token)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        tokens = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage and usage.get("output_tokens") is not None:
+                    tokens = (tokens or 0) + usage["output_tokens"]
+        self._end(run_id, tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(run_id, parent_run_id, serialized, "chain", **kwargs)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    # Runnable在流式执行每个步骤时会把输出迭代器交给实现了这两个方法的处理器。
+    # 与astream_events一样，挂载该处理器后invoke也会以流式方式调用聊天模型。
+    def tap_output_iter(self, run_id: UUID, output: Iterator[T]) -> Iterator[T]:
+        for chunk in output:
+            self._chunk(run_id, chunk_text(chunk))
+            yield chunk
+
+    async def tap_output_aiter(
+        self, run_id: UUID, output: AsyncIterator[T]
+    ) -> AsyncIterator[T]:
+        async for chunk in output:
+            self._chunk(run_id, chunk_text(chunk))
+            yield chunk
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """按步骤名汇总：运行次数、首块时间与块间隔的分位数、平均块数和速率。"""
+        with self._lock:
+            completed = list(self.completed)
+        groups: Dict[str, List[StreamMetrics]] = {}
+        for metrics in completed:
+            groups.setdefault(metrics.name, []).append(metrics)
+        report = {}
+        for name, runs in groups.items():
+            ttfts = sorted(m.ttft for m in runs if m.ttft is not None)
+            offsets = sorted(
+                m.first_chunk_offset for m in runs if m.first_chunk_offset is not None
+            )
+            gaps = sorted(gap for m in runs for gap in m.gaps)
+            summaries = [m.summary() for m in runs]
+            rates = [s["tokens_per_second"] for s in summaries if s["tokens_per_second"]]
+            byte_rates = [s["bytes_per_second"] for s in summaries if s["bytes_per_second"]]
+            report[name] = {
+                "kind": runs[0].kind,
+                "runs": len(runs),
+                "ttft_p50": percentile(ttfts, 50),
+                "ttft_p95": percentile(ttfts, 95),
+                "first_chunk_offset_p50": percentile(offsets, 50),
+                "gap_p50": percentile(gaps, 50),
+                "gap_p95": percentile(gaps, 95),
+                "gap_p99": percentile(gaps, 99),
+                "gap_max": gaps[-1] if gaps else 0.0,
+                "chunks_mean": sum(m.chunks for m in runs) / len(runs),
+                "bytes_per_second": sum(byte_rates) / len(byte_rates) if byte_rates else None,
+                "tokens_per_second": sum(rates) / len(rates) if rates else None,
+            }
+        return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self.completed.clear()
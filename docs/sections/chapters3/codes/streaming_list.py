@@ -0,0 +1,189 @@
+import asyncio
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import CommaSeparatedListOutputParser
+from langchain_core.runnables import RunnableGenerator
+
+_UNQUOTED_RUN = re.compile(r'[^,"\n]+')
+_QUOTED_RUN = re.compile(r'[^"]+')
+
+
+class ListItemScanner:
+    """逐块扫描逗号分隔列表的状态机，跨块保存当前项，每个字符只处理一次。
+    规则与csv模块（quotechar='"'）一致：逗号和换行分隔各项，引号内的逗号和换行属于项本身，
+    引号内的`""`表示一个引号。未加引号的项去掉首尾空白，加引号的项保留引号内的空白；
+    空项被跳过。
+    Example:
+        scanner = ListItemScanner()
+        for chunk in chunks:
+            for item in scanner.feed(chunk):
+                ...
+        remaining = scanner.close()
+    """
+
+    def __init__(self) -> None:
+        self._pieces: List[str] = []
+        self._in_quotes = False
+        # 引号内遇到引号时还不能确定是结束还是转义，等下一个字符
+        self._pending_quote = False
+        # 已经闭合的引号部分；之后到分隔符之前的内容只去掉末尾空白
+        self._quoted: Optional[str] = None
+
+    def _close_quote(self) -> None:
+        self._in_quotes = False
+        self._quoted = "".join(self._pieces)
+        self._pieces = []
+
+    def _emit(self, items: List[str]) -> None:
+        rest = "".join(self._pieces)
+        if self._quoted is not None:
+            items.append(self._quoted + rest.rstrip())
+        elif rest.strip():
+            items.append(rest.strip())
+        self._pieces = []
+        self._quoted = None
+
+    def feed(self, text: str) -> List[str]:
+        """输入一块文本，返回这一块中完成的项。"""
+        items: List[str] = []
+        i, n = 0, len(text)
+        while i < n:
+            if self._pending_quote:
+                self._pending_quote = False
+                if text[i] == '"':
+                    self._pieces.append('"')
+                    i += 1
+                    continue
+                self._close_quote()
+            if self._in_quotes:
+                match = _QUOTED_RUN.match(text, i)
+                if match:
+                    self._pieces.append(match.group())
+                    i = match.end()
+                else:
+                    self._pending_quote = True
+                    i += 1
+                continue
+            match = _UNQUOTED_RUN.match(text, i)
+            if match:
+                self._pieces.append(match.group())
+                i = match.end()
+                continue
+            char = text[i]
+            if char == '"':
+                if self._quoted is not None or "".join(self._pieces).strip():
+                    # 项中间的引号按普通字符处理
+                    self._pieces.append(char)
+                else:
+                    self._pieces = []
+                    self._in_quotes = True
+            else:
+                self._emit(items)
+            i += 1
+        return items
+
+    def close(self) -> List[str]:
+        """输入结束，返回最后一项（如果有）。"""
+        items: List[str] = []
+        if self._in_quotes:
+            self._pending_quote = False
+            self._close_quote()
+        self._emit(items)
+        return items
+
+
+class StreamingCommaSeparatedListOutputParser(CommaSeparatedListOutputParser):
+    """流式调用时每读到一个分隔符就输出一项的CommaSeparatedListOutputParser。
+    CommaSeparatedListOutputParser每收到一块都会用csv重新切分缓冲区中的文本，
+    并且切分后只保留去掉引号的剩余部分，引号跨块时结果可能不对；
+    这里用ListItemScanner保存当前项的状态，每个字符只处理一次。
+    与CommaSeparatedListOutputParser一样，流式输出的每个元素是只包含一项的列表。
+    parse（invoke等非流式调用）也使用ListItemScanner，流式输出的各项拼起来与invoke的结果相同；
+    因此与CommaSeparatedListOutputParser的结果在少数情况下不同：
+    未加引号的项会去掉末尾空白（`"a   "`得到`["a"]`），空项被跳过（`"a,"`得到`["a"]`）。
+    """
+
+    def parse(self, text: str) -> List[str]:
+        scanner = ListItemScanner()
+        return scanner.feed(text) + scanner.close()
+
+    @staticmethod
+    def _text(chunk: Union[str, BaseMessage]) -> str:
+        if isinstance(chunk, BaseMessage):
+            return chunk.content if isinstance(chunk.content, str) else ""
+        return chunk
+
+    def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[List[str]]:
+        scanner = ListItemScanner()
+        for chunk in input:
+            for item in scanner.feed(self._text(chunk)):
+                yield [item]
+        for item in scanner.close():
+            yield [item]
+
+    async def _atransform(
+        self, input: AsyncIterator[Union[str, BaseMessage]]
+    ) -> AsyncIterator[List[str]]:
+        scanner = ListItemScanner()
+        async for chunk in input:
+            for item in scanner.feed(self._text(chunk)):
+                yield [item]
+        for item in scanner.close():
+            yield [item]
+
+
+def map_items(
+    func: Callable[[str], Any],
+    afunc: Optional[Callable[[str], Any]] = None,
+    max_workers: int = 4,
+) -> RunnableGenerator:
+    """接在StreamingCommaSeparatedListOutputParser后面，每收到一项就开始处理它，
+    不等模型生成完整个列表。按完成顺序输出(项, 结果)。
+    同步调用在线程池中执行func；异步调用为每一项创建一个任务执行afunc，
+    没有afunc时在默认线程池中执行func。
+    Example:
+        chain = prompt | model | StreamingCommaSeparatedListOutputParser() | map_items(lookup)
+        for item, result in chain.stream({"subject": "ice cream flavors"}):
+            ...
+    """
+
+    def transform(input: Iterator[List[str]]) -> Iterator[Tuple[str, Any]]:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending: Dict[Future, str] = {}
+            for items in input:
+                for item in items:
+                    pending[pool.submit(func, item)] = item
+                # 模型还在生成时，先输出已经完成的项
+                for future in [future for future in pending if future.done()]:
+                    yield pending.pop(future), future.result()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    async def atransform(input: AsyncIterator[List[str]]) -> AsyncIterator[Tuple[str, Any]]:
+        semaphore = asyncio.Semaphore(max_workers)
+        loop = asyncio.get_running_loop()
+
+        async def run(item: str) -> Tuple[str, Any]:
+            async with semaphore:
+                if afunc is not None:
+                    return item, await afunc(item)
+                return item, await loop.run_in_executor(None, func, item)
+
+        pending: Set[asyncio.Task] = set()
+        async for items in input:
+            pending.update(asyncio.ensure_future(run(item)) for item in items)
+            done = {task for task in pending if task.done()}
+            pending -= done
+            for task in done:
+                yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    return RunnableGenerator(transform, atransform, name="map_items")
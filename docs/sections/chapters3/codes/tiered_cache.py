@@ -0,0 +1,321 @@
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+
+from memory_cache import BoundedInMemoryCache
+from sqlite_cache import cache_key, deserialize_generations, serialize_generations
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache_index (
+    key TEXT PRIMARY KEY,
+    prompt TEXT NOT NULL,
+    llm TEXT NOT NULL,
+    inline TEXT,
+    blob_offset INTEGER,
+    blob_length INTEGER,
+    created_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS llm_cache_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class BlobStore:
+    """只追加的响应体文件，通过内存映射读取。
+    写入追加到文件末尾并返回(偏移, 长度)；读取直接从映射中切片，不需要额外的系统调用。
+    文件增长后按需重新映射。多个进程可以同时追加：文件以O_APPEND打开，
+    写入时加文件锁，偏移取写入后文件的实际位置，而不是本进程记录的大小。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._open()
+
+    def _open(self) -> None:
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+
+    def _unmap(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def append(self, data: bytes) -> Tuple[int, int]:
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view) :]
+                end = os.lseek(self._fd, 0, os.SEEK_CUR)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._size = max(self._size, end)
+        return end - len(data), len(data)
+
+    def read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            if self._map is None or offset + length > len(self._map):
+                if offset + length > self._size:
+                    # 其他进程可能追加了内容
+                    self._size = os.fstat(self._fd).st_size
+                if offset + length > self._size:
+                    raise ValueError(f"Blob range {offset}+{length} is beyond {self.path}")
+                self._unmap()
+                self._map = mmap.mmap(self._fd, self._size, access=mmap.ACCESS_READ)
+            return self._map[offset : offset + length]
+
+    def truncate(self) -> None:
+        with self._lock:
+            self._unmap()
+            os.ftruncate(self._fd, 0)
+            self._size = 0
+
+    def reopen(self) -> None:
+        """文件被替换（例如压缩）后重新打开。"""
+        with self._lock:
+            self._unmap()
+            os.close(self._fd)
+            self._open()
+
+    def close(self) -> None:
+        with self._lock:
+            self._unmap()
+            os.close(self._fd)
+
+
+class TieredCache(BaseCache):
+    """三层LLM缓存：进程内LRU -> SQLite索引 -> 内存映射的响应体文件。
+    - 第一层是`BoundedInMemoryCache`，命中时不需要反序列化；
+    - 第二层是SQLite索引，小于`inline_threshold`字节的响应直接存在索引中；
+    - 较大的响应追加写入`blob_path`，索引只记录偏移和长度，读取时从内存映射中切片。
+    下层命中的条目会提升到第一层。进程重启后只需打开索引和映射文件，
+    条目在第一次被访问时才反序列化，因此重启后缓存立即可用。
+    Example:
+        cache = TieredCache(".langchain.db", ".langchain.blob", hot_maxsize=1000)
+        set_llm_cache(cache)
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".langchain.db",
+        blob_path: str = ".langchain.blob",
+        hot_maxsize: Optional[int] = 1000,
+        hot_max_bytes: Optional[int] = 64 * 1024 * 1024,
+        inline_threshold: int = 4096,
+        ttl: Optional[float] = None,
+    ):
+        self.inline_threshold = inline_threshold
+        self.ttl = ttl
+        self.hot = BoundedInMemoryCache(maxsize=hot_maxsize, max_bytes=hot_max_bytes, ttl=ttl)
+        self._conn = sqlite3.connect(
+            database_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._blob_path = blob_path
+        self._compact_path = blob_path + ".compact"
+        # 先完成上次中断的压缩，再打开响应体文件
+        self._finish_compaction()
+        self.blobs = BlobStore(blob_path)
+        self.index_hits = 0
+        self.misses = 0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        cached = self.hot.lookup(prompt, llm_string)
+        if cached is not None:
+            return cached
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT inline, blob_offset, blob_length, expires_at "
+                "FROM llm_cache_index WHERE key = ?",
+                (cache_key(prompt, llm_string),),
+            ).fetchone()
+            now = time.time()
+            if row is None or (row[3] is not None and row[3] <= now):
+                self.misses += 1
+                return None
+            inline, offset, length, expires_at = row
+            # 压缩会在同一把锁内重写响应体文件和偏移，读取必须在锁内完成
+            data = inline if inline is not None else self._read_blob(offset, length)
+            self.index_hits += 1
+        generations = deserialize_generations(data)
+        # 提升到第一层，有效期不超过索引中的过期时间
+        ttl = expires_at - now if expires_at is not None else None
+        self.hot.update(prompt, llm_string, generations, ttl=ttl)
+        return generations
+
+    def _read_blob(self, offset: int, length: int) -> str:
+        """读取响应体（持有锁）。"""
+        return self.blobs.read(offset, length).decode("utf-8")
+
+    def update(
+        self,
+        prompt: str,
+        llm_string: str,
+        return_val: RETURN_VAL_TYPE,
+        *,
+        created_at: Optional[float] = None,
+    ) -> None:
+        """写入条目。created_at为原来的写入时间戳（例如导入时），ttl从它开始计算。"""
+        data = serialize_generations(return_val)
+        encoded = data.encode("utf-8")
+        now = time.time() if created_at is None else created_at
+        expires_at = now + self.ttl if self.ttl is not None else None
+        # 追加和写索引都在锁内，压缩时不会有写入落在旧文件中
+        with self._lock:
+            inline, offset, length = data, None, None
+            if len(encoded) >= self.inline_threshold:
+                inline = None
+                offset, length = self.blobs.append(encoded)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache_index "
+                "(key, prompt, llm, inline, blob_offset, blob_length, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(prompt, llm_string), prompt, llm_string, inline, offset, length,
+                 now, expires_at),
+            )
+        self.hot.update(prompt, llm_string, return_val, created_at=now)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.hot.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache_index")
+            self.blobs.truncate()
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        # 第一层命中时直接返回，不切换到线程池
+        cached = self.hot.lookup(prompt, llm_string)
+        if cached is not None:
+            return cached
+        return await super().alookup(prompt, llm_string)
+
+    def compact(self) -> int:
+        """重写响应体文件，丢弃被覆盖或已过期条目留下的空间，返回回收的字节数。
+        仍然有效的响应体先写入新文件并落盘，再在同一个事务中提交新的偏移和"待替换"标记，
+        最后用os.replace原子地替换旧文件。任何一步中断都不会丢失数据：
+        提交之前中断时旧文件和旧偏移都没有变化；提交之后中断时，下次打开缓存会先完成替换。
+        替换后其他进程仍在读取旧文件，因此只在没有其他进程使用该缓存时压缩。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM llm_cache_index "
+                    "WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                    (time.time(),),
+                )
+                rows = self._conn.execute(
+                    "SELECT key, blob_offset, blob_length FROM llm_cache_index "
+                    "WHERE blob_offset IS NOT NULL ORDER BY blob_offset"
+                ).fetchall()
+                before = self.blobs.size
+                updates = []
+                with open(self._compact_path, "wb") as f:
+                    for key, offset, length in rows:
+                        updates.append((f.tell(), length, key))
+                        f.write(self.blobs.read(offset, length))
+                    after = f.tell()
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._conn.executemany(
+                    "UPDATE llm_cache_index SET blob_offset = ?, blob_length = ? WHERE key = ?",
+                    updates,
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache_meta (name, value) "
+                    "VALUES ('pending_blob', ?)",
+                    (self._compact_path,),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                if os.path.exists(self._compact_path):
+                    os.remove(self._compact_path)
+                raise
+            self._finish_compaction()
+            self.blobs.reopen()
+            return before - after
+
+    def _finish_compaction(self) -> None:
+        """已经提交的压缩：把新文件替换为响应体文件；没有提交的压缩：删除新文件。"""
+        row = self._conn.execute(
+            "SELECT value FROM llm_cache_meta WHERE name = 'pending_blob'"
+        ).fetchone()
+        if row is None:
+            if os.path.exists(self._compact_path):
+                os.remove(self._compact_path)
+            return
+        if os.path.exists(self._compact_path):
+            os.replace(self._compact_path, self._blob_path)
+        self._conn.execute("DELETE FROM llm_cache_meta WHERE name = 'pending_blob'")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        self.blobs.close()
+
+    def iter_entries(
+        self, page_size: int = 256
+    ) -> Iterator[Tuple[str, str, RETURN_VAL_TYPE, float]]:
+        """遍历未过期的条目，返回(prompt, llm_string, generations, 写入时间戳)。
+        每次在锁内读出page_size个条目（包括响应体），两页之间的压缩不会使偏移失效。
+        """
+        # 按主键分页：INSERT OR REPLACE会改变rowid，但不会改变key
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, prompt, llm, inline, blob_offset, blob_length, created_at "
+                    "FROM llm_cache_index WHERE key > ? "
+                    "AND (expires_at IS NULL OR expires_at > ?) ORDER BY key LIMIT ?",
+                    (last, time.time(), page_size),
+                ).fetchall()
+                page = [
+                    (prompt, llm_string, inline if inline is not None
+                     else self._read_blob(offset, length), created_at)
+                    for _, prompt, llm_string, inline, offset, length, created_at in rows
+                ]
+            for prompt, llm_string, data, created_at in page:
+                yield prompt, llm_string, deserialize_generations(data), created_at
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def stats(self) -> Dict[str, Any]:
+        hot = self.hot.stats()
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache_index").fetchone()[0]
+            lookups = hot["hits"] + self.index_hits + self.misses
+            return {
+                "entries": entries,
+                "hot_entries": hot["entries"],
+                "hot_hits": hot["hits"],
+                "index_hits": self.index_hits,
+                "misses": self.misses,
+                "hit_rate": (hot["hits"] + self.index_hits) / lookups if lookups else 0.0,
+                "blob_bytes": self.blobs.size,
+            }
@@ -0,0 +1,418 @@
+import importlib.util
+import json
+import re
+from itertools import islice
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# 只检查一次是否安装了tiktoken；真正的导入推迟到第一次使用时
+HAS_TIKTOKEN = importlib.util.find_spec("tiktoken") is not None
+
+Tokenizer = Callable[[str], int]
+
+_APPROXIMATE_TOKEN = re.compile(r"[぀-ヿ㐀-䶿一-鿿]|\w+|[^\w\s]")
+
+MESSAGE_OVERHEAD = 3
+"""每条聊天消息在内容之外的固定token开销（角色与分隔符），与OpenAI的计数方式一致。"""
+
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-3.5-turbo-instruct": (0.0015, 0.002),
+    "babbage-002": (0.0004, 0.0004),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+"""每1000个token的(提示价格, 完成价格)，单位美元。价格会变化，使用前请按实际价格覆盖。"""
+
+
+def approximate_tokenizer(text: str) -> int:
+    """不依赖任何包的近似计数：每个汉字/假名、每个单词、每个标点各算一个token。"""
+    return len(_APPROXIMATE_TOKEN.findall(text))
+
+
+@lru_cache(maxsize=None)
+def tiktoken_tokenizer(model: str = "gpt-3.5-turbo") -> Tokenizer:
+    """使用tiktoken按模型的编码计数，需要`pip install tiktoken`。"""
+    import tiktoken
+
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def default_tokenizer(model: Optional[str] = None) -> Tokenizer:
+    """安装了tiktoken时使用tiktoken，否则使用近似计数。"""
+    if not HAS_TIKTOKEN:
+        return approximate_tokenizer
+    return tiktoken_tokenizer(model or "gpt-3.5-turbo")
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    requests: int = 0
+    errors: int = 0
+    cost: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "Usage") -> None:
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.requests += other.requests
+        self.errors += other.errors
+        self.cost += other.cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+
+class _Run:
+    __slots__ = ("model", "prompt_tokens", "streamed", "chain", "tags", "request", "kwargs")
+
+    def __init__(
+        self,
+        model: str,
+        prompt_tokens: int,
+        chain: str,
+        tags: List[str],
+        request: str,
+        kwargs: Dict[str, Any],
+    ):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.streamed: List[str] = []
+        self.chain = chain
+        self.tags = tags
+        self.request = request
+        # 回调的其余参数（metadata、invocation_params等），供子类使用
+        self.kwargs = kwargs
+
+
+class TokenAccountingHandler(BaseCallbackHandler):
+    """在本地统计提示与完成token及费用的回调处理器，不依赖提供商返回的用量。
+    - tokenizer可替换：传入`str -> int`的函数，或按模型名返回该函数的`tokenizer_factory`；
+    - 流式输出也会计数：正常结束时按最终文本计数，中途出错时按已收到的块计数；
+    - 按模型、链（最外层运行的名称）、标签和请求（metadata中的`request_id`，
+      没有时使用最外层运行的id）分别累计；
+    - 所有状态按run_id保存并由一把锁保护，batch、abatch和线程池中的调用都能正确累计；
+    - by_request超过max_requests个时移除最早的已经结束的请求，
+      还有链或模型调用在进行中的请求不会被移除。
+    Example:
+        handler = install_global_handler(TokenAccountingHandler())
+        chain.batch(inputs, config={"metadata": {"request_id": "req-1"}, "tags": ["demo"]})
+        print(handler.snapshot())
+    """
+
+    run_inline = True
+
+    def __init__(
+        self,
+        tokenizer: Optional[Tokenizer] = None,
+        tokenizer_factory: Callable[[Optional[str]], Tokenizer] = default_tokenizer,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        request_key: str = "request_id",
+        max_requests: int = 10_000,
+    ):
+        self.tokenizer = tokenizer
+        self.tokenizer_factory = tokenizer_factory
+        self.prices = DEFAULT_PRICES if prices is None else prices
+        self.request_key = request_key
+        self.max_requests = max_requests
+        self._lock = threading.Lock()
+        self._runs: Dict[UUID, _Run] = {}
+        # 链运行：run_id -> (名称, 父run_id, 请求)，用于找到LLM运行所属的最外层链
+        self._chains: Dict[UUID, Tuple[str, Optional[UUID], str]] = {}
+        # 请求 -> 进行中的链与模型调用的个数，进行中的请求不会从by_request中移除
+        self._active: Dict[str, int] = {}
+        self.total = Usage()
+        self.by_model: Dict[str, Usage] = {}
+        self.by_chain: Dict[str, Usage] = {}
+        self.by_tag: Dict[str, Usage] = {}
+        self.by_request: Dict[str, Usage] = {}
+
+    def _tokenizer(self, model: Optional[str]) -> Tokenizer:
+        return self.tokenizer or self.tokenizer_factory(model)
+
+    def count_text(self, text: str, model: Optional[str] = None) -> int:
+        return self._tokenizer(model)(text) if text else 0
+
+    def count_messages(self, messages: Sequence[BaseMessage], model: Optional[str] = None) -> int:
+        count = self._tokenizer(model)
+        total = 0
+        for message in messages:
+            content = message.content if isinstance(message.content, str) else json.dumps(
+                message.content, ensure_ascii=False
+            )
+            total += MESSAGE_OVERHEAD + count(message.type) + (count(content) if content else 0)
+        return total
+
+    @staticmethod
+    def _model_name(serialized: Optional[Dict[str, Any]], **kwargs: Any) -> str:
+        metadata = kwargs.get("metadata") or {}
+        params = kwargs.get("invocation_params") or {}
+        return (
+            metadata.get("ls_model_name")
+            or params.get("model_name")
+            or params.get("model")
+            or (serialized or {}).get("name")
+            or "unknown"
+        )
+
+    def _root(self, parent_run_id: Optional[UUID], run_id: UUID) -> Tuple[str, str]:
+        """返回(最外层链的名称, 最外层运行的id)。需要在持有锁时调用。"""
+        name, root = None, run_id
+        current = parent_run_id
+        while current is not None and current in self._chains:
+            name, parent, _ = self._chains[current]
+            root, current = current, parent
+        return name or "", str(root)
+
+    def _request(self, metadata: Dict[str, Any], root: str) -> str:
+        return str(metadata.get(self.request_key) or root)
+
+    def _enter(self, request: str) -> None:
+        self._active[request] = self._active.get(request, 0) + 1
+
+    def _exit(self, request: str) -> None:
+        count = self._active.get(request, 0) - 1
+        if count > 0:
+            self._active[request] = count
+        else:
+            self._active.pop(request, None)
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        model: str,
+        prompt_tokens: int,
+        **kwargs: Any,
+    ) -> None:
+        metadata = kwargs.get("metadata") or {}
+        with self._lock:
+            chain, root = self._root(parent_run_id, run_id)
+            request = self._request(metadata, root)
+            # 去掉RunnableSequence自动添加的seq:step:N标签
+            tags = [t for t in kwargs.get("tags") or [] if not t.startswith("seq:step:")]
+            run = _Run(model, prompt_tokens, chain or model, tags, request, kwargs)
+            self._admit(run)
+            self._runs[run_id] = run
+            self._enter(request)
+
+    def _admit(self, run: _Run) -> None:
+        """模型调用开始、请求发出之前调用（持有锁）。子类可以在这里抛出异常拒绝这次调用。"""
+
+    def _cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.prices.get(model)
+        if price is None:
+            return 0.0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+    def _finish(self, run_id: UUID, completion_tokens: Optional[int], error: bool) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is not None:
+                self._exit(run.request)
+        if run is None:
+            return
+        if completion_tokens is None:
+            # 出错时按已经收到的流式块计数
+            completion_tokens = self.count_text("".join(run.streamed), run.model)
+        usage = Usage(
+            prompt_tokens=run.prompt_tokens,
+            completion_tokens=completion_tokens,
+            requests=1,
+            errors=1 if error else 0,
+            cost=self._cost(run.model, run.prompt_tokens, completion_tokens),
+        )
+        with self._lock:
+            self._record(run, usage)
+
+    def _record(self, run: _Run, usage: Usage) -> None:
+        """把一次调用的用量累计到各个维度（持有锁）。"""
+        self.total.add(usage)
+        for bucket, key in (
+            (self.by_model, run.model),
+            (self.by_chain, run.chain),
+            (self.by_request, run.request),
+        ):
+            bucket.setdefault(key, Usage()).add(usage)
+        for tag in run.tags:
+            self.by_tag.setdefault(tag, Usage()).add(usage)
+        excess = len(self.by_request) - self.max_requests
+        if excess > 0:
+            # 只保留最近的请求，避免长时间运行时无限增长；
+            # 进行中的请求不移除，否则它已经用掉的预算会被清零
+            finished = (key for key in self.by_request if key not in self._active)
+            for key in list(islice(finished, excess)):
+                del self.by_request[key]
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        model = self._model_name(serialized, **kwargs)
+        tokens = sum(self.count_text(prompt, model) for prompt in prompts)
+        self._start(run_id, parent_run_id, model, tokens, **kwargs)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        model = self._model_name(serialized, **kwargs)
+        tokens = sum(self.count_messages(batch, model) for batch in messages)
+        self._start(run_id, parent_run_id, model, tokens, **kwargs)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None:
+                run.streamed.append(token)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run is None:
+            return
+        # 流式调用结束时response中是拼接后的完整结果，按整段文本计数
+        tokens = sum(
+            self.count_text(generation.text, run.model)
+            for generations in response.generations
+            for generation in generations
+        )
+        self._finish(run_id, tokens, error=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, None, error=True)
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        with self._lock:
+            _, root = self._root(parent_run_id, run_id)
+            request = self._request(kwargs.get("metadata") or {}, root)
+            self._chains[run_id] = (name, parent_run_id, request)
+            self._enter(request)
+
+    def _end_chain(self, run_id: UUID) -> None:
+        with self._lock:
+            chain = self._chains.pop(run_id, None)
+            if chain is not None:
+                self._exit(chain[2])
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前所有计数。"""
+        with self._lock:
+            return {
+                "total": self.total.to_dict(),
+                "by_model": {k: v.to_dict() for k, v in self.by_model.items()},
+                "by_chain": {k: v.to_dict() for k, v in self.by_chain.items()},
+                "by_tag": {k: v.to_dict() for k, v in self.by_tag.items()},
+                "by_request": {k: v.to_dict() for k, v in self.by_request.items()},
+            }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.total = Usage()
+            self.by_model.clear()
+            self.by_chain.clear()
+            self.by_tag.clear()
+            self.by_request.clear()
+
+    def __repr__(self) -> str:
+        total = self.total
+        return (
+            f"Tokens Used: {total.total_tokens}\n"
+            f"\tPrompt Tokens: {total.prompt_tokens}\n"
+            f"\tCompletion Tokens: {total.completion_tokens}\n"
+            f"Successful Requests: {total.requests - total.errors}\n"
+            f"Total Cost (USD): ${total.cost}"
+        )
+
+
+_scoped_handler: ContextVar[Optional[TokenAccountingHandler]] = ContextVar(
+    "token_accounting_scoped", default=None
+)
+register_configure_hook(_scoped_handler, inheritable=True)
+
+_global_lock = threading.Lock()
+_global_handler: Optional[TokenAccountingHandler] = None
+
+
+def install_global_handler(
+    handler: Optional[TokenAccountingHandler] = None,
+) -> TokenAccountingHandler:
+    """把处理器安装到进程中的所有调用上，不需要用上下文管理器包住每次调用。
+    处理器是一个ContextVar的默认值，因此新线程、线程池和新的事件循环中也能取到它。
+    一个进程只能安装一个全局处理器，重复调用返回已安装的处理器。
+    """
+    global _global_handler
+    with _global_lock:
+        if _global_handler is not None:
+            if handler is not None and handler is not _global_handler:
+                raise ValueError("A global token accounting handler is already installed.")
+            return _global_handler
+        _global_handler = handler or TokenAccountingHandler()
+        register_configure_hook(
+            ContextVar("token_accounting_global", default=_global_handler), inheritable=True
+        )
+        return _global_handler
+
+
+def get_global_handler() -> Optional[TokenAccountingHandler]:
+    return _global_handler
+
+
+@contextmanager
+def token_accounting(
+    handler: Optional[TokenAccountingHandler] = None,
+) -> Iterator[TokenAccountingHandler]:
+    """与get_openai_callback用法相同的上下文管理器，只统计with块中的调用。"""
+    handler = handler or TokenAccountingHandler()
+    token = _scoped_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _scoped_handler.reset(token)
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+from token_accounting import TokenAccountingHandler, Usage, _Run
+
+
+@dataclass(frozen=True)
+class Budget:
+    """token与费用（美元）上限，为None的一项不限制。"""
+
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+
+
+class BudgetExceededError(Exception):
+    """模型调用会超出预算，在请求发出之前抛出。"""
+
+    def __init__(
+        self,
+        scope: str,
+        key: str,
+        limit: float,
+        used: float,
+        estimated: float,
+        unit: str,
+    ):
+        self.scope = scope
+        self.key = key
+        self.limit = limit
+        self.used = used
+        self.estimated = estimated
+        self.unit = unit
+        super().__init__(
+            f"{scope} {key!r} would exceed its {unit} budget: "
+            f"used {used:g} + estimated {estimated:g} > limit {limit:g}"
+        )
+
+
+class TokenBudgetHandler(TokenAccountingHandler):
+    """在每次模型调用发出之前检查预算的回调处理器。
+    预计用量 = 提示token数 + 完成token的预留（调用参数中的max_tokens乘以n，没有时使用
+    completion_reserve），与该请求/租户已经用掉的和正在进行中的调用的预留相加后超出上限时，
+    抛出BudgetExceededError，请求不会发出。调用结束后释放预留，按实际用量累计。
+    - 请求：metadata中的`request_id`，没有时使用最外层运行的id，因此一次代理运行中的
+      所有模型调用共用一个请求预算；
+    - 租户：metadata中的`tenant_id`，预算在tenant_budgets中按租户配置，或使用default_tenant_budget。
+    超出时默认直接失败；需要改用更便宜的模型时，用`with_budget_fallback`包装模型。
+    Example:
+        handler = TokenBudgetHandler(request_budget=Budget(max_tokens=4000))
+        agent.invoke(inputs, config={"callbacks": [handler], "metadata": {"tenant_id": "acme"}})
+    """
+
+    # 回调中抛出的异常默认只记录日志，这里需要让它中断模型调用
+    raise_error = True
+
+    def __init__(
+        self,
+        request_budget: Optional[Budget] = None,
+        tenant_budgets: Optional[Dict[str, Budget]] = None,
+        default_tenant_budget: Optional[Budget] = None,
+        tenant_key: str = "tenant_id",
+        completion_reserve: int = 256,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.request_budget = request_budget
+        self.tenant_budgets = tenant_budgets or {}
+        self.default_tenant_budget = default_tenant_budget
+        self.tenant_key = tenant_key
+        self.completion_reserve = completion_reserve
+        self.by_tenant: Dict[str, Usage] = {}
+        self.rejected = 0
+        # 正在进行中的调用的预留：(范围, 键) -> 预留的用量
+        self._reserved: Dict[Tuple[str, str], Usage] = {}
+        self._reservations: Dict[_Run, Tuple[List[Tuple[str, str]], Usage]] = {}
+
+    def _tenant(self, run: _Run) -> Optional[str]:
+        tenant = (run.kwargs.get("metadata") or {}).get(self.tenant_key)
+        return str(tenant) if tenant is not None else None
+
+    def _estimate(self, run: _Run) -> Usage:
+        params = run.kwargs.get("invocation_params") or {}
+        completion = params.get("max_tokens") or self.completion_reserve
+        completion *= max(params.get("n") or 1, params.get("best_of") or 1)
+        return Usage(
+            prompt_tokens=run.prompt_tokens,
+            completion_tokens=completion,
+            cost=self._cost(run.model, run.prompt_tokens, completion),
+        )
+
+    def _scopes(self, run: _Run) -> List[Tuple[str, str, Budget, Usage]]:
+        """返回这次调用受约束的(范围, 键, 预算, 已用量)。"""
+        scopes = []
+        if self.request_budget is not None:
+            used = self.by_request.get(run.request, Usage())
+            scopes.append(("request", run.request, self.request_budget, used))
+        tenant = self._tenant(run)
+        if tenant is not None:
+            budget = self.tenant_budgets.get(tenant, self.default_tenant_budget)
+            if budget is not None:
+                scopes.append(("tenant", tenant, budget, self.by_tenant.get(tenant, Usage())))
+        return scopes
+
+    def _admit(self, run: _Run) -> None:
+        estimate = self._estimate(run)
+        scopes = self._scopes(run)
+        for scope, key, budget, used in scopes:
+            reserved = self._reserved.get((scope, key), Usage())
+            if budget.max_tokens is not None:
+                spent = used.total_tokens + reserved.total_tokens
+                if spent + estimate.total_tokens > budget.max_tokens:
+                    self.rejected += 1
+                    raise BudgetExceededError(
+                        scope, key, budget.max_tokens, spent, estimate.total_tokens, "token"
+                    )
+            if budget.max_cost is not None:
+                spent = used.cost + reserved.cost
+                if spent + estimate.cost > budget.max_cost:
+                    self.rejected += 1
+                    raise BudgetExceededError(
+                        scope, key, budget.max_cost, spent, estimate.cost, "cost"
+                    )
+        keys = [(scope, key) for scope, key, _, _ in scopes]
+        for key in keys:
+            self._reserved.setdefault(key, Usage()).add(estimate)
+        self._reservations[run] = (keys, estimate)
+
+    def _record(self, run: _Run, usage: Usage) -> None:
+        super()._record(run, usage)
+        tenant = self._tenant(run)
+        if tenant is not None:
+            self.by_tenant.setdefault(tenant, Usage()).add(usage)
+        keys, estimate = self._reservations.pop(run, ([], Usage()))
+        for key in keys:
+            reserved = self._reserved[key]
+            reserved.prompt_tokens -= estimate.prompt_tokens
+            reserved.completion_tokens -= estimate.completion_tokens
+            reserved.cost -= estimate.cost
+            if reserved.total_tokens <= 0:
+                del self._reserved[key]
+
+    def remaining(
+        self, request: Optional[str] = None, tenant: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """返回请求或租户剩余的token与费用，未设置的上限为None。"""
+        with self._lock:
+            if tenant is not None:
+                budget = self.tenant_budgets.get(tenant, self.default_tenant_budget)
+                used = self.by_tenant.get(tenant, Usage())
+            else:
+                budget = self.request_budget
+                used = self.by_request.get(request, Usage())
+        budget = budget or Budget()
+        return {
+            "tokens": None if budget.max_tokens is None else budget.max_tokens - used.total_tokens,
+            "cost": None if budget.max_cost is None else budget.max_cost - used.cost,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        with self._lock:
+            snapshot["by_tenant"] = {k: v.to_dict() for k, v in self.by_tenant.items()}
+            snapshot["rejected"] = self.rejected
+        return snapshot
+
+    def reset(self) -> None:
+        super().reset()
+        with self._lock:
+            self.by_tenant.clear()
+            self.rejected = 0
+
+
+def with_budget_fallback(model: Runnable, *cheaper: Runnable) -> Runnable:
+    """超出预算时依次改用更便宜的模型。
+    更便宜的模型同样要经过预算检查：按费用超出时可能还能通过，按token数超出时仍会失败。
+    """
+    return model.with_fallbacks(list(cheaper), exceptions_to_handle=(BudgetExceededError,))